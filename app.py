@@ -1,10 +1,38 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, make_response
+import hashlib
 import json
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+
+import assets
+import images
+from caching import CODE_VERSION, HTTPCache, LRUCache, RenderCache
+from changes import ChangeLog
+from compression import Compressor
+from events import Schedule
+from fragments import FragmentCache
+from ratelimit import RateLimiter
+from search import SearchIndex
+from submissions import Deliverer, SubmissionQueue
+from tenancy import TenantRegistry, current_slug
+from metrics import Metrics, timed
+from profiling import Profiler
+import planting
+from indexes import (DEFAULT_LIMIT, DatasetIndex, QueryError, difficulty_rank,
+                     duration_seconds, number_key, query_args)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'growbalbriggan-local-dev-2024')
+# Latency histograms on /metrics; registered first so it times everything else
+metrics = Metrics(app)
+# cProfile traces of sampled or signed requests, stack samples of slow ones
+profiler = Profiler(app)
+# Fingerprinted static files and per-page CSS/JS bundles
+asset_manifest = assets.init_app(app)
+# Resized, fingerprinted variants of the site's images, and srcset markup
+image_manifest = images.init_app(app)
+# gzip/Brotli for text responses, once per content version where possible
+compressor = Compressor(app, scope=current_slug)
 
 # Balbriggan-specific data
 BALBRIGGAN_INFO = {
@@ -18,101 +46,253 @@ BALBRIGGAN_INFO = {
     "coastal_feature": "Beautiful coastline affecting microclimate"
 }
 
+# Other towns served from this deployment, each with its own data folder,
+# town info and cache entries; unmatched hosts get Balbriggan
+tenants = TenantRegistry(BALBRIGGAN_INFO)
+tenants.init_app(app)
+
+# Data files are parsed once per worker and reloaded only when they change.
+# `content` forwards to the current town's ContentStore.
+content = tenants.content
+content.register(
+    'tips', 'tips.json',
+    missing=[
+        {
+            "id": 1,
+            "title": "Start Small",
+            "description": "Begin with herbs in containers on your balcony or windowsill",
+            "season": "All Year",
+            "emoji": "🌱",
+            "icon": "fas fa-seedling",
+            "seasonal": False
+        }
+    ],
+    corrupt=[],
+)
+content.register(
+    'plants', 'plants.json',
+    missing=[
+        {
+            "id": 1,
+            "name": "Sea Kale",
+            "description": "Loves our coastal breeze! Edible and beautiful.",
+            "sun": "Full Sun",
+            "planting_time": "Spring",
+            "emoji": "🌊",
+            "difficulty": "easy",
+            "type": "vegetable"
+        }
+    ],
+    corrupt=[],
+)
+_default_videos = [
+    {
+        "id": 1,
+        "title": "Getting Started with Balcony Gardening",
+        "description": "Learn how to grow vegetables, herbs, and flowers in small spaces",
+        "date": "2024-03-15",
+        "duration": "25:30",
+        "youtube_id": "dQw4w9WgXcQ",
+        "instructor": "Sarah O'Connor",
+        "difficulty": "beginner",
+        "tags": ["balcony", "containers", "beginners"],
+        "thumbnail": "https://img.youtube.com/vi/dQw4w9WgXcQ/hqdefault.jpg"
+    }
+]
+content.register('videos', 'videos.json', missing=_default_videos, corrupt=_default_videos)
+_default_events = [
+    {"id": 1, "date": "Weekly", "event": "Community Garden Volunteering", "emoji": "👨‍🌾", "location": "Town Park",
+     "start": "2024-01-03", "start_time": "10:00", "end_time": "14:00", "rrule": "FREQ=WEEKLY;BYDAY=WE"},
+    {"id": 2, "date": "Saturdays", "event": "Balbriggan Farmers Market", "emoji": "🛒", "location": "Market Square",
+     "start": "2024-01-06", "start_time": "10:00", "end_time": "14:00", "rrule": "FREQ=WEEKLY;BYDAY=SA"},
+    {"id": 3, "date": "Monthly", "event": "Seed Swap & Plant Share", "emoji": "🌱", "location": "Community Centre",
+     "start": "2024-01-07", "start_time": "10:00", "end_time": "14:00", "rrule": "FREQ=MONTHLY;BYDAY=1SU"},
+]
+content.register('events', 'events.json', missing=_default_events, corrupt=_default_events)
+
+# Filter and sort indexes, rebuilt whenever their dataset reloads.
+# `python setup.py compile` stores them in the compiled data files too.
+INDEX_SPECS = {
+    'tips': dict(
+        filters=('season', 'seasonal'),
+        sorts={'id': number_key, 'title': None},
+    ),
+    'plants': dict(
+        filters=('type', 'difficulty', 'sun'),
+        sorts={'id': number_key, 'name': None, 'difficulty': difficulty_rank},
+    ),
+    'videos': dict(
+        filters=('difficulty', 'tags', 'instructor'),
+        sorts={'id': number_key, 'title': None, 'date': None, 'duration': duration_seconds,
+               'difficulty': difficulty_rank},
+    ),
+}
+for name, spec in INDEX_SPECS.items():
+    content.derive(name, 'index', lambda records, spec=spec: DatasetIndex(records, **spec))
+
+# Recurrence rules parsed once per load; occurrences expanded once per day
+content.derive('events', 'schedule', Schedule)
+
+# Datasets served whole by /api/bundle and /api/changes
+API_DATASETS = ('tips', 'videos', 'plants', 'events')
+# Per-record change versions, shared by every worker through SQLite
+changelog = ChangeLog()
+for name in API_DATASETS:
+    # Field names present, for validating /api/bundle projections
+    content.derive(name, 'fields', lambda records: getattr(records, 'fields', None) or frozenset(
+        key for record in records if isinstance(record, dict) for key in record))
+    content.derive(name, 'changes', lambda records, name=name: changelog.sync(tenants.qualified(name), records))
+
+# Month buckets for the planting calendar, parsed from the free-text dates
+CALENDAR_FIELDS = {'plants': 'planting_time', 'tips': 'season'}
+for name, field in CALENDAR_FIELDS.items():
+    content.derive(name, 'calendar', lambda records, name=name, field=field: planting.MonthIndex(records, field, name))
+
+@timed('data')
 def load_gardening_tips():
-    try:
-        with open('data/tips.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return [
-            {
-                "id": 1,
-                "title": "Start Small",
-                "description": "Begin with herbs in containers on your balcony or windowsill",
-                "season": "All Year",
-                "emoji": "🌱",
-                "icon": "fas fa-seedling",
-                "seasonal": False
-            }
-        ]
-    except json.JSONDecodeError:
-        return []
+    return content.get('tips')
 
+@timed('data')
 def load_plants_data():
-    try:
-        with open('data/plants.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return [
-            {
-                "id": 1,
-                "name": "Sea Kale",
-                "description": "Loves our coastal breeze! Edible and beautiful.",
-                "sun": "Full Sun",
-                "planting_time": "Spring",
-                "emoji": "🌊",
-                "difficulty": "easy",
-                "type": "vegetable"
-            }
-        ]
-    except json.JSONDecodeError:
-        return []
+    return content.get('plants')
 
+@timed('data')
 def load_video_classes():
-    try:
-        with open('data/videos.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return [
-            {
-                "id": 1,
-                "title": "Getting Started with Balcony Gardening",
-                "description": "Learn how to grow vegetables, herbs, and flowers in small spaces",
-                "date": "2024-03-15",
-                "duration": "25:30",
-                "youtube_id": "dQw4w9WgXcQ",
-                "instructor": "Sarah O'Connor",
-                "difficulty": "beginner",
-                "tags": ["balcony", "containers", "beginners"],
-                "thumbnail": "https://img.youtube.com/vi/dQw4w9WgXcQ/hqdefault.jpg"
-            }
-        ]
+    return content.get('videos')
+
+@timed('data')
+def load_calendar(name):
+    return content.derived(name, 'calendar')
+
+# Full-text search; each dataset is indexed separately when its file loads
+search_index = SearchIndex(content, {
+    'tips': {'title': 3, 'description': 1, 'season': 1},
+    'plants': {'name': 3, 'description': 1, 'type': 2},
+    'videos': {'title': 3, 'description': 1, 'instructor': 2, 'tags': 2},
+}, scope=current_slug)
+
+@timed('data')
+def query_content(name, **fixed):
+    """One filtered, sorted page of a dataset, as described by the query string"""
+    return query_args(content.derived(name, 'index'), request.args, **fixed)
 
+@app.template_global()
+def content_page(name, sort=None, limit=DEFAULT_LIMIT, **filters):
+    """Lets a template pull one page of a dataset, e.g. content_page('plants', type='herb')"""
+    index = content.derived(name, 'index')
+    unknown = set(filters) - set(index.filters)
+    if unknown:
+        raise QueryError(f"cannot filter {name} by {', '.join(sorted(unknown))}")
+    criteria = {
+        field: list(value) if isinstance(value, (list, tuple)) else [value]
+        for field, value in filters.items()
+    }
+    descending = bool(sort) and sort.startswith('-')
+    return index.query(criteria, sort=sort.lstrip('-') if sort else None,
+                       descending=descending, limit=limit)
+
+@timed('data')
 def load_balbriggan_events():
-    return [
-        {"date": "Weekly", "event": "Community Garden Volunteering", "emoji": "👨‍🌾", "location": "Town Park"},
-        {"date": "Saturdays", "event": "Balbriggan Farmers Market", "emoji": "🛒", "location": "Market Square"},
-        {"date": "Monthly", "event": "Seed Swap & Plant Share", "emoji": "🌱", "location": "Community Centre"},
-    ]
+    return content.get('events')
+
+@timed('data')
+def load_event_schedule():
+    return content.derived('events', 'schedule')
+
+def today():
+    return date.today()
+
+def today_key():
+    return today().isoformat()
+
+def current_month():
+    return datetime.now().strftime("%B")
+
+# ETag / Last-Modified validators and 304 responses
+http_cache = HTTPCache(app, content, compressor)
+# Pages link fingerprinted assets, so a new build changes their output
+http_cache.templates.watch(asset_manifest.path)
+http_cache.templates.watch(image_manifest.path)
+# Rendered bytes of the pages that don't depend on the request
+render_cache = RenderCache(app, content, http_cache.templates, scope=current_slug)
+# {% cache %} blocks shared between pages: nav, footer, tip cards
+fragment_cache = FragmentCache(app, version=http_cache.templates.current, scope=current_slug)
+
+@app.template_global()
+def content_version(name):
+    """Digest of a dataset, for use as a {% cache %} vary key"""
+    return content.digest(name)
+
+# Contact messages and sign-ups are written in the background, and mailed
+# by a thread in one of the gunicorn workers (see gunicorn.conf.py)
+submission_queue = SubmissionQueue()
+deliverer = Deliverer()
+# Bursts of 5 form posts, then one a minute, per client IP and per email
+limiter = RateLimiter(app)
+
+# Serialized /api/bundle responses per (include, fields, content version)
+bundle_cache = LRUCache(max_entries=128, max_bytes=8 * 1024 * 1024, scope=current_slug)
+
+metrics.watch('pages', render_cache.pages)
+metrics.watch('bundles', bundle_cache)
+metrics.watch('compressed', compressor.variants)
+metrics.watch('fragments', fragment_cache.entries)
+metrics.watch('search', search_index.results)
+# Cache entries count towards their town's share of the memory budget
+tenants.watch('pages', render_cache.pages)
+tenants.watch('bundles', bundle_cache)
+tenants.watch('compressed', compressor.variants)
+tenants.watch('fragments', fragment_cache.entries)
+tenants.watch('search', search_index.results)
+
+def town_info():
+    """Info of the town the request is for; BALBRIGGAN_INFO on the main site"""
+    return tenants.current().info
+
+@app.context_processor
+def inject_town():
+    return {"town": town_info()}
 
 @app.route('/')
+@http_cache.conditional(templates=True)
+@render_cache.cached()
 def home():
     return render_template('index.html')
 
 @app.route('/videos')
+@http_cache.conditional('videos', 'tips', templates=True)
 def videos_page():
-    videos = load_video_classes()
+    page = query_content('videos')
     tips = load_gardening_tips()
     return render_template('videos.html', 
-                         videos=videos,
+                         videos=page.items,
+                         page=page,
                          tips=tips[:2],
-                         balbriggan=BALBRIGGAN_INFO)
+                         balbriggan=town_info())
 
 @app.route('/tips')
+@http_cache.conditional('tips', templates=True)
 def tips_page():
     tips = load_gardening_tips()
-    return render_template('tips.html', tips=tips, balbriggan=BALBRIGGAN_INFO)
+    return render_template('tips.html', tips=tips, balbriggan=town_info())
 
 @app.route('/plants')
+@http_cache.conditional('plants', templates=True)
 def plants_page():
-    plants = load_plants_data()
-    return render_template('plants.html', plants=plants, balbriggan=BALBRIGGAN_INFO)
+    page = query_content('plants')
+    return render_template('plants.html',
+                         plants=page.items,
+                         page=page,
+                         active_type=request.args.get('type', 'all'),
+                         balbriggan=town_info())
 
 @app.route('/seasonal')
+@http_cache.conditional('tips', 'plants', templates=True, vary=current_month)
 def seasonal_page():
-    tips = load_gardening_tips()
-    seasonal_tips = [tip for tip in tips if tip.get('seasonal', False)]
+    tips = load_calendar('tips')
+    plants = load_calendar('plants')
     
-    current_month = datetime.now().strftime("%B")
+    month = current_month()
     month_emoji = {
         "January": "❄️", "February": "🌨️", "March": "🌱", "April": "🌸",
         "May": "🌻", "June": "☀️", "July": "🏖️", "August": "🌊",
@@ -120,45 +300,66 @@ def seasonal_page():
     }
     
     return render_template('seasonal.html', 
-                         tips=seasonal_tips,
-                         current_month=current_month,
-                         month_emoji=month_emoji.get(current_month, "📅"),
-                         balbriggan=BALBRIGGAN_INFO)
+                         tips_by_season=tips.seasons,
+                         plants_this_month=plants.month(planting.month_number(month))[:24],
+                         current_month=month,
+                         month_emoji=month_emoji.get(month, "📅"),
+                         balbriggan=town_info())
 
 @app.route('/community')
+@http_cache.conditional('events', templates=True, vary=today_key)
+@render_cache.cached('events', vary=today_key)
 def community_page():
     events = load_balbriggan_events()
-    return render_template('community.html', events=events, balbriggan=BALBRIGGAN_INFO)
+    next_dates = {
+        event_id: f'{day:%a} {day.day} {day:%b}'
+        for event_id, day in ((event_id, date.fromisoformat(iso))
+                              for event_id, iso in load_event_schedule().next_dates(today()).items())
+    }
+    return render_template('community.html', events=events, next_dates=next_dates, balbriggan=town_info())
 
 @app.route('/contact', methods=['GET', 'POST'])
+@limiter.limit(rate=1 / 60, burst=5, by_email=True)
+@http_cache.conditional(templates=True)
+@render_cache.cached()
 def contact():
     if request.method == 'POST':
         name = request.form.get('name')
         email = request.form.get('email')
         message = request.form.get('message')
+        if email:
+            submission_queue.enqueue('contact', email, name=name, message=message)
         
         flash("🎉 Thanks for reaching out! We'll get back to you soon!", "success")
         return redirect(url_for('contact'))
     
-    return render_template('contact.html', balbriggan=BALBRIGGAN_INFO)
+    return render_template('contact.html', balbriggan=town_info())
 
 # New legal pages
 @app.route('/privacy')
+@http_cache.conditional(templates=True)
+@render_cache.cached()
 def privacy_page():
-    return render_template('privacy.html', balbriggan=BALBRIGGAN_INFO)
+    return render_template('privacy.html', balbriggan=town_info())
 
 @app.route('/terms')
+@http_cache.conditional(templates=True)
+@render_cache.cached()
 def terms_page():
-    return render_template('terms.html', balbriggan=BALBRIGGAN_INFO)
+    return render_template('terms.html', balbriggan=town_info())
 
 @app.route('/rules')
+@http_cache.conditional(templates=True)
+@render_cache.cached()
 def rules_page():
-    return render_template('rules.html', balbriggan=BALBRIGGAN_INFO)
+    return render_template('rules.html', balbriggan=town_info())
 
 @app.route('/subscribe', methods=['POST'])
+@limiter.limit(rate=1 / 60, burst=5, by_email=True)
 def subscribe():
     email = request.form.get('email')
     if email:
+        submission_queue.enqueue('subscribe', email)
         flash(f"🌱 Welcome to GrowBalbriggan! Check your email for gardening tips!", "success")
     else:
         flash("Please enter a valid email address", "error")
@@ -166,33 +367,266 @@ def subscribe():
     return redirect(request.referrer or url_for('videos_page'))
 
 # API endpoints
+def paginated(page):
+    """JSON list of one page; totals and the next-page link go in headers"""
+    response = jsonify(page.items)
+    response.headers['X-Total-Count'] = str(page.total)
+    if page.next_cursor:
+        args = request.args.to_dict(flat=False)
+        args['cursor'] = page.next_cursor
+        next_url = url_for(request.endpoint, **request.view_args, **args, _external=True)
+        response.headers['X-Next-Cursor'] = page.next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
 @app.route('/api/tips')
-def api_tips():
-    tips = load_gardening_tips()
-    return jsonify(tips)
+@app.route('/api/tips/<season>')
+@http_cache.conditional('tips')
+def api_tips(season=None):
+    if season is not None:
+        return paginated(query_content('tips', season=season))
+    return paginated(query_content('tips'))
 
 @app.route('/api/videos')
+@http_cache.conditional('videos')
 def api_videos():
-    videos = load_video_classes()
-    return jsonify(videos)
+    return paginated(query_content('videos'))
+
+@app.route('/api/plants')
+@http_cache.conditional('plants')
+def api_plants():
+    return paginated(query_content('plants'))
+
+@app.route('/api/calendar/<month>')
+@http_cache.conditional('plants', 'tips')
+def api_calendar(month):
+    """What to plant and which tips apply in a month (name, abbreviation or 1-12)"""
+    number = planting.month_number(month)
+    if number is None:
+        raise QueryError(f"unknown month '{month}'")
+    return jsonify({
+        "month": planting.MONTHS[number - 1],
+        "plants": list(load_calendar('plants').month(number)),
+        "tips": list(load_calendar('tips').month(number)),
+    })
+
+def bundle_args():
+    """(include, fields) from ?include=tips,videos&fields[videos]=id,title"""
+    include = sorted({name for name in request.args.get('include', '').split(',') if name}) \
+        or sorted(API_DATASETS)
+    unknown = set(include) - set(API_DATASETS)
+    if unknown:
+        raise QueryError(f"cannot bundle {', '.join(sorted(unknown))}")
+    fields = {}
+    for key in request.args:
+        if not (key.startswith('fields[') and key.endswith(']')):
+            continue
+        name = key[len('fields['):-1]
+        if name not in include:
+            raise QueryError(f"fields[{name}] given but {name} is not included")
+        wanted = [field for value in request.args.getlist(key) for field in value.split(',') if field]
+        unknown = set(wanted) - content.derived(name, 'fields')
+        if unknown:
+            raise QueryError(f"{name} have no field {', '.join(sorted(unknown))}")
+        fields[name] = tuple(dict.fromkeys(wanted))
+    return tuple(include), tuple(sorted(fields.items()))
+
+def project(records, fields):
+    if fields is None:
+        return list(records)
+    return [{field: record[field] for field in fields if field in record} for record in records]
+
+BUNDLE_LOADERS = {
+    'tips': load_gardening_tips,
+    'videos': load_video_classes,
+    'plants': load_plants_data,
+    'events': load_balbriggan_events,
+}
+
+@app.route('/api/bundle')
+@http_cache.conditional(*API_DATASETS)
+def api_bundle():
+    """Several datasets in one response, each optionally cut down to fields[<name>]"""
+    include, fields = bundle_args()
+    key = (include, fields, content.digest(*include))
+    body = bundle_cache.get(key)
+    if body is None:
+        projections = dict(fields)
+        body = jsonify({
+            name: project(BUNDLE_LOADERS[name](), projections.get(name)) for name in include
+        }).get_data()
+        bundle_cache.set(key, body, len(body))
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/changes')
+@http_cache.conditional(*API_DATASETS, vary=lambda: changelog.log_id, cache_control='no-cache')
+def api_changes():
+    """Records added, updated and deleted after ?since=<version> of change log ?log=<id>
+
+    A client that sends another log's id gets everything again, with
+    "reset": true.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        raise QueryError('since must be a number')
+    if since < 0:
+        raise QueryError('since must not be negative')
+    # Skip the stat() throttle: a delta must not lag behind other workers
+    content.refresh(*API_DATASETS)
+    snapshots = {name: content.derived(name, 'changes') for name in API_DATASETS}
+    log = request.args.get('log')
+    reset = bool(log) and log != changelog.log_id
+    if reset:
+        since = 0
+    log_id, version, changes = changelog.since(since, snapshots)
+    return jsonify({"log": log_id, "since": since, "version": version, "reset": reset, "changes": changes})
+
+def date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"'{name}' must be a date like 2024-05-01")
 
 @app.route('/api/balbriggan-events')
+@http_cache.conditional('events', vary=today_key)
 def api_events():
-    events = load_balbriggan_events()
-    return jsonify(events)
+    """The events, or with ?from=&to= (dates, `to` exclusive) their occurrences in that range"""
+    if 'from' not in request.args and 'to' not in request.args:
+        return jsonify(load_balbriggan_events())
+    start = date_arg('from', today())
+    end = date_arg('to', start + timedelta(days=7))
+    if end < start:
+        raise QueryError("'to' must not be before 'from'")
+    index = load_event_schedule().occurrences(today())
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "horizon": {"from": index.start.isoformat(), "to": index.end.isoformat()},
+        "occurrences": index.between(start, end),
+    })
+
+@app.route('/api/balbriggan-events.ics')
+@http_cache.conditional('events', cache_control='public, max-age=3600')
+def events_feed():
+    """iCalendar feed of the events, rendered once per events.json version"""
+    mtime = content.last_modified('events') or 0
+    feed = load_event_schedule().ics(stamp=datetime.fromtimestamp(int(mtime), timezone.utc))
+    response = app.response_class(feed, mimetype='text/calendar')
+    response.headers['Content-Disposition'] = 'inline; filename="growbalbriggan-events.ics"'
+    return response
+
+def search_result(score, name, record):
+    if name == 'tips':
+        title, url = record.get('title'), url_for('tips_page')
+    elif name == 'plants':
+        title, url = record.get('name'), url_for('plants_page', type=record.get('type'))
+    else:
+        title, url = record.get('title'), f"https://www.youtube.com/watch?v={record.get('youtube_id')}"
+    return {
+        "type": name,
+        "id": record.get('id'),
+        "title": title,
+        "description": record.get('description'),
+        "emoji": record.get('emoji'),
+        "url": url,
+        "score": score,
+    }
+
+def run_search():
+    query = request.args.get('q', '').strip()
+    names = [name for name in request.args.get('type', '').split(',') if name]
+    unknown = set(names) - set(search_index.fields)
+    if unknown:
+        raise QueryError(f"cannot search {', '.join(sorted(unknown))}")
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        raise QueryError('limit must be a number')
+    prefix = request.args.get('prefix', '1') != '0'
+    matches = search_index.search(query, names=names or None, limit=limit, prefix=prefix)
+    return query, [search_result(*match) for match in matches]
+
+@app.route('/search')
+@http_cache.conditional('tips', 'plants', 'videos', templates=True)
+def search_page():
+    query, results = run_search()
+    return render_template('search.html', query=query, results=results, balbriggan=town_info())
+
+@app.route('/api/search')
+@http_cache.conditional('tips', 'plants', 'videos')
+def api_search():
+    query, results = run_search()
+    return jsonify({"query": query, "results": results})
+
+# Pages the service worker saves on install, so they open offline
+OFFLINE_PAGES = ['/', '/videos', '/tips', '/plants', '/seasonal', '/community']
+
+@app.route('/sw.js')
+@http_cache.conditional(templates=True, cache_control='no-cache')
+def service_worker():
+    """Service worker with the current precache manifest, served at the root scope"""
+    precache = [url for name in assets.shell_files() for url in assets.bundle_urls(asset_manifest, name)]
+    # Changes with every asset build, template edit or deploy
+    version = hashlib.blake2b(
+        '|'.join([CODE_VERSION, http_cache.templates.current()] + precache).encode('utf-8'),
+        digest_size=6,
+    ).hexdigest()
+    # Towns served under a path prefix get a worker scoped to it
+    root = request.script_root
+    pages = [root + page for page in OFFLINE_PAGES]
+    response = make_response(render_template('sw.js', version=version, root=root, precache=precache, pages=pages))
+    response.mimetype = 'application/javascript'
+    response.headers['Service-Worker-Allowed'] = root + '/'
+    return response
 
 @app.route('/health')
 def health_check():
-    return jsonify({"status": "healthy", "service": "GrowBalbriggan"})
+    # Set by warmup.boot() when served through wsgi.py
+    boot_report = app.extensions.get('boot_report')
+    return jsonify({
+        "status": "healthy",
+        "service": "GrowBalbriggan",
+        "caches": {
+            "pages": render_cache.pages.stats(),
+            "compressed": compressor.variants.stats(),
+            "bundles": bundle_cache.stats(),
+        },
+        "fragments": fragment_cache.stats(),
+        "calendar": {
+            "unparsed": {name: load_calendar(name).unparsed for name in ('plants', 'tips')},
+            "invalid_events": load_event_schedule().invalid,
+        },
+        "tenants": tenants.stats(),
+        "submissions": submission_queue.stats(),
+        "delivery": deliverer.stats(),
+        "rate_limited": limiter.rejected,
+        "boot": boot_report.as_dict() if boot_report else None,
+    })
 
 # Error handlers
+def wants_json():
+    if request.path.startswith('/api/'):
+        return True
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+@app.errorhandler(QueryError)
+def bad_query(e):
+    if wants_json():
+        return jsonify({"error": str(e)}), 400
+    return render_template('400.html', error=str(e), balbriggan=town_info()), 400
+
 @app.errorhandler(404)
+@render_cache.cached(per_path=False)
 def page_not_found(e):
-    return render_template('404.html', balbriggan=BALBRIGGAN_INFO), 404
+    return render_template('404.html', balbriggan=town_info()), 404
 
 @app.errorhandler(500)
 def internal_server_error(e):
-    return render_template('500.html', balbriggan=BALBRIGGAN_INFO), 500
+    return render_template('500.html', balbriggan=town_info()), 500
 
 # Create necessary directories on startup
 def create_directories():
@@ -0,0 +1,272 @@
+"""Static asset pipeline: bundles, minification and content-hashed names.
+
+`python setup.py assets` minifies every CSS/JS file under static/, joins the
+BUNDLES below, copies each result (and every other static file) to
+static/dist/ under a content-hashed name, with .br/.gz siblings for text
+files, and writes static/dist/manifest.json.
+
+While that manifest exists, url_for('static', ...) and bundle_tags() resolve
+through it and the fingerprinted files are served with immutable far-future
+cache headers. Without it, as in local development, the source files are
+linked directly.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import textwrap
+import threading
+import time
+
+from flask import request, url_for
+from markupsafe import Markup
+
+from compression import write_precompressed
+from content import BASE_DIR, CHECK_INTERVAL
+
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+# Files served together on every page; anything else is a bundle of one
+BUNDLES = {
+    'css/site.css': ['css/style.css', 'css/base.css'],
+    'js/site.js': ['js/base.js', 'js/script.js'],
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Needed by every page; the service worker precaches these and the per-page
+# bundles (see shell_files())
+SHELL = ['css/site.css', 'js/site.js', 'images/growbalbriggan-logo.png']
+
+_css_tokens = re.compile(r'(/\*.*?\*/)|("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')', re.S)
+
+
+def _squeeze_css(chunk):
+    chunk = re.sub(r'\s+', ' ', chunk)
+    chunk = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+    # Never strip the space *before* a colon: "a :hover" != "a:hover"
+    return re.sub(r':\s+', ':', chunk)
+
+
+def minify_css(css):
+    """Drop comments and redundant whitespace, leaving strings untouched"""
+    out = []
+    pending = ''
+    position = 0
+    for match in _css_tokens.finditer(css):
+        pending += css[position:match.start()]
+        if match.group(2):
+            out.append(_squeeze_css(pending))
+            out.append(match.group(2))
+            pending = ''
+        position = match.end()
+    out.append(_squeeze_css(pending + css[position:]))
+    return ''.join(out).replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """Conservative JS minifier: indentation, blank lines and // comment lines
+
+    Lines are never joined (no reliance on automatic semicolon insertion),
+    and lines inside template literals are kept exactly as written.
+    """
+    out = []
+    in_template = False
+    for line in js.splitlines():
+        if in_template:
+            out.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                out.append(stripped)
+        if line.replace('\\`', '').count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(out)
+
+
+def minify(path, data):
+    if path.endswith('.css'):
+        return minify_css(data.decode('utf-8')).encode('utf-8')
+    if path.endswith('.js'):
+        return minify_js(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+def fingerprinted(path, data):
+    stem, ext = os.path.splitext(path)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f'{DIST}/{stem}.{digest}{ext}'
+
+
+def source_files(static_dir=STATIC_DIR):
+    """Relative paths of every static file outside dist/"""
+    paths = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if not (root == static_dir and d == DIST))
+        for filename in sorted(files):
+            path = os.path.relpath(os.path.join(root, filename), static_dir)
+            paths.append(path.replace(os.sep, '/'))
+    return paths
+
+
+def build(static_dir=STATIC_DIR):
+    """Write fingerprinted files and the manifest; returns the manifest"""
+    outputs = {}
+    for path in source_files(static_dir):
+        with open(os.path.join(static_dir, path), 'rb') as f:
+            outputs[path] = minify(path, f.read())
+    for bundle, sources in BUNDLES.items():
+        outputs[bundle] = b'\n'.join(outputs[source] for source in sources if source in outputs)
+
+    assets = {}
+    for path, data in sorted(outputs.items()):
+        target = fingerprinted(path, data)
+        full = os.path.join(static_dir, target)
+        if not os.path.exists(full):
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'wb') as f:
+                f.write(data)
+        if not os.path.exists(full + '.gz'):
+            write_precompressed(full)
+        assets[path] = target
+
+    manifest = {"assets": assets, "bundles": BUNDLES}
+    manifest_path = os.path.join(static_dir, DIST, MANIFEST)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+_inline_blocks = {
+    'extra_css': (re.compile(r'({%\s*block extra_css\s*%})\s*<style>(.*?)</style>\s*({%\s*endblock\s*%})', re.S),
+                  'css/pages/{name}.css'),
+    'extra_js': (re.compile(r'({%\s*block extra_js\s*%})\s*<script>(.*?)</script>\s*({%\s*endblock\s*%})', re.S),
+                 'js/pages/{name}.js'),
+}
+
+
+def extract_inline_assets(template_dir=TEMPLATE_DIR, static_dir=STATIC_DIR):
+    """Move inline <style>/<script> in extra_css/extra_js blocks to static files
+
+    Blocks containing Jinja syntax are left alone. Returns the files written.
+    """
+    written = []
+    for template in sorted(glob.glob(os.path.join(template_dir, '*.html'))):
+        name = os.path.splitext(os.path.basename(template))[0]
+        with open(template, 'r', encoding='utf-8') as f:
+            source = f.read()
+        changed = source
+        for pattern, target in _inline_blocks.values():
+            match = pattern.search(changed)
+            if match is None or '{{' in match.group(2) or '{%' in match.group(2):
+                continue
+            path = target.format(name=name)
+            full = os.path.join(static_dir, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'w', encoding='utf-8') as f:
+                f.write(textwrap.dedent(match.group(2)).strip('\n') + '\n')
+            written.append(path)
+            replacement = f"{match.group(1)}\n{{{{ bundle_tags('{path}') }}}}\n{match.group(3)}"
+            changed = changed[:match.start()] + replacement + changed[match.end():]
+        if changed != source:
+            with open(template, 'w', encoding='utf-8') as f:
+                f.write(changed)
+    return written
+
+
+def shell_files(static_dir=STATIC_DIR):
+    """SHELL plus every per-page stylesheet and script"""
+    pages = glob.glob(os.path.join(static_dir, 'css', 'pages', '*.css'))
+    pages += glob.glob(os.path.join(static_dir, 'js', 'pages', '*.js'))
+    return SHELL + sorted(os.path.relpath(path, static_dir).replace(os.sep, '/') for path in pages)
+
+
+class AssetManifest:
+    """static/dist/manifest.json, re-read when a new build replaces it
+
+    `filename` and `section` pick another manifest under dist/ and the key
+    its entries are under (images.py keeps its own).
+    """
+
+    def __init__(self, static_dir, check_interval=CHECK_INTERVAL, filename=MANIFEST, section='assets'):
+        self.path = os.path.join(static_dir, DIST, filename)
+        self.section = section
+        self.check_interval = check_interval
+        self.checked_at = 0.0
+        self.signature = None
+        self.assets = {}
+        self._lock = threading.Lock()
+
+    def _check(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self.checked_at < self.check_interval:
+                return
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                signature = None
+            if signature != self.signature:
+                assets = {}
+                if signature is not None:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        assets = json.load(f).get(self.section, {})
+                self.assets = assets
+                self.signature = signature
+            self.checked_at = now
+
+    def resolve(self, filename):
+        self._check()
+        return self.assets.get(filename)
+
+
+def bundle_urls(manifest, name):
+    """URLs of a bundle: one built file, or its sources in development"""
+    if manifest.resolve(name) is not None:
+        sources = [name]
+    else:
+        sources = BUNDLES.get(name, [name])
+    return [url_for('static', filename=source) for source in sources]
+
+
+def init_app(app):
+    """Route url_for('static', ...) through the manifest and add bundle_tags()"""
+    manifest = AssetManifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            target = manifest.resolve(values['filename'])
+            if target is not None:
+                values['filename'] = target
+
+    @app.after_request
+    def cache_fingerprinted(response):
+        if request.endpoint == 'static' and response.status_code in (200, 304):
+            filename = (request.view_args or {}).get('filename', '')
+            if filename.startswith(DIST + '/') and not filename.endswith('.json'):
+                response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    @app.template_global()
+    def bundle_tags(name):
+        """<link>/<script> tags for a bundle"""
+        tags = []
+        for url in bundle_urls(manifest, name):
+            if name.endswith('.css'):
+                tags.append(f'<link rel="stylesheet" href="{url}">')
+            else:
+                tags.append(f'<script src="{url}"></script>')
+        return Markup('\n'.join(tags))
+
+    return manifest
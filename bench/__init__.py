@@ -0,0 +1 @@
+"""Local benchmark harness; see bench/__main__.py"""
@@ -0,0 +1,187 @@
+"""Benchmark every route on synthetic data, locally
+
+    python -m bench                                   # all scales, both modes
+    python -m bench --scales 6,1000 --modes client    # quicker
+    python -m bench --baseline bench/baseline.json    # fail on regressions
+    python -m bench --scales 100 --modes load         # serving modes under load
+
+For each scale, tips/plants/videos.json are generated with that many
+records (bench/synthetic.py) and every request in bench/routes.py is
+timed through the Flask test client, with traced allocations, and
+through a local gunicorn. The load mode instead runs the slow-client and
+many-connection scenarios of bench/load.py against gunicorn in each
+--serving mode. Results go to bench/results/<timestamp>.json.
+
+With --baseline, routes whose p95 latency grew or whose throughput fell
+by more than --threshold (a fraction) are listed and the run exits 1.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import load, server, synthetic
+
+BASE_DIR = server.BASE_DIR
+RESULTS_DIR = os.path.join(BASE_DIR, 'bench', 'results')
+DEFAULT_SCALES = '6,100,1000,10000,100000'
+
+
+def environment(work_dir, data_dir):
+    """Isolated state for the app under test"""
+    return dict(
+        os.environ,
+        GROWBALBRIGGAN_DATA_DIR=data_dir,
+        SUBMISSIONS_DB=os.path.join(work_dir, 'submissions.db'),
+        RATELIMIT_FILE=os.path.join(work_dir, 'ratelimit.bin'),
+        METRICS_DIR=os.path.join(work_dir, 'metrics'),
+        CHANGES_DB=os.path.join(work_dir, 'changes.db'),
+        PROFILE_DIR=os.path.join(work_dir, 'profiles'),
+        TOWNS_DIR=os.path.join(work_dir, 'towns'),
+        RATE_LIMIT_ENABLED='0',
+        PYTHONPATH=BASE_DIR,
+    )
+
+
+def run_client(env, work_dir, args):
+    output = os.path.join(work_dir, 'client.json')
+    command = [sys.executable, '-m', 'bench.client', output, str(args.requests), str(args.max_seconds)]
+    if args.routes:
+        command.append(args.routes)
+    subprocess.run(command, cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    with open(output, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def run_gunicorn(env, args):
+    with server.Gunicorn(env, workers=args.workers) as gunicorn:
+        return server.run(gunicorn, args.requests, args.max_seconds, args.concurrency, args.routes)
+
+
+def run_load(env, args, serving):
+    with server.Gunicorn(dict(env, GUNICORN_MODE=serving), workers=args.workers) as gunicorn:
+        return load.run(gunicorn, args.requests, args.max_seconds, args.concurrency,
+                        args.connections, args.slow_clients)
+
+
+def serving_modes(names):
+    modes = []
+    for name in names.split(','):
+        if name == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print('⚠️  Skipping the gevent serving mode: gevent is not installed')
+            continue
+        modes.append(name)
+    return modes
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """(key, metric, before, after) for every regression beyond threshold"""
+    before = {(r['mode'], r['scale'], r['route']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        key = (result['mode'], result['scale'], result['route'])
+        old = before.get(key)
+        if old is None:
+            continue
+        if old['p95_ms'] and result['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append((key, 'p95_ms', old['p95_ms'], result['p95_ms']))
+        if old['throughput_rps'] and result['throughput_rps'] < old['throughput_rps'] * (1 - threshold):
+            regressions.append((key, 'throughput_rps', old['throughput_rps'], result['throughput_rps']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help='records per dataset, comma separated')
+    parser.add_argument('--modes', default='client,gunicorn', help='any of client, gunicorn and load')
+    parser.add_argument('--routes', help='only requests whose "METHOD /path" contains this')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--max-seconds', type=float, default=3.0, help='time budget per route')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel clients against gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--serving', default='sync,gthread,gevent', help='GUNICORN_MODEs the load mode compares')
+    parser.add_argument('--connections', type=int, default=100, help='clients in the many-connections scenario')
+    parser.add_argument('--slow-clients', type=int, default=8, help='slow connections in the slow-clients scenario')
+    parser.add_argument('--output', help='results file (default bench/results/<timestamp>.json)')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression, as a fraction')
+    args = parser.parse_args(argv)
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    modes = args.modes.split(',')
+    servings = serving_modes(args.serving) if 'load' in modes else []
+    report = {
+        "meta": {
+            "started_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix='growbalbriggan-bench-') as root:
+        for scale in scales:
+            data_dir = synthetic.generate(scale, os.path.join(root, f'data-{scale}'))
+            for mode in modes:
+                work_dir = os.path.join(root, f'{mode}-{scale}')
+                os.makedirs(work_dir)
+                env = environment(work_dir, data_dir)
+                print(f'⏱️  {mode} with {scale} records per dataset...', flush=True)
+                if mode == 'client':
+                    run = run_client(env, work_dir, args)
+                    if run['uncovered']:
+                        print(f"⚠️  Routes without a benchmark request: {', '.join(run['uncovered'])}")
+                    runs = [(mode, run)]
+                elif mode == 'load':
+                    runs = [(f'load-{serving}', run_load(env, args, serving)) for serving in servings]
+                else:
+                    runs = [(mode, run_gunicorn(env, args))]
+                for label, run in runs:
+                    if len(runs) > 1:
+                        print(f'   {label}')
+                    for result in run['results']:
+                        result.update(mode=label, scale=scale)
+                        report['results'].append(result)
+                        print(f"   {result['route']:<45} {result['throughput_rps']:>9.1f} req/s  "
+                              f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+                              f"p99 {result['p99_ms']:>8.2f}ms"
+                              + (f"  peak {result['alloc_peak_kib']:>8.1f}KiB" if 'alloc_peak_kib' in result else '')
+                              + (f"  {result['errors']} errors" if result.get('errors') else ''))
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n📄 Results written to {os.path.relpath(output)}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report['results'], baseline, args.threshold)
+        for (mode, scale, route), metric, old, new in regressions:
+            print(f'❌ {mode} {scale} {route}: {metric} {old} -> {new}')
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+            return 1
+        print(f'✅ No regressions beyond {args.threshold:.0%} against {os.path.relpath(args.baseline)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""In-process benchmark through the Flask test client
+
+Run by bench/__main__.py in a fresh interpreter per scale, since the app
+reads GROWBALBRIGGAN_DATA_DIR when it is imported:
+
+    python -m bench.client OUTPUT.json REQUESTS MAX_SECONDS [PATTERN]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from bench.routes import HEADERS, label, selected, uncovered
+from bench.stats import summarize
+
+ALLOCATION_SAMPLES = 20
+WARMUP_REQUESTS = 3
+
+
+def allocations(send):
+    """Median peak and retained bytes traced across a few requests"""
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOCATION_SAMPLES):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            send()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    retained.sort()
+    return {
+        "alloc_peak_kib": round(peaks[len(peaks) // 2] / 1024, 1),
+        "alloc_retained_kib": round(retained[len(retained) // 2] / 1024, 1),
+    }
+
+
+def run(requests, max_seconds, pattern=None):
+    from app import app
+
+    client = app.test_client(use_cookies=False)
+    results = []
+    for method, path, data in selected(pattern):
+        def send():
+            response = client.open(path, method=method, data=data, headers=HEADERS)
+            response.close()
+            return response
+
+        status = None
+        for _ in range(WARMUP_REQUESTS):
+            status = send().status_code
+
+        latencies = []
+        started = time.perf_counter()
+        deadline = started + max_seconds
+        while len(latencies) < requests:
+            began = time.perf_counter()
+            send()
+            finished = time.perf_counter()
+            latencies.append(finished - began)
+            if finished > deadline:
+                break
+        wall = time.perf_counter() - started
+
+        result = {"route": label(method, path), "status": status}
+        result.update(summarize(latencies, wall))
+        result.update(allocations(send))
+        results.append(result)
+    return {"results": results, "uncovered": uncovered(app)}
+
+
+if __name__ == '__main__':
+    output, requests, max_seconds = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+    pattern = sys.argv[4] if len(sys.argv) > 4 else None
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(run(requests, max_seconds, pattern), f)
@@ -0,0 +1,158 @@
+"""Load scenarios against a local gunicorn, per serving mode (GUNICORN_MODE)
+
+- many-connections: CONNECTIONS clients, each on its own keep-alive
+  connection, request a route at the same time.
+- slow-clients: SLOW_CLIENTS connections trickle a form post to the server
+  a few bytes at a time or read a page a kilobyte at a time, while a few
+  ordinary clients are timed on the route.
+
+Run by bench/__main__.py with `--modes load`; each serving mode is reported
+as mode "load-<serving mode>", with "<scenario>: <route>" as the route.
+"""
+import http.client
+import socket
+import threading
+import time
+from urllib.parse import urlencode
+
+from bench.routes import HEADERS, label
+from bench.server import request
+from bench.stats import summarize
+
+ROUTES = [
+    ('GET', '/videos', None),
+    ('GET', '/api/tips', None),
+]
+SLOW_POST = ('/contact', {'name': 'Slow', 'email': 'slow@example.com', 'message': 'Typed on a bad connection'})
+SLOW_READ = '/videos'
+# A slow client sends or reads this much, then waits SLOW_INTERVAL
+SLOW_CHUNK = 4
+SLOW_READ_CHUNK = 1024
+SLOW_INTERVAL = 0.05
+# Time given to the slow clients to occupy the server before timing starts
+SETTLE_SECONDS = 0.5
+TIMEOUT = 30
+
+
+def timed_clients(port, method, path, data, clients, max_seconds, requests=None):
+    """Latencies of `clients` threads sending the request until time is up"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + max_seconds
+    remaining = [requests if requests is not None else float('inf')]
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+        headers = dict(HEADERS)
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            while time.perf_counter() < deadline:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                began = time.perf_counter()
+                try:
+                    # Reconnects by itself when the server closed the connection
+                    connection.request(method, path, body=body, headers=headers)
+                    connection.getresponse().read()
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - began)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def slow_post(port, stop):
+    """Post a form a few bytes at a time, over and over"""
+    path, data = SLOW_POST
+    body = urlencode(data).encode('ascii')
+    head = (f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n'
+            f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n')
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=TIMEOUT) as s:
+                s.sendall(head.encode('ascii'))
+                for start in range(0, len(body), SLOW_CHUNK):
+                    if stop.wait(SLOW_INTERVAL):
+                        return
+                    s.sendall(body[start:start + SLOW_CHUNK])
+                while s.recv(65536):
+                    pass
+        except OSError:
+            stop.wait(SLOW_INTERVAL)
+
+
+def slow_read(port, stop):
+    """Fetch a page uncompressed through a small receive buffer, slowly"""
+    message = (f'GET {SLOW_READ} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+               'Accept-Encoding: identity\r\nConnection: close\r\n\r\n').encode('ascii')
+    while not stop.is_set():
+        try:
+            s = socket.socket()
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_READ_CHUNK)
+            s.settimeout(TIMEOUT)
+            with s:
+                s.connect(('127.0.0.1', port))
+                s.sendall(message)
+                while s.recv(SLOW_READ_CHUNK):
+                    if stop.wait(SLOW_INTERVAL):
+                        return
+        except OSError:
+            stop.wait(SLOW_INTERVAL)
+
+
+def result(scenario, method, path, status, latencies, errors, wall):
+    row = {"route": f'{scenario}: {label(method, path)}', "status": status, "errors": len(errors)}
+    row.update(summarize(latencies, wall))
+    return row
+
+
+def many_connections(port, statuses, connections, max_seconds):
+    rows = []
+    for (method, path, data), status in zip(ROUTES, statuses):
+        latencies, errors, wall = timed_clients(port, method, path, data, connections, max_seconds)
+        rows.append(result('many-connections', method, path, status, latencies, errors, wall))
+    return rows
+
+
+def slow_clients(port, statuses, slow, concurrency, max_seconds, requests):
+    stop = threading.Event()
+    threads = [threading.Thread(target=slow_post if i % 2 else slow_read, args=(port, stop), daemon=True)
+               for i in range(slow)]
+    for thread in threads:
+        thread.start()
+    rows = []
+    try:
+        time.sleep(SETTLE_SECONDS)
+        for (method, path, data), status in zip(ROUTES, statuses):
+            latencies, errors, wall = timed_clients(port, method, path, data, concurrency, max_seconds, requests)
+            rows.append(result('slow-clients', method, path, status, latencies, errors, wall))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(TIMEOUT)
+    return rows
+
+
+def run(server, requests, max_seconds, concurrency, connections, slow):
+    # Also warms each route before it is timed
+    statuses = [request('127.0.0.1', server.port, method, path, data) for method, path, data in ROUTES]
+    return {"results": many_connections(server.port, statuses, connections, max_seconds)
+            + slow_clients(server.port, statuses, slow, concurrency, max_seconds, requests)}
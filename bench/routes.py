@@ -0,0 +1,62 @@
+"""The requests the benchmark makes: every route in app.py at least once"""
+
+# (method, path, form data)
+REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/videos', None),
+    ('GET', '/videos?difficulty=beginner&sort=-date', None),
+    ('GET', '/tips', None),
+    ('GET', '/plants', None),
+    ('GET', '/plants?type=herb', None),
+    ('GET', '/seasonal', None),
+    ('GET', '/community', None),
+    ('GET', '/contact', None),
+    ('POST', '/contact', {'name': 'Bench', 'email': 'bench@example.com', 'message': 'Hello from the benchmark'}),
+    ('GET', '/privacy', None),
+    ('GET', '/terms', None),
+    ('GET', '/rules', None),
+    ('POST', '/subscribe', {'email': 'bench@example.com'}),
+    ('GET', '/api/tips', None),
+    ('GET', '/api/tips/summer', None),
+    ('GET', '/api/videos', None),
+    ('GET', '/api/videos?tags=compost&sort=duration', None),
+    ('GET', '/api/plants?type=herb&sort=name', None),
+    ('GET', '/api/balbriggan-events', None),
+    ('GET', '/api/balbriggan-events?from=2024-06-01&to=2024-07-01', None),
+    ('GET', '/api/balbriggan-events.ics', None),
+    ('GET', '/api/calendar/april', None),
+    ('GET', '/api/changes', None),
+    ('GET', '/api/changes?since=10', None),
+    ('GET', '/api/bundle', None),
+    ('GET', '/api/bundle?include=tips,videos&fields[videos]=id,title,youtube_id', None),
+    ('GET', '/search?q=tomato', None),
+    ('GET', '/api/search?q=com', None),
+    ('GET', '/sw.js', None),
+    ('GET', '/health', None),
+    ('GET', '/metrics', None),
+    ('GET', '/no-such-page', None),
+]
+
+HEADERS = {'Accept-Encoding': 'gzip, br'}
+
+
+def label(method, path):
+    return f'{method} {path}'
+
+
+def selected(pattern=None):
+    return [spec for spec in REQUESTS if not pattern or pattern in label(*spec[:2])]
+
+
+def uncovered(app):
+    """Endpoints of `app` that no benchmark request reaches"""
+    adapter = app.url_map.bind('localhost')
+    reached = set()
+    for method, path, _ in REQUESTS:
+        try:
+            endpoint, _ = adapter.match(path.split('?')[0], method=method)
+        except Exception:
+            continue
+        reached.add(endpoint)
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if rule.endpoint not in reached and rule.endpoint != 'static')
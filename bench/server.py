@@ -0,0 +1,116 @@
+"""Benchmark against a real gunicorn on localhost"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from bench.routes import HEADERS, label, selected
+from bench.stats import summarize
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Gunicorn:
+    """gunicorn serving wsgi:app from the repository root, as in the procfile"""
+
+    def __init__(self, env, workers=2, extra_args=()):
+        self.port = free_port()
+        self.env = env
+        self.workers = workers
+        self.extra_args = list(extra_args)
+        self.process = None
+
+    def __enter__(self):
+        env = dict(self.env, WARMUP_BASE_URL=f'http://127.0.0.1:{self.port}')
+        # gevent has to patch the standard library before gunicorn imports it
+        launcher = ['-m', 'gevent.monkey', '--module'] if env.get('GUNICORN_MODE') == 'gevent' else ['-m']
+        self.process = subprocess.Popen(
+            [sys.executable, *launcher, 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers), '--log-level', 'warning', *self.extra_args, 'wsgi:app'],
+            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited: {self.process.stderr.read().decode()[-2000:]}')
+            try:
+                if request('127.0.0.1', self.port, 'GET', '/health') == 200:
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError('gunicorn did not start within 120s')
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def request(host, port, method, path, data=None, timeout=30):
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        headers = dict(HEADERS)
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run(server, requests, max_seconds, concurrency, pattern=None):
+    results = []
+    for method, path, data in selected(pattern):
+        status = request('127.0.0.1', server.port, method, path, data)
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + max_seconds
+        remaining = [requests]
+
+        def client():
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                began = time.perf_counter()
+                try:
+                    request('127.0.0.1', server.port, method, path, data)
+                except OSError as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                finished = time.perf_counter()
+                with lock:
+                    latencies.append(finished - began)
+                if finished > deadline:
+                    return
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        result = {"route": label(method, path), "status": status, "errors": len(errors)}
+        result.update(summarize(latencies, wall))
+        results.append(result)
+    return {"results": results}
@@ -0,0 +1,100 @@
+"""Synthetic data/*.json files of any size, modelled on the real ones.
+
+Records are the originals with a numbered twist and fields rotated
+through realistic values, generated from a fixed seed so the same scale
+always produces byte-identical files.
+"""
+import json
+import os
+import random
+
+from content import DATA_DIR
+
+SEED = 2024
+SEASONS = ['Spring', 'Summer', 'Autumn', 'Winter', 'All Year']
+PLANT_TYPES = ['vegetable', 'fruit', 'herb', 'flower']
+PLANT_DIFFICULTIES = ['easy', 'medium', 'hard']
+PLANTING_TIMES = ['Spring', 'March-May', 'April-June', "St. Patrick's Day", 'March-September', 'Autumn', 'All Year']
+SUN = ['Full Sun', '6+ hours', 'Partial Sun', 'Partial Shade', '3-4 hours']
+VIDEO_DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+INSTRUCTORS = ["Sarah O'Connor", 'Mike Chen', 'Aoife Murphy', 'Community Team', 'David Ryan', 'Lisa Wong']
+WORDS = ('tomato potato kale seaweed compost mulch prune sow harvest frost greenhouse balcony '
+         'raised-bed pollinator orchard container coastal wind soil rhubarb onion garlic pea bean '
+         'lettuce herb mint thyme rosemary strawberry apple blackcurrant leek carrot beetroot').split()
+
+
+def _phrase(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _load(name, data_dir):
+    with open(os.path.join(data_dir, f'{name}.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def tips(count, originals, rng):
+    records = []
+    for i in range(count):
+        base = originals[i % len(originals)]
+        season = SEASONS[i % len(SEASONS)]
+        records.append(dict(
+            base,
+            id=i + 1,
+            title=base['title'] if i < len(originals) else f"{base['title']} #{i + 1}",
+            description=f"{base['description']} Try it with {_phrase(rng, 3)}.",
+            season=season,
+            seasonal=season != 'All Year',
+        ))
+    return records
+
+
+def plants(count, originals, rng):
+    records = []
+    for i in range(count):
+        base = originals[i % len(originals)]
+        records.append(dict(
+            base,
+            id=i + 1,
+            name=base['name'] if i < len(originals) else f"{base['name']} {i + 1}",
+            description=f"{base['description']} Pairs well with {_phrase(rng, 2)}.",
+            sun=rng.choice(SUN),
+            planting_time=rng.choice(PLANTING_TIMES),
+            difficulty=rng.choice(PLANT_DIFFICULTIES),
+            type=PLANT_TYPES[i % len(PLANT_TYPES)],
+        ))
+    return records
+
+
+def videos(count, originals, rng):
+    records = []
+    for i in range(count):
+        base = originals[i % len(originals)]
+        youtube_id = f'{i:011d}'
+        records.append(dict(
+            base,
+            id=i + 1,
+            title=base['title'] if i < len(originals) else f"{base['title']} (part {i + 1})",
+            description=f"{base['description']} Covers {_phrase(rng, 4)}.",
+            date=f'20{18 + i % 7:02d}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+            duration=f'{10 + rng.randrange(50)}:{rng.randrange(60):02d}',
+            youtube_id=youtube_id,
+            instructor=rng.choice(INSTRUCTORS),
+            difficulty=rng.choice(VIDEO_DIFFICULTIES),
+            tags=sorted(set(rng.sample(WORDS, 4))),
+            thumbnail=f'https://img.youtube.com/vi/{youtube_id}/hqdefault.jpg',
+        ))
+    return records
+
+
+GENERATORS = {'tips': tips, 'plants': plants, 'videos': videos}
+
+
+def generate(count, target_dir, source_dir=DATA_DIR):
+    """Write tips/plants/videos.json with `count` records each into target_dir"""
+    os.makedirs(target_dir, exist_ok=True)
+    rng = random.Random(f'{SEED}:{count}')
+    for name, generator in GENERATORS.items():
+        records = generator(count, _load(name, source_dir), rng)
+        with open(os.path.join(target_dir, f'{name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+    return target_dir
@@ -0,0 +1,350 @@
+"""HTTP caching helpers: strong ETags, Last-Modified and 304 handling."""
+import functools
+import glob
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import make_response, request, session
+
+from content import BASE_DIR, CHECK_INTERVAL
+
+# Changes whenever the deployed code does, so validators issued by an older
+# release never match pages rendered by a newer one
+CODE_VERSION = hashlib.blake2b(
+    ''.join(
+        f'{path}:{os.stat(path).st_mtime_ns};'
+        for path in sorted(glob.glob(os.path.join(BASE_DIR, '*.py')))
+    ).encode('utf-8'),
+    digest_size=8,
+).hexdigest()
+
+API_CACHE_CONTROL = 'public, max-age=60'
+# Pages carry a nav, footer and flash slot, so browsers revalidate each time
+PAGE_CACHE_CONTROL = 'no-cache'
+
+
+class TemplateWatcher:
+    """Fingerprint of the templates folder, re-checked at most every few seconds
+
+    Other files that change rendered output, such as the static asset
+    manifest, can be added with watch().
+    """
+
+    def __init__(self, folder, check_interval=CHECK_INTERVAL):
+        self.folder = folder
+        self.files = []
+        self.check_interval = check_interval
+        self.checked_at = 0.0
+        self.version = None
+        self.mtime = None
+        self._lock = threading.Lock()
+
+    def _check(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self.version is not None and now - self.checked_at < self.check_interval:
+                return
+            signature = hashlib.blake2b(digest_size=8)
+            newest = None
+            for root, dirs, files in os.walk(self.folder):
+                dirs.sort()
+                for filename in sorted(files):
+                    stat = os.stat(os.path.join(root, filename))
+                    signature.update(f'{filename}:{stat.st_mtime_ns}:{stat.st_size};'.encode('utf-8'))
+                    newest = stat.st_mtime if newest is None else max(newest, stat.st_mtime)
+            for path in self.files:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    signature.update(f'{path}:missing;'.encode('utf-8'))
+                    continue
+                signature.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size};'.encode('utf-8'))
+                newest = stat.st_mtime if newest is None else max(newest, stat.st_mtime)
+            self.version = signature.hexdigest()
+            self.mtime = newest
+            self.checked_at = now
+
+    def watch(self, path):
+        self.files.append(path)
+        self.checked_at = 0.0
+
+    def current(self):
+        self._check()
+        return self.version
+
+    def last_modified(self):
+        self._check()
+        return self.mtime
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and by total size in bytes
+
+    With a `scope` callable (the current tenant, say), keys are kept apart
+    per scope and hits, misses, entries and bytes are also counted per scope.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=16 * 1024 * 1024, scope=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.scope = scope
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # scope -> [hits, misses, entries, bytes]
+        self.scopes = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tally(self, key):
+        try:
+            return self.scopes[key[0]]
+        except KeyError:
+            return self.scopes.setdefault(key[0], [0, 0, 0, 0])
+
+    def get(self, key):
+        if self.scope is not None:
+            key = (self.scope(), key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                if self.scope is not None:
+                    self._tally(key)[1] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if self.scope is not None:
+                self._tally(key)[0] += 1
+            return entry[0]
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        if self.scope is not None:
+            key = (self.scope(), key)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._removed(key, old[1])
+            self._entries[key] = (value, size)
+            self.size += size
+            if self.scope is not None:
+                tally = self._tally(key)
+                tally[2] += 1
+                tally[3] += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                evicted, (_, evicted_size) = self._entries.popitem(last=False)
+                self._removed(evicted, evicted_size)
+                self.evictions += 1
+
+    def _removed(self, key, size):
+        self.size -= size
+        if self.scope is not None:
+            tally = self._tally(key)
+            tally[2] -= 1
+            tally[3] -= size
+
+    def discard(self, scope):
+        """Drop every entry of one scope"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == scope]:
+                self._removed(key, self._entries.pop(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            for tally in self.scopes.values():
+                tally[2] = tally[3] = 0
+
+    def scope_bytes(self, scope):
+        tally = self.scopes.get(scope)
+        return tally[3] if tally else 0
+
+    def stats(self, scope=None):
+        """Totals, or with `scope` the counts of that scope alone"""
+        if scope is None:
+            hits, misses, entries, size = self.hits, self.misses, len(self._entries), self.size
+            evictions = self.evictions
+        else:
+            hits, misses, entries, size = self.scopes.get(scope, (0, 0, 0, 0))
+            evictions = None
+        lookups = hits + misses
+        stats = {
+            "entries": entries,
+            "bytes": size,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+        if evictions is None:
+            del stats['evictions']
+        return stats
+
+
+def has_pending_flashes():
+    return '_flashes' in session
+
+
+class HTTPCache:
+    """Issues validators for GET routes and answers 304 before the view runs
+
+    The ETag is derived from the content digests of the datasets a route
+    reads, the template fingerprint for HTML routes and the request URL, so
+    it can be computed without serializing or rendering anything.
+    Cache-Control can be overridden per endpoint through the CACHE_CONTROL
+    config dict.
+    """
+
+    def __init__(self, app, store, compressor=None):
+        self.app = app
+        self.store = store
+        self.compressor = compressor
+        self.templates = TemplateWatcher(os.path.join(app.root_path, app.template_folder))
+        app.config.setdefault('CACHE_CONTROL', {})
+
+    def etag_for(self, datasets, templates, vary):
+        parts = [CODE_VERSION, request.endpoint or '', request.url]
+        if datasets:
+            parts.append(self.store.digest(*datasets))
+        if templates:
+            parts.append(self.templates.current())
+        if vary is not None:
+            parts.append(str(vary()))
+        return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+    def last_modified_for(self, datasets, templates):
+        mtimes = []
+        if datasets:
+            mtimes.append(self.store.last_modified(*datasets))
+        if templates:
+            mtimes.append(self.templates.last_modified())
+        mtimes = [mtime for mtime in mtimes if mtime is not None]
+        if not mtimes:
+            return None
+        return datetime.fromtimestamp(int(max(mtimes)), timezone.utc)
+
+    def is_fresh(self, etag, last_modified):
+        """The validator the client already holds, or None if it's stale
+
+        Compressed responses carry the ETag with an encoding suffix
+        ("<etag>-br"), so that form only matches when the compressor would
+        pick the same encoding for this request, and is echoed back as sent.
+        """
+        if request.if_none_match:
+            if request.if_none_match.contains_weak(etag):
+                return etag
+            encoding = self.compressor.negotiate() if self.compressor is not None else None
+            if encoding is not None and request.if_none_match.contains_weak(f'{etag}-{encoding}'):
+                return f'{etag}-{encoding}'
+            return None
+        if last_modified is not None and request.if_modified_since is not None:
+            if request.if_modified_since >= last_modified:
+                return etag
+        return None
+
+    def conditional(self, *datasets, templates=False, vary=None, cache_control=None):
+        """Decorator for GET views whose output depends only on `datasets`
+
+        `templates` marks HTML routes, `vary` is an optional callable for
+        anything else the output depends on (the current month, say).
+        Routes with a `vary` callable don't get Last-Modified, since a date
+        can't express it.
+        """
+        if cache_control is None:
+            cache_control = PAGE_CACHE_CONTROL if templates else API_CACHE_CONTROL
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+                # Flashed messages are rendered into the page and then consumed
+                if templates and has_pending_flashes():
+                    return view(*args, **kwargs)
+
+                etag = self.etag_for(datasets, templates, vary)
+                last_modified = None if vary is not None else self.last_modified_for(datasets, templates)
+                policy = self.app.config['CACHE_CONTROL'].get(request.endpoint, cache_control)
+
+                fresh = self.is_fresh(etag, last_modified)
+                if fresh is not None:
+                    response = self.app.response_class(status=304)
+                    etag = fresh
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+
+                response.set_etag(etag)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                if policy:
+                    response.headers['Cache-Control'] = policy
+                return response
+            # What the output depends on, for tools that render routes
+            # outside a request (see export.py)
+            wrapper.conditional = {"datasets": datasets, "templates": templates, "vary": vary}
+            return wrapper
+        return decorator
+
+
+class RenderCache:
+    """Keeps the rendered bytes of pages that only depend on templates and data
+
+    Entries are keyed on the view, the URL without its query string
+    (base.html prints it in og:url), the `query_args` the view reads, the
+    templates fingerprint, the digests of the datasets the view reads and an
+    optional `vary` value, so unknown query strings can't fill the cache.
+    With per_path=False only the host and town prefix of the URL count, for
+    views such as the 404 page that render the same for every path. Requests
+    with pending flashed messages are always rendered fresh.
+    """
+
+    def __init__(self, app, store, templates, scope=None):
+        self.app = app
+        self.store = store
+        self.templates = templates
+        self.pages = LRUCache(
+            max_entries=app.config.get('PAGE_CACHE_MAX_ENTRIES', 256),
+            max_bytes=app.config.get('PAGE_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+            scope=scope,
+        )
+
+    def cached(self, *datasets, vary=None, query_args=(), per_path=True):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or has_pending_flashes():
+                    return view(*args, **kwargs)
+
+                key = (
+                    view.__name__,
+                    request.base_url if per_path else request.url_root,
+                    tuple(tuple(request.args.getlist(name)) for name in query_args),
+                    self.templates.current(),
+                    self.store.digest(*datasets) if datasets else None,
+                    vary() if vary is not None else None,
+                )
+                entry = self.pages.get(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code not in (200, 404) or response.direct_passthrough:
+                        return response
+                    entry = (response.get_data(), response.status_code, response.content_type)
+                    self.pages.set(key, entry, len(entry[0]))
+                    return response
+
+                body, status, content_type = entry
+                return self.app.response_class(body, status=status, content_type=content_type)
+            return wrapper
+        return decorator
@@ -0,0 +1,215 @@
+"""Per-record change versions for delta sync (/api/changes).
+
+Every record of a synced dataset gets a version from one counter shared
+by all datasets: when a data file loads, each record's content digest is
+compared with the last one recorded, and added or changed records take the
+next version numbers. Records that disappear keep a tombstone row with the
+version of their deletion. A client that has seen everything up to version
+N asks for `since=N` and gets only what changed after it.
+
+The log lives in SQLite (var/changes.db by default, WAL mode), so gunicorn
+workers share one sequence: the first worker to load a new file assigns the
+versions, and the others find the digests already recorded. A delta is
+read from the log and filled in from the worker's loaded records; if the
+log is ahead of what this worker has loaded, the delta stops short and the
+client picks up the rest on its next sync. A digest of each whole dataset
+is kept too, so a file that is already recorded (by another worker, or
+before a restart) is not compared again. Each log has a random id; a
+client holding versions from another log (a new dyno, a deleted database)
+has to start over.
+"""
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+
+from content import BASE_DIR
+
+DB_PATH = os.environ.get('CHANGES_DB') or os.path.join(BASE_DIR, 'var', 'changes.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    dataset TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    digest TEXT,
+    created INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (dataset, record_key)
+);
+CREATE INDEX IF NOT EXISTS records_version ON records (version);
+'''
+
+
+def record_key(record, position):
+    """JSON of the record's id, or of its position when it has none"""
+    if isinstance(record, dict) and record.get('id') is not None:
+        return json.dumps(record['id'])
+    return json.dumps(f'#{position}')
+
+
+def record_digest(record):
+    canonical = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def dataset_digest(keys, digests):
+    """One digest for all (key, digest) pairs of a dataset, in order"""
+    combined = hashlib.blake2b(digest_size=12)
+    for key, digest in zip(keys, digests):
+        combined.update(f'{key}\0{digest}\n'.encode('utf-8'))
+    return combined.hexdigest()
+
+
+def change_columns(records):
+    """(keys, digests, combined digest) of a dataset's records"""
+    compiled = getattr(records, 'change_columns', None)
+    if compiled is not None:
+        columns = compiled()
+        if columns is not None:
+            return columns
+    keys = [record_key(record, position) for position, record in enumerate(records)]
+    digests = [record_digest(record) for record in records]
+    return keys, digests, dataset_digest(keys, digests)
+
+
+class Snapshot:
+    """Key and digest of each record of a dataset, as loaded
+
+    Records stay in the dataset (which may decode them lazily) until a delta
+    needs them; the key lookup is built on the first delta too.
+    """
+
+    def __init__(self, dataset, records, keys, digests):
+        self.dataset = dataset
+        self.records = records
+        self.keys = keys
+        self.digests = digests
+        self._positions = None
+
+    def get(self, key):
+        """(digest, record) for a record key, or None if it isn't loaded"""
+        if self._positions is None:
+            self._positions = {key: position for position, key in enumerate(self.keys)}
+        position = self._positions.get(key)
+        if position is None:
+            return None
+        return self.digests[position], self.records[position]
+
+
+class ChangeLog:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._db = None
+        self.log_id = None
+
+    def _connect(self):
+        # A connection must not cross fork(), so each worker opens its own
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('log', ?)", (secrets.token_hex(6),))
+        self.log_id = db.execute("SELECT value FROM meta WHERE key = 'log'").fetchone()[0]
+        self._db = db
+        self._pid = os.getpid()
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._db
+
+    def sync(self, name, records):
+        """Give new versions to the changed records of `name`; returns a Snapshot"""
+        keys, digests, combined = change_columns(records)
+
+        with self._lock:
+            db = self._connection()
+            # IMMEDIATE takes the write lock up front, so two workers loading
+            # the same file can't both hand out versions for it
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                synced = db.execute('SELECT value FROM meta WHERE key = ?', (f'synced:{name}',)).fetchone()
+                # Already recorded (by another worker, or before a restart)
+                if synced is None or synced[0] != combined:
+                    self._record(db, name, dict(zip(keys, digests)))
+                    db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                               (f'synced:{name}', combined))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return Snapshot(name, records, keys, digests)
+
+    def _record(self, db, name, digests):
+        """Version the records of `name` that differ from the log"""
+        known = {
+            key: digest for key, digest in
+            db.execute('SELECT record_key, digest FROM records WHERE dataset = ?', (name,))
+        }
+        version = db.execute('SELECT COALESCE(MAX(version), 0) FROM records').fetchone()[0]
+        for key, digest in digests.items():
+            if key not in known:
+                version += 1
+                db.execute('INSERT INTO records (dataset, record_key, digest, created, version) '
+                           'VALUES (?, ?, ?, ?, ?)', (name, key, digest, version, version))
+            elif known[key] != digest:
+                version += 1
+                if known[key] is None:
+                    # A deleted record coming back counts as added again
+                    db.execute('UPDATE records SET digest = ?, created = ?, version = ? '
+                               'WHERE dataset = ? AND record_key = ?', (digest, version, version, name, key))
+                else:
+                    db.execute('UPDATE records SET digest = ?, version = ? '
+                               'WHERE dataset = ? AND record_key = ?', (digest, version, name, key))
+        for key, digest in known.items():
+            if digest is not None and key not in digests:
+                version += 1
+                db.execute('UPDATE records SET digest = NULL, version = ? '
+                           'WHERE dataset = ? AND record_key = ?', (version, name, key))
+
+    def since(self, version, snapshots):
+        """Changes after `version` as (log id, new version, {dataset: delta})
+
+        `snapshots` maps each dataset to the Snapshot sync() returned when
+        it loaded; only the log's rows for those are read. A delta is
+        {"added": [...], "updated": [...], "deleted": [ids]}.
+        """
+        logged = {snapshot.dataset: name for name, snapshot in snapshots.items()}
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN')
+            try:
+                latest = db.execute('SELECT COALESCE(MAX(version), 0) FROM records').fetchone()[0]
+                rows = db.execute(
+                    'SELECT dataset, record_key, digest, created, version FROM records '
+                    f'WHERE version > ? AND version <= ? AND dataset IN ({", ".join("?" * len(logged))}) '
+                    'ORDER BY version', (version, latest, *logged)).fetchall()
+            finally:
+                db.execute('COMMIT')
+
+        deltas = {name: {"added": [], "updated": [], "deleted": []} for name in snapshots}
+        for dataset, key, digest, created, row_version in rows:
+            name = logged[dataset]
+            loaded = snapshots[name].get(key)
+            if (loaded[0] if loaded else None) != digest:
+                # The log is ahead of the records this worker has loaded
+                latest = row_version - 1
+                break
+            if digest is None:
+                # Added and removed again since then: the client never saw it
+                if created <= version:
+                    deltas[name]["deleted"].append(json.loads(key))
+            elif created > version:
+                deltas[name]["added"].append(loaded[1])
+            else:
+                deltas[name]["updated"].append(loaded[1])
+        return self.log_id, max(latest, version), deltas
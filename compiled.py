@@ -0,0 +1,415 @@
+"""Compiled data files: records and what is derived from them, in one mmap.
+
+`python setup.py compile` turns each indexed data/*.json file into
+data/compiled/<name>.gbc:
+
+    b'GBC1' | header length (uint32) | header (JSON) | sections...
+
+Sections are 8-byte aligned arrays:
+
+    offsets          uint64 * (count + 1)  where each record starts in `blob`
+    blob             bytes                 the records, one compact JSON each
+    positions        uint32 ...            posting lists (filters and facets)
+    order:<key>      uint32 * count        record positions in sort order
+    rank:<key>       uint32 * count        each record's place in that order
+    impacts          float64 ...           search postings, term by term,
+    impact_positions uint32 ...            best-scoring documents first
+    key_offsets,     uint64, bytes         change-log key of each record
+    keys
+    digests          24 bytes * count      change-log digest of each record
+
+The header holds the size, mtime and digest of the JSON file it was built
+from, the section table, and the value -> (start, count) tables locating
+each posting list.
+
+ContentStore maps the file read-only whenever it matches the JSON file,
+so every worker shares the same page-cache pages instead of parsing and
+holding its own copy. `CompiledRecords` looks like a list, but a record is
+only decoded when it is accessed. DatasetIndex, the search segments, the
+planting calendar and the change log take their structures straight from
+the arrays instead of scanning the records when the file loads.
+"""
+import bisect
+import functools
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+
+MAGIC = b'GBC1'
+FORMAT_VERSION = 1
+SUFFIX = '.gbc'
+# Decoded records kept per dataset, so hot pages don't decode them each time
+RECORD_CACHE_SIZE = 4096
+
+_prefix = struct.Struct('<4sI')
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def source_signature(path, raw=None):
+    """Size, mtime and content digest of a JSON data file"""
+    stat = os.stat(path)
+    if raw is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = f.read()
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        # Same digest ContentStore computes from the text it reads
+        "digest": hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest(),
+    }
+
+
+def build(records, source, index=None, facets=(), segment=None, changes=None):
+    """The compiled file's bytes
+
+    `index` is a DatasetIndex of the records, `facets` more fields to keep
+    posting lists of (by raw value), `segment` a search Segment and
+    `changes` the change-log (keys, digests, combined digest).
+    """
+    sections = []
+
+    def add(name, data, typecode):
+        sections.append((name, data, typecode))
+
+    def strings(values):
+        offsets = array('Q', [0])
+        blob = bytearray()
+        for value in values:
+            blob += value.encode('utf-8')
+            offsets.append(len(blob))
+        return offsets.tobytes(), bytes(blob)
+
+    offsets, blob = strings(
+        json.dumps(record, ensure_ascii=False, separators=(',', ':')) for record in records)
+    add('offsets', offsets, 'Q')
+    add('blob', blob, 'B')
+    fields = sorted({field for record in records if isinstance(record, dict) for field in record})
+
+    positions = array('I')
+
+    def posting_table(groups):
+        table = []
+        for value, matches in groups:
+            table.append([value, len(positions), len(matches)])
+            positions.extend(sorted(matches))
+        return table
+
+    index_header = None
+    if index is not None:
+        index_header = {
+            "filters": list(index.filters),
+            "multi": sorted(index.multi),
+            "sorts": list(index.orders),
+            "postings": {
+                field: posting_table(index.postings[field].items())
+                for field in index.filters
+            },
+        }
+        for key in index.orders:
+            add(f'order:{key}', array('I', index.orders[key]).tobytes(), 'I')
+            add(f'rank:{key}', array('I', index.ranks[key]).tobytes(), 'I')
+
+    facet_header = {}
+    for field in facets:
+        groups = {}
+        for position, record in enumerate(records):
+            value = record.get(field) if isinstance(record, dict) else None
+            groups.setdefault(json.dumps(value, sort_keys=True), []).append(position)
+        facet_header[field] = posting_table(groups.items())
+    add('positions', positions.tobytes(), 'I')
+
+    search_header = None
+    if segment is not None:
+        impacts = array('d')
+        impact_positions = array('I')
+        terms = {}
+        for term in segment.vocabulary:
+            postings = segment.postings[term]
+            terms[term] = [len(impacts), len(postings)]
+            impacts.extend(impact for impact, _ in postings)
+            impact_positions.extend(position for _, position in postings)
+        add('impacts', impacts.tobytes(), 'd')
+        add('impact_positions', impact_positions.tobytes(), 'I')
+        search_header = {"fields": segment.fields, "terms": terms, "completions": segment.completions}
+
+    changes_header = None
+    if changes is not None:
+        keys, digests, combined = changes
+        key_offsets, key_blob = strings(keys)
+        add('key_offsets', key_offsets, 'Q')
+        add('keys', key_blob, 'B')
+        add('digests', ''.join(digests).encode('ascii'), 'B')
+        changes_header = {"digest": combined, "digest_size": len(digests[0]) if digests else 0}
+
+    header = {
+        "format": FORMAT_VERSION,
+        "source": source,
+        "count": len(records),
+        "fields": fields,
+        "index": index_header,
+        "facets": facet_header,
+        "search": search_header,
+        "changes": changes_header,
+        "sections": {},
+    }
+    # Section offsets depend on the header's length, which depends on them;
+    # settle it by encoding until the length stops changing
+    length = 0
+    while True:
+        position = _align(_prefix.size + length)
+        for name, data, typecode in sections:
+            header['sections'][name] = [position, len(data), typecode]
+            position = _align(position + len(data))
+        encoded = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(encoded) == length:
+            break
+        length = len(encoded)
+
+    out = bytearray(_prefix.pack(MAGIC, len(encoded)) + encoded)
+    for name, data, typecode in sections:
+        out += bytes(_align(len(out)) - len(out))
+        out += data
+    return bytes(out)
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    # Workers still mapping the old file keep its inode until they reload
+    os.replace(temporary, path)
+
+
+def read_header(buffer):
+    magic, length = _prefix.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('not a compiled data file')
+    header = json.loads(bytes(buffer[_prefix.size:_prefix.size + length]).decode('utf-8'))
+    if header.get('format') != FORMAT_VERSION:
+        raise ValueError('compiled with another format version')
+    return header
+
+
+class PostingSet:
+    """Read-only set of record positions over a sorted uint32 array"""
+
+    __slots__ = ('positions',)
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __contains__(self, position):
+        index = bisect.bisect_left(self.positions, position)
+        return index < len(self.positions) and self.positions[index] == position
+
+    def intersection(self, *others):
+        return frozenset(
+            position for position in self.positions
+            if all(position in other for other in others)
+        )
+
+
+class Strings:
+    """Read-only sequence of strings stored as offsets into a blob"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class FixedStrings:
+    """Read-only sequence of equal-length ASCII strings"""
+
+    def __init__(self, blob, size):
+        self.blob = blob
+        self.size = size
+
+    def __len__(self):
+        return len(self.blob) // self.size if self.size else 0
+
+    def __getitem__(self, index):
+        return bytes(self.blob[index * self.size:(index + 1) * self.size]).decode('ascii')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class ImpactList:
+    """One term's search postings as (impact, position) pairs"""
+
+    __slots__ = ('impacts', 'positions')
+
+    def __init__(self, impacts, positions):
+        self.impacts = impacts
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.impacts)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(zip(self.impacts[key].tolist(), self.positions[key].tolist()))
+        return self.impacts[key], self.positions[key]
+
+
+class CompiledPostings:
+    """term -> ImpactList, answered from the mapped arrays"""
+
+    def __init__(self, terms, impacts, positions):
+        self.terms = terms
+        self.impacts = impacts
+        self.positions = positions
+
+    def get(self, term, default=None):
+        location = self.terms.get(term)
+        if location is None:
+            return default
+        start, count = location
+        return ImpactList(self.impacts[start:start + count], self.positions[start:start + count])
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def __getitem__(self, term):
+        postings = self.get(term)
+        if postings is None:
+            raise KeyError(term)
+        return postings
+
+
+class CompiledRecords:
+    """The records of one compiled file, decoded one at a time on access"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.buffer = memoryview(self._map)
+        self.header = read_header(self.buffer)
+        self.source = self.header['source']
+        self.fields = frozenset(self.header['fields'])
+        self._count = self.header['count']
+        self._offsets = self.section('offsets')
+        self._blob = self.section('blob')
+        self.record = functools.lru_cache(maxsize=RECORD_CACHE_SIZE)(self._decode)
+
+    def section(self, name):
+        start, length, typecode = self.header['sections'][name]
+        return self.buffer[start:start + length].cast(typecode)
+
+    def _decode(self, position):
+        return json.loads(bytes(self._blob[self._offsets[position]:self._offsets[position + 1]]))
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.record(position) for position in range(*key.indices(self._count))]
+        if key < 0:
+            key += self._count
+        if not 0 <= key < self._count:
+            raise IndexError('record index out of range')
+        return self.record(key)
+
+    def __iter__(self):
+        # Full scans bypass the cache so they don't evict the hot records
+        for position in range(self._count):
+            yield self._decode(position)
+
+    def parsed_size(self):
+        """Bytes this process parses: the header and the cached records at most"""
+        cached = min(self._count, RECORD_CACHE_SIZE)
+        average = len(self._blob) // self._count if self._count else 0
+        return self.header['sections']['offsets'][0] + cached * average
+
+    def prebuilt_index(self, filters, sorts):
+        """(postings, multi, orders, ranks) for DatasetIndex, if compiled with them"""
+        index = self.header['index']
+        sorts = sorts or {}
+        if index is None or not set(filters) <= set(index['filters']) or not set(sorts) <= set(index['sorts']):
+            return None
+        positions = self.section('positions')
+        postings = {
+            field: {
+                value: PostingSet(positions[start:start + count])
+                for value, start, count in index['postings'][field]
+            }
+            for field in filters
+        }
+        orders = {key: self.section(f'order:{key}') for key in sorts}
+        ranks = {key: self.section(f'rank:{key}') for key in sorts}
+        return postings, set(index['multi']) & set(filters), orders, ranks
+
+    def facet(self, field):
+        """[(raw value, PostingSet)] for a field compiled as a facet, else None"""
+        table = self.header['facets'].get(field)
+        if table is None:
+            return None
+        positions = self.section('positions')
+        return [(json.loads(value), PostingSet(positions[start:start + count])) for value, start, count in table]
+
+    def prebuilt_segment(self, fields):
+        """(postings, vocabulary, completions) for a search Segment over `fields`"""
+        search = self.header['search']
+        if search is None or search['fields'] != fields:
+            return None
+        postings = CompiledPostings(
+            {term: tuple(location) for term, location in search['terms'].items()},
+            self.section('impacts'), self.section('impact_positions'))
+        return postings, sorted(search['terms']), search['completions']
+
+    def change_columns(self):
+        """(keys, digests, combined digest) for the change log, if compiled"""
+        changes = self.header['changes']
+        if changes is None:
+            return None
+        keys = Strings(self.section('key_offsets'), self.section('keys'))
+        return keys, FixedStrings(self.section('digests'), changes['digest_size']), changes['digest']
+
+
+def open_matching(path, source_path, stat):
+    """CompiledRecords for `path` if it was built from the file at `source_path`
+
+    A file with another mtime but the same size is hashed before it is
+    rejected, since checkouts and slug builds reset mtimes.
+    """
+    try:
+        records = CompiledRecords(path)
+    except (OSError, ValueError):
+        return None
+    source = records.source
+    if source['size'] != stat.st_size:
+        return None
+    if source['mtime_ns'] != stat.st_mtime_ns:
+        try:
+            digest = source_signature(source_path)['digest']
+        except (OSError, UnicodeError):
+            return None
+        if digest != source['digest']:
+            return None
+    return records
@@ -0,0 +1,186 @@
+"""gzip/Brotli response compression.
+
+Responses carrying an ETag are compressed once per (ETag, encoding) and the
+result kept in an LRU, so repeat requests for the same content version never
+recompress. Responses without one are compressed on the fly at a cheaper
+level. Bodies below a size threshold or outside the content-type allowlist,
+such as images, are sent as they are.
+
+Fingerprinted static files are served from the .br/.gz siblings written by
+`python setup.py assets` instead of being compressed per request.
+"""
+import gzip
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+from caching import LRUCache
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+MIN_SIZE = 1024
+COMPRESSIBLE = {
+    'application/javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/xml',
+    'image/svg+xml',
+    'text/calendar',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+}
+
+# (gzip level, Brotli quality): cached variants are compressed once, so they
+# can afford more effort than one-off responses; build output the most
+CACHED_LEVELS = (9, 9)
+ON_THE_FLY_LEVELS = (6, 4)
+BUILD_LEVELS = (9, 11)
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding, offered=None):
+    """Pick the best of `offered` for an Accept-Encoding header, or None"""
+    offered = offered or available_encodings()
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best = None
+    for encoding in offered:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        # `offered` is in order of preference, so ties go to the earlier one
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(data, encoding, levels=ON_THE_FLY_LEVELS):
+    gzip_level, brotli_quality = levels
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def write_precompressed(path, min_size=MIN_SIZE):
+    """Write .br/.gz siblings for a built file when they are worth having"""
+    mimetype, _ = mimetypes.guess_type(path)
+    if mimetype not in COMPRESSIBLE:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return []
+    written = []
+    for encoding in available_encodings():
+        compressed = compress(data, encoding, BUILD_LEVELS)
+        if len(compressed) < len(data):
+            with open(path + SUFFIXES[encoding], 'wb') as f:
+                f.write(compressed)
+            written.append(path + SUFFIXES[encoding])
+    return written
+
+
+class Compressor:
+    """after_request hook compressing eligible responses
+
+    COMPRESS_MIN_SIZE, COMPRESS_MIMETYPES and COMPRESS_CACHE_MAX_BYTES in
+    the app config override the defaults. `scope` keeps the cached
+    variants apart per tenant, as for LRUCache.
+    """
+
+    def __init__(self, app, static_prefix='dist/', scope=None):
+        self.app = app
+        self.static_prefix = static_prefix
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', MIN_SIZE)
+        self.mimetypes = set(app.config.get('COMPRESS_MIMETYPES', COMPRESSIBLE))
+        self.variants = LRUCache(
+            max_entries=app.config.get('COMPRESS_CACHE_MAX_ENTRIES', 2048),
+            max_bytes=app.config.get('COMPRESS_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+            scope=scope,
+        )
+        app.before_request(self.serve_precompressed)
+        app.after_request(self.compress_response)
+
+    def negotiate(self):
+        """The encoding this request's responses are compressed with, or None"""
+        return negotiate(request.headers.get('Accept-Encoding'))
+
+    def serve_precompressed(self):
+        if request.endpoint != 'static':
+            return None
+        filename = (request.view_args or {}).get('filename', '')
+        if not filename.startswith(self.static_prefix):
+            return None
+        encoding = self.negotiate()
+        if encoding is None:
+            return None
+        variant = filename + SUFFIXES[encoding]
+        if not os.path.isfile(os.path.join(self.app.static_folder, variant)):
+            return None
+        mimetype, _ = mimetypes.guess_type(filename)
+        response = send_from_directory(self.app.static_folder, variant, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def compress_response(self, response):
+        if response.status_code == 304:
+            # Revalidating a compressed variant must keep the cache keyed on encoding
+            etag, _ = response.get_etag()
+            if etag and etag.endswith(tuple('-' + encoding for encoding in SUFFIXES)):
+                response.vary.add('Accept-Encoding')
+            return response
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < self.min_size:
+            return response
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        etag, weak = response.get_etag()
+        if etag:
+            key = (etag, encoding)
+            compressed = self.variants.get(key)
+            if compressed is None:
+                compressed = compress(data, encoding, CACHED_LEVELS)
+                self.variants.set(key, compressed, len(compressed))
+            # Each encoding is a different representation, so it needs its
+            # own strong validator
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        else:
+            compressed = compress(data, encoding)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,206 @@
+"""In-memory store for the data/*.json files.
+
+Each dataset is parsed once per process and only re-read when the file's
+mtime or size changes. The stat() check itself is throttled so a busy worker
+doesn't touch the filesystem on every request.
+"""
+import contextlib
+import copy
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import compiled
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('GROWBALBRIGGAN_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+# Where `python setup.py compile` writes the memory-mapped form of each file
+COMPILED_DIR = os.environ.get('CONTENT_COMPILED_DIR', os.path.join(DATA_DIR, 'compiled'))
+
+# Seconds between stat() checks of a dataset that is already loaded
+CHECK_INTERVAL = float(os.environ.get('CONTENT_CHECK_INTERVAL', '2'))
+
+# Parsed records plus their indexes, search segments and calendars take
+# roughly this many times the bytes they were parsed from
+PARSED_EXPANSION = 12
+
+
+def green_threads():
+    """Whether gevent has patched the standard library (GUNICORN_MODE=gevent)"""
+    gevent = sys.modules.get('gevent')
+    return gevent is not None and time.sleep is gevent.sleep
+
+
+class Dataset:
+    """One JSON file plus what to serve when it is missing or unreadable"""
+
+    def __init__(self, name, filename, missing, corrupt):
+        self.name = name
+        self.filename = filename
+        self.missing = missing
+        self.corrupt = corrupt
+        self.records = None
+        self.signature = None
+        self.digest = None
+        self.mtime = None
+        self.version = 0
+        self.checked_at = 0.0
+        # Bytes parsed into Python objects, see ContentStore.footprint()
+        self.size = 0
+        self.builders = {}
+        self.derived = {}
+
+
+class ContentStore:
+    """Loads datasets lazily and reloads them when their file changes"""
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=CHECK_INTERVAL, compiled_dir=COMPILED_DIR):
+        self.data_dir = data_dir
+        self.compiled_dir = compiled_dir
+        self.check_interval = check_interval
+        self.datasets = {}
+        # Bumped on every (re)load of any dataset, so other layers can key
+        # their caches on it
+        self.version = 0
+        self._lock = threading.RLock()
+        self._reads = threading.local()
+
+    def register(self, name, filename, missing=None, corrupt=None):
+        """Declare a dataset; `missing`/`corrupt` are the fallback records"""
+        self.datasets[name] = Dataset(
+            name,
+            filename,
+            missing if missing is not None else [],
+            corrupt if corrupt is not None else [],
+        )
+
+    def derive(self, name, key, builder):
+        """Rebuild `builder(records)` whenever `name` (re)loads; see derived()"""
+        with self._lock:
+            dataset = self.datasets[name]
+            dataset.builders[key] = builder
+            dataset.derived.pop(key, None)
+
+    def path(self, name):
+        return os.path.join(self.data_dir, self.datasets[name].filename)
+
+    def compiled_path(self, name):
+        return os.path.join(self.compiled_dir, name + compiled.SUFFIX)
+
+    def get(self, name):
+        """Return the records for `name`; callers must treat them as read-only"""
+        return self._fresh(name).records
+
+    def derived(self, name, key):
+        """Structure built from the current records of `name`, e.g. an index"""
+        dataset = self._fresh(name)
+        try:
+            return dataset.derived[key]
+        except KeyError:
+            with self._lock:
+                if key not in dataset.derived:
+                    dataset.derived[key] = dataset.builders[key](dataset.records)
+                return dataset.derived[key]
+
+    def digest(self, *names):
+        """Content fingerprint of the given datasets (all if none given)"""
+        names = names or tuple(self.datasets)
+        if len(names) == 1:
+            return self._fresh(names[0]).digest
+        combined = hashlib.blake2b(digest_size=8)
+        for name in names:
+            combined.update(self._fresh(name).digest.encode('ascii'))
+        return combined.hexdigest()
+
+    def last_modified(self, *names):
+        """Newest file mtime among the given datasets, or None"""
+        names = names or tuple(self.datasets)
+        mtimes = [self._fresh(name).mtime for name in names]
+        mtimes = [mtime for mtime in mtimes if mtime is not None]
+        return max(mtimes) if mtimes else None
+
+    def footprint(self):
+        """Rough bytes of memory held by the loaded datasets"""
+        return sum(dataset.size for dataset in self.datasets.values()) * PARSED_EXPANSION
+
+    def refresh(self, *names):
+        """Force a stat() check of the given datasets (all if none given)"""
+        for name in names or tuple(self.datasets):
+            self.datasets[name].checked_at = 0.0
+            self._fresh(name)
+
+    @contextlib.contextmanager
+    def recording(self):
+        """Collect the names of the datasets this thread reads inside the block"""
+        previous = getattr(self._reads, 'names', None)
+        self._reads.names = names = set()
+        try:
+            yield names
+        finally:
+            self._reads.names = previous
+            if previous is not None:
+                previous |= names
+
+    def _fresh(self, name):
+        dataset = self.datasets[name]
+        names = getattr(self._reads, 'names', None)
+        if names is not None:
+            names.add(name)
+        now = time.monotonic()
+        if dataset.records is None or now - dataset.checked_at >= self.check_interval:
+            with self._lock:
+                # Another thread may have refreshed it while we waited
+                if dataset.records is None or now - dataset.checked_at >= self.check_interval:
+                    self._check(dataset, now)
+        return dataset
+
+    def _check(self, dataset, now):
+        path = os.path.join(self.data_dir, dataset.filename)
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stat = None
+            signature = None
+
+        if dataset.records is not None and signature == dataset.signature:
+            dataset.checked_at = now
+            return
+
+        records = None
+        if stat is not None:
+            records = compiled.open_matching(self.compiled_path(dataset.name), path, stat)
+        if records is not None:
+            digest = records.source['digest']
+            size = records.parsed_size()
+        else:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    raw = f.read()
+                records = json.loads(raw)
+            except FileNotFoundError:
+                raw = 'missing'
+                records = copy.deepcopy(dataset.missing)
+            except json.JSONDecodeError:
+                raw = 'corrupt'
+                records = copy.deepcopy(dataset.corrupt)
+            digest = hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+            size = len(raw)
+
+        derived = {key: builder(records) for key, builder in dataset.builders.items()}
+
+        dataset.signature = signature
+        dataset.mtime = stat.st_mtime if stat is not None else None
+        dataset.digest = digest
+        dataset.size = size
+        self.version += 1
+        dataset.version = self.version
+        dataset.derived = derived
+        dataset.records = records
+        # Last: until now other threads wait on the lock instead of reading
+        # a mix of the old and new fields
+        dataset.checked_at = now
@@ -0,0 +1,351 @@
+"""Community events with recurrence rules.
+
+Events live in data/events.json. A recurring event carries an iCalendar
+style rule, e.g. "FREQ=WEEKLY;BYDAY=SA" or "FREQ=MONTHLY;BYDAY=1SU",
+supporting FREQ (DAILY/WEEKLY/MONTHLY/YEARLY), INTERVAL, BYDAY (with
+ordinals for monthly and yearly rules), BYMONTHDAY, BYMONTH, COUNT and
+UNTIL, plus an optional list of "exdates" to skip.
+
+When the file loads, the rules are parsed (bad ones are logged and the
+event skipped). Occurrences are expanded once per day over a rolling
+window, LOOKBACK_DAYS back to HORIZON_DAYS ahead, into a list sorted by
+date, so a date-range query is two bisects. The .ics feed is rendered
+once per data version.
+"""
+import bisect
+import calendar
+import logging
+import threading
+from datetime import date, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+HORIZON_DAYS = 365
+LOOKBACK_DAYS = 31
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+TIMEZONE = 'Europe/Dublin'
+
+
+class RuleError(ValueError):
+    pass
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise RuleError(f'bad date {value!r}') from None
+
+
+def _ints(value, low, high, name):
+    numbers = []
+    for part in value.split(','):
+        try:
+            number = int(part)
+        except ValueError:
+            raise RuleError(f'bad {name} {part!r}') from None
+        if not (low <= abs(number) <= high):
+            raise RuleError(f'{name} {number} out of range')
+        numbers.append(number)
+    return numbers
+
+
+def parse_rule(text):
+    """Parse an RRULE value into a dict; raises RuleError"""
+    rule = {'interval': 1, 'byday': [], 'bymonthday': [], 'bymonth': [], 'count': None, 'until': None}
+    for part in str(text).upper().split(';'):
+        if not part:
+            continue
+        name, _, value = part.partition('=')
+        if name == 'FREQ':
+            if value not in FREQUENCIES:
+                raise RuleError(f'unsupported FREQ {value!r}')
+            rule['freq'] = value
+        elif name == 'INTERVAL':
+            rule['interval'] = _ints(value, 1, 1000, 'INTERVAL')[0]
+        elif name == 'COUNT':
+            rule['count'] = _ints(value, 1, 100000, 'COUNT')[0]
+        elif name == 'UNTIL':
+            rule['until'] = parse_date(f'{value[:4]}-{value[4:6]}-{value[6:8]}' if '-' not in value else value)
+        elif name == 'BYMONTHDAY':
+            rule['bymonthday'] = _ints(value, 1, 31, 'BYMONTHDAY')
+        elif name == 'BYMONTH':
+            rule['bymonth'] = _ints(value, 1, 12, 'BYMONTH')
+        elif name == 'BYDAY':
+            for day in value.split(','):
+                ordinal, weekday = day[:-2], day[-2:]
+                if weekday not in WEEKDAYS:
+                    raise RuleError(f'bad BYDAY {day!r}')
+                rule['byday'].append((_ints(ordinal, 1, 53, 'BYDAY')[0] if ordinal else None,
+                                      WEEKDAYS.index(weekday)))
+        else:
+            raise RuleError(f'unsupported rule part {name!r}')
+    if 'freq' not in rule:
+        raise RuleError('rule has no FREQ')
+    return rule
+
+
+def _month_days(year, month, rule, start):
+    """Days in one month selected by BYMONTHDAY/BYDAY (default: start's day)"""
+    length = calendar.monthrange(year, month)[1]
+    days = set()
+    for day in rule['bymonthday']:
+        day = day if day > 0 else length + day + 1
+        if 1 <= day <= length:
+            days.add(day)
+    for ordinal, weekday in rule['byday']:
+        first = (weekday - calendar.weekday(year, month, 1)) % 7 + 1
+        matching = list(range(first, length + 1, 7))
+        if ordinal is None:
+            days.update(matching)
+        elif abs(ordinal) <= len(matching):
+            days.add(matching[ordinal - 1] if ordinal > 0 else matching[ordinal])
+    if not rule['bymonthday'] and not rule['byday'] and start.day <= length:
+        days.add(start.day)
+    return [date(year, month, day) for day in sorted(days)]
+
+
+def _periods(rule, start, first_needed):
+    """(period start, candidate dates) per day/week/month/year, in order
+
+    Without COUNT, periods that end before `first_needed` are skipped.
+    """
+    freq = rule['freq']
+    interval = rule['interval']
+    skip = rule['count'] is None
+
+    if freq == 'DAILY':
+        step = 0
+        if skip and first_needed > start:
+            step = -(-(first_needed - start).days // interval)
+        while True:
+            day = start + timedelta(days=step * interval)
+            yield day, [day]
+            step += 1
+
+    elif freq == 'WEEKLY':
+        monday = start - timedelta(days=start.weekday())
+        weekdays = sorted({weekday for _, weekday in rule['byday']}) or [start.weekday()]
+        step = 0
+        if skip and first_needed > monday:
+            step = max(0, (first_needed - monday).days // 7 // interval)
+        while True:
+            week = monday + timedelta(weeks=step * interval)
+            yield week, [week + timedelta(days=weekday) for weekday in weekdays]
+            step += 1
+
+    elif freq == 'MONTHLY':
+        step = 0
+        if skip and first_needed > start:
+            months = (first_needed.year - start.year) * 12 + first_needed.month - start.month
+            step = max(0, months // interval)
+        while True:
+            index = start.month - 1 + step * interval
+            year, month = start.year + index // 12, index % 12 + 1
+            if not rule['bymonth'] or month in rule['bymonth']:
+                yield date(year, month, 1), _month_days(year, month, rule, start)
+            else:
+                yield date(year, month, 1), []
+            step += 1
+
+    else:  # YEARLY
+        step = 0
+        if skip and first_needed > start:
+            step = max(0, (first_needed.year - start.year) // interval)
+        months = rule['bymonth'] or [start.month]
+        while True:
+            year = start.year + step * interval
+            yield date(year, 1, 1), [day for month in sorted(months) for day in _month_days(year, month, rule, start)]
+            step += 1
+
+
+def expand(rule, start, window_start, window_end, exdates=()):
+    """Dates of a rule from `start` falling in [window_start, window_end)"""
+    dates = []
+    seen = 0
+    until = rule['until']
+    for period, candidates in _periods(rule, start, window_start):
+        if period >= window_end or (until is not None and period > until):
+            break
+        for day in candidates:
+            if day < start:
+                continue
+            if until is not None and day > until:
+                return dates
+            seen += 1
+            if rule['count'] is not None and seen > rule['count']:
+                return dates
+            if window_start <= day < window_end and day not in exdates:
+                dates.append(day)
+    return dates
+
+
+class Schedule:
+    """Parsed events.json, with occurrences expanded per day on demand"""
+
+    def __init__(self, records, name='events'):
+        self.records = records
+        self.events = []
+        self.invalid = []
+        for record in records:
+            try:
+                start = parse_date(record.get('start'))
+                rule = parse_rule(record['rrule']) if record.get('rrule') else None
+                exdates = frozenset(parse_date(day) for day in record.get('exdates', ()))
+            except (RuleError, KeyError) as e:
+                self.invalid.append({"id": record.get('id'), "error": str(e)})
+                continue
+            self.events.append((record, start, rule, exdates))
+        if self.invalid:
+            logger.warning('%s: skipping %d event(s) with bad dates or rules: %s', name, len(self.invalid),
+                           ', '.join(f"id {entry['id']}: {entry['error']}" for entry in self.invalid[:5]))
+        self._lock = threading.Lock()
+        self._index = None
+        self._ics = None
+
+    def occurrences(self, today=None):
+        """OccurrenceIndex for the window around `today`, built once per day"""
+        today = today or date.today()
+        index = self._index
+        if index is None or index.today != today:
+            with self._lock:
+                index = self._index
+                if index is None or index.today != today:
+                    index = self._index = OccurrenceIndex(self.events, today)
+        return index
+
+    def ics(self, stamp):
+        """The .ics feed, rendered on first use"""
+        if self._ics is None:
+            with self._lock:
+                if self._ics is None:
+                    self._ics = to_ics(self, stamp)
+        return self._ics
+
+    def next_dates(self, today=None):
+        """{event id: date of its next occurrence} from today on"""
+        index = self.occurrences(today)
+        upcoming = {}
+        for occurrence in index.between(index.today, index.end):
+            upcoming.setdefault(occurrence['event_id'], occurrence['date'])
+        return upcoming
+
+
+class OccurrenceIndex:
+    def __init__(self, events, today):
+        self.today = today
+        self.start = today - timedelta(days=LOOKBACK_DAYS)
+        self.end = today + timedelta(days=HORIZON_DAYS)
+        occurrences = []
+        for record, start, rule, exdates in events:
+            if rule is None:
+                dates = [start] if self.start <= start < self.end else []
+            else:
+                dates = expand(rule, start, self.start, self.end, exdates)
+            for day in dates:
+                occurrences.append((day.isoformat(), record.get('start_time') or '', record.get('id') or 0, {
+                    "event_id": record.get('id'),
+                    "event": record.get('event'),
+                    "emoji": record.get('emoji'),
+                    "location": record.get('location'),
+                    "date": day.isoformat(),
+                    "start_time": record.get('start_time'),
+                    "end_time": record.get('end_time'),
+                }))
+        occurrences.sort(key=lambda item: item[:3])
+        self.dates = [item[0] for item in occurrences]
+        self.items = [item[3] for item in occurrences]
+
+    def between(self, start, end):
+        """Occurrences on dates in [start, end), clipped to the window"""
+        low = bisect.bisect_left(self.dates, max(start, self.start).isoformat())
+        high = bisect.bisect_left(self.dates, min(end, self.end).isoformat())
+        return self.items[low:high]
+
+
+# Europe/Dublin: GMT in winter, IST (UTC+1) from the last Sunday in March
+# to the last Sunday in October
+VTIMEZONE = '''BEGIN:VTIMEZONE
+TZID:Europe/Dublin
+BEGIN:STANDARD
+DTSTART:19701025T020000
+TZOFFSETFROM:+0100
+TZOFFSETTO:+0000
+TZNAME:GMT
+RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU
+END:STANDARD
+BEGIN:DAYLIGHT
+DTSTART:19700329T010000
+TZOFFSETFROM:+0000
+TZOFFSETTO:+0100
+TZNAME:IST
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU
+END:DAYLIGHT
+END:VTIMEZONE'''
+
+
+def _escape(text):
+    return (str(text or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Split content lines longer than 75 octets, as RFC 5545 requires"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while data:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:  # don't split a character
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    return '\r\n '.join(parts)
+
+
+def _local(day, clock):
+    return day.strftime('%Y%m%d') + ('T' + clock.replace(':', '') + '00' if clock else '')
+
+
+def to_ics(schedule, stamp, domain='growbalbriggan.io'):
+    """The schedule as an iCalendar feed; `stamp` (a datetime) is the DTSTAMP"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//GrowBalbriggan//Community Events//EN',
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:GrowBalbriggan Community Events',
+        f'X-WR-TIMEZONE:{TIMEZONE}',
+    ]
+    lines.extend(VTIMEZONE.split('\n'))
+    dtstamp = stamp.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    for record, start, rule, exdates in schedule.events:
+        start_time = record.get('start_time')
+        end_time = record.get('end_time')
+        lines.append('BEGIN:VEVENT')
+        lines.append(f"UID:event-{record.get('id')}@{domain}")
+        lines.append(f'DTSTAMP:{dtstamp}')
+        if start_time:
+            lines.append(f'DTSTART;TZID={TIMEZONE}:{_local(start, start_time)}')
+            if end_time:
+                lines.append(f'DTEND;TZID={TIMEZONE}:{_local(start, end_time)}')
+        else:
+            lines.append(f'DTSTART;VALUE=DATE:{_local(start, None)}')
+        if rule is not None:
+            lines.append(f"RRULE:{record['rrule'].upper()}")
+        for day in sorted(exdates):
+            if start_time:
+                lines.append(f'EXDATE;TZID={TIMEZONE}:{_local(day, start_time)}')
+            else:
+                lines.append(f'EXDATE;VALUE=DATE:{_local(day, None)}')
+        lines.append(f"SUMMARY:{_escape(record.get('event'))}")
+        lines.append(f"LOCATION:{_escape(record.get('location'))}")
+        if record.get('description'):
+            lines.append(f"DESCRIPTION:{_escape(record['description'])}")
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(_fold(line) for line in lines) + '\r\n').encode('utf-8')
+
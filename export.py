@@ -0,0 +1,315 @@
+"""Static export of the site, rebuilt incrementally.
+
+`python setup.py export` renders every GET route that doesn't depend on the
+query string through the app itself, so each file holds exactly the bytes
+the live site serves for that URL, and copies static/ next to them:
+
+    /                      -> index.html
+    /videos                -> videos/index.html
+    /api/tips              -> api/tips.json
+    /api/tips/all%20year   -> api/tips/all-year.json
+    /api/calendar/april    -> api/calendar/april.json
+    (any unknown URL)      -> 404.html
+
+A plain static server finds the pages at their live URLs, but not the API
+files: those need their extension for the right Content-Type, and
+/api/tips can't be both a file and the folder of /api/tips/<season>.
+So the export also writes _redirects, the rewrite rules Netlify and
+Cloudflare Pages read ("/api/tips /api/tips.json 200"); on any other host,
+configure the same rewrites, or the API URLs will 404.
+
+Text files get .br/.gz siblings for servers that serve precompressed files.
+
+While a URL renders, the templates it used (with everything they extend or
+include; all of them for /sw.js, whose cache version hashes the folder),
+the data files it read and its `vary` value (today's date, the current
+month) are recorded in .export-state.json. The next export only re-renders
+URLs where one of those, or the code, changed.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+from urllib.parse import unquote
+
+from flask import url_for
+from flask.signals import template_rendered
+from jinja2 import meta
+
+import planting
+from caching import CODE_VERSION
+from compression import SUFFIXES, write_precompressed
+from content import BASE_DIR
+
+OUTPUT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(BASE_DIR, 'build', 'site')
+# Pages print their own URL (og:url), so render them for the real host
+BASE_URL = os.environ.get('EXPORT_BASE_URL', 'https://growbalbriggan.io')
+STATE_FILE = '.export-state.json'
+NOT_FOUND = '404.html'
+REWRITES = '_redirects'
+
+# Their output depends on the query string, so there's nothing to pre-render
+# (a frozen /api/changes would never report a change)
+DYNAMIC = {'search_page', 'api_search', 'api_changes'}
+# Their output embeds the fingerprint of the whole templates folder (the
+# service worker's cache version), so any template edit changes them
+WHOLE_TEMPLATES = {'service_worker'}
+EXTENSIONS = {
+    'text/html': '.html',
+    'application/json': '.json',
+    'text/calendar': '.ics',
+}
+
+
+class Fingerprints:
+    """Digests of input files (content and mtime), each read at most once per export"""
+
+    def __init__(self):
+        self.digests = {}
+
+    def __call__(self, path):
+        try:
+            return self.digests[path]
+        except KeyError:
+            pass
+        try:
+            with open(path, 'rb') as f:
+                # The mtime too: the events feed prints it as DTSTAMP
+                digest = hashlib.blake2b(f.read(), digest_size=8)
+                digest.update(str(int(os.fstat(f.fileno()).st_mtime)).encode('ascii'))
+                digest = digest.hexdigest()
+        except FileNotFoundError:
+            digest = 'missing'
+        self.digests[path] = digest
+        return digest
+
+
+def route_arguments(store):
+    """URL values to export for the routes that take arguments"""
+    return {
+        'api_tips': [{'season': season} for season in sorted(store.derived('tips', 'index').postings['season'])],
+        'api_calendar': [{'month': month.lower()} for month in planting.MONTHS],
+    }
+
+
+def export_urls(app, store, base_url=BASE_URL):
+    """(endpoint, url) for every route that can be served as a file"""
+    arguments = route_arguments(store)
+    urls = []
+    with app.test_request_context(base_url=base_url):
+        for rule in app.url_map.iter_rules():
+            view = app.view_functions[rule.endpoint]
+            # Only views with known inputs (HTTPCache.conditional) qualify
+            if 'GET' not in rule.methods or not hasattr(view, 'conditional') or rule.endpoint in DYNAMIC:
+                continue
+            if not rule.arguments:
+                urls.append((rule.endpoint, url_for(rule.endpoint)))
+                continue
+            for values in arguments.get(rule.endpoint, ()):
+                if set(values) == rule.arguments:
+                    urls.append((rule.endpoint, url_for(rule.endpoint, **values)))
+    return sorted(set(urls), key=lambda item: item[1])
+
+
+def output_file(url, content_type):
+    """Path under the output folder for `url`; see rewrites() for the non-HTML ones"""
+    # No spaces in file names ("all year"): hosts differ in how they map them
+    path = re.sub(r'\s+', '-', unquote(url).strip('/'))
+    mimetype = content_type.split(';')[0].strip()
+    if mimetype == 'text/html':
+        return f'{path}/index.html' if path else 'index.html'
+    extension = EXTENSIONS.get(mimetype, '')
+    return path if path.endswith(extension) else path + extension
+
+
+def rewrites(outputs):
+    """_redirects lines serving each file a static server won't find at its URL"""
+    lines = []
+    for url, entry in sorted(outputs.items()):
+        if entry['file'] == NOT_FOUND:
+            continue
+        if entry['content_type'].split(';')[0].strip() != 'text/html' and '/' + entry['file'] != url:
+            lines.append(f"{url} /{entry['file']} 200")
+    lines.append(f'/* /{NOT_FOUND} 404')
+    return ''.join(line + '\n' for line in lines)
+
+
+def template_files(env, names):
+    """Source files of `names` and every template they extend, include or import"""
+    seen = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source, filename, _ = env.loader.get_source(env, name)
+        for reference in meta.find_referenced_templates(env.parse(source)):
+            if reference is None:
+                # A computed name: it could be any of them
+                pending.extend(env.list_templates())
+            else:
+                pending.append(reference)
+    return sorted(env.loader.get_source(env, name)[1] for name in seen)
+
+
+def write_file(path, data):
+    """Replace `path` atomically; returns False when it already held `data`"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+    return True
+
+
+def precompress(path):
+    """Refresh the .br/.gz siblings of an output file, dropping stale ones"""
+    written = write_precompressed(path)
+    for suffix in SUFFIXES.values():
+        if path + suffix not in written and os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def remove_output(output_dir, name):
+    path = os.path.join(output_dir, name)
+    for stale in [path] + [path + suffix for suffix in SUFFIXES.values()]:
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+class Exporter:
+    """Renders URLs into files and records what each one depended on"""
+
+    def __init__(self, app, store, output_dir=OUTPUT_DIR, base_url=BASE_URL):
+        self.app = app
+        self.store = store
+        self.output_dir = output_dir
+        self.base_url = base_url
+        self.client = app.test_client(use_cookies=False)
+        self.fingerprint = Fingerprints()
+        manifests = [app.extensions.get(name) for name in ('asset_manifest', 'image_manifest')]
+        # Pages link fingerprinted assets, so a new asset build changes them
+        self.page_files = [manifest.path for manifest in manifests if manifest is not None]
+
+    def relative(self, path):
+        return os.path.relpath(path, BASE_DIR)
+
+    def vary(self, endpoint, url):
+        spec = getattr(self.app.view_functions.get(endpoint), 'conditional', None)
+        if not spec or spec['vary'] is None:
+            return None
+        with self.app.test_request_context(url, base_url=self.base_url):
+            return str(spec['vary']())
+
+    def up_to_date(self, entry, vary):
+        if entry is None or entry['code'] != CODE_VERSION or entry['vary'] != vary:
+            return False
+        if not os.path.exists(os.path.join(self.output_dir, entry['file'])):
+            return False
+        return all(
+            self.fingerprint(os.path.join(BASE_DIR, path)) == digest
+            for path, digest in entry['inputs'].items()
+        )
+
+    def render(self, url, status=200, file=None, vary=None, endpoint=None):
+        """Fetch `url` and write it out; returns its state entry"""
+        rendered = []
+
+        def record(sender, template, context, **extra):
+            rendered.append(template.name)
+
+        with template_rendered.connected_to(record, self.app), self.store.recording() as datasets:
+            response = self.client.get(url, base_url=self.base_url)
+        if response.status_code != status:
+            raise RuntimeError(f'{url} answered {response.status_code}, expected {status}')
+
+        inputs = [self.store.path(name) for name in datasets]
+        if endpoint in WHOLE_TEMPLATES:
+            rendered += self.app.jinja_env.list_templates()
+        if rendered:
+            inputs += template_files(self.app.jinja_env, rendered) + self.page_files
+        file = file or output_file(url, response.content_type)
+        path = os.path.join(self.output_dir, file)
+        if write_file(path, response.get_data()) or not os.path.exists(path + '.gz'):
+            precompress(path)
+        return {
+            "file": file,
+            "content_type": response.content_type,
+            "code": CODE_VERSION,
+            "vary": vary,
+            "inputs": {self.relative(path): self.fingerprint(path) for path in sorted(set(inputs))},
+        }
+
+    def copy_static(self):
+        """Mirror the static folder into <output>/static; returns files copied"""
+        source_root = self.app.static_folder
+        target_root = os.path.join(self.output_dir, 'static')
+        copied = 0
+        wanted = set()
+        for root, dirs, files in os.walk(source_root):
+            for filename in files:
+                source = os.path.join(root, filename)
+                target = os.path.join(target_root, os.path.relpath(source, source_root))
+                wanted.add(target)
+                stat = os.stat(source)
+                try:
+                    current = os.stat(target)
+                    if current.st_size == stat.st_size and int(current.st_mtime) == int(stat.st_mtime):
+                        continue
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(source, target)
+                copied += 1
+        for root, dirs, files in os.walk(target_root):
+            for filename in files:
+                target = os.path.join(root, filename)
+                if target not in wanted:
+                    os.remove(target)
+        return copied
+
+    def run(self, force=False):
+        state_path = os.path.join(self.output_dir, STATE_FILE)
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        previous = state.get('outputs', {}) if state.get('base_url') == self.base_url else {}
+
+        outputs = {}
+        summary = {"rendered": [], "unchanged": 0, "removed": [], "static": 0}
+        pages = [(endpoint, url, 200, None) for endpoint, url in export_urls(self.app, self.store, self.base_url)]
+        # Any unknown URL renders the not-found page; this one stands in for all
+        pages.append((None, '/' + NOT_FOUND, 404, NOT_FOUND))
+        for endpoint, url, status, file in pages:
+            vary = self.vary(endpoint, url)
+            if not force and self.up_to_date(previous.get(url), vary):
+                outputs[url] = previous[url]
+                summary['unchanged'] += 1
+                continue
+            outputs[url] = self.render(url, status, file, vary, endpoint)
+            summary['rendered'].append(url)
+
+        kept = {entry['file'] for entry in outputs.values()}
+        for url, entry in previous.items():
+            if entry['file'] not in kept:
+                remove_output(self.output_dir, entry['file'])
+                summary['removed'].append(url)
+
+        write_file(os.path.join(self.output_dir, REWRITES), rewrites(outputs).encode('utf-8'))
+        summary['static'] = self.copy_static()
+        state = {"base_url": self.base_url, "outputs": outputs}
+        write_file(state_path, json.dumps(state, indent=2, sort_keys=True).encode('utf-8'))
+        return summary
+
+
+def export(app, store, output_dir=OUTPUT_DIR, base_url=BASE_URL, force=False):
+    """Bring `output_dir` up to date with the app; returns what changed"""
+    return Exporter(app, store, output_dir, base_url).run(force=force)
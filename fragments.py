@@ -0,0 +1,119 @@
+"""Fragment caching for template blocks shared across pages.
+
+    {% cache 'nav' %} ... {% endcache %}
+    {% cache 'tip-cards', content_version('tips') %} ... {% endcache %}
+
+The rendered block is kept under (template, name, templates fingerprint,
+script root, vary keys...), so it is reused on every page that includes
+it, including pages that are never cached whole (flashed messages, query
+strings). The script root is there because url_for() links differ for a
+town reached by host and by /<slug>/ prefix. Pass as vary keys whatever
+else the block prints: a content version, the month.
+
+Entries share one size-bounded LRUCache. Each fragment's render count and
+time, and its hit count, are reported by stats() (shown on /health).
+"""
+import threading
+import time
+
+from flask import has_request_context, request
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from caching import LRUCache
+
+
+class FragmentCacheExtension(Extension):
+    """The {% cache name[, vary...] %} tag; a no-op until FragmentCache binds it"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        vary = []
+        while parser.stream.skip_if('comma'):
+            vary.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        args = [nodes.Const(parser.name), name, nodes.List(vary)]
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template, name, vary, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.render(template, name, vary, caller)
+
+
+class FragmentStats:
+    def __init__(self):
+        self.hits = 0
+        self.renders = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "renders": self.renders,
+            "render_ms_avg": round(self.seconds * 1000 / self.renders, 3) if self.renders else 0.0,
+            "render_ms_max": round(self.slowest * 1000, 3),
+        }
+
+
+class FragmentCache:
+    """Binds the {% cache %} tag of an app's templates to one LRUCache
+
+    `version` returns the templates fingerprint, so edited templates never
+    serve fragments rendered from the old source; `scope` keeps the
+    fragments of each tenant (tenancy.py) apart. FRAGMENT_CACHE_MAX_ENTRIES
+    and FRAGMENT_CACHE_MAX_BYTES in the app config bound the cache.
+    """
+
+    def __init__(self, app, version=None, scope=None):
+        self.version = version
+        self.entries = LRUCache(
+            max_entries=app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 256),
+            max_bytes=app.config.get('FRAGMENT_CACHE_MAX_BYTES', 4 * 1024 * 1024),
+            scope=scope,
+        )
+        self.fragments = {}
+        self._lock = threading.Lock()
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+
+    def _stats(self, template, name):
+        key = f'{template}:{name}'
+        try:
+            return self.fragments[key]
+        except KeyError:
+            with self._lock:
+                return self.fragments.setdefault(key, FragmentStats())
+
+    def render(self, template, name, vary, caller):
+        stats = self._stats(template, name)
+        root = request.script_root if has_request_context() else ''
+        key = (template, name, self.version() if self.version else None, root, *map(str, vary))
+        body = self.entries.get(key)
+        if body is not None:
+            stats.hits += 1
+            return body
+        started = time.perf_counter()
+        body = Markup(caller())
+        elapsed = time.perf_counter() - started
+        stats.renders += 1
+        stats.seconds += elapsed
+        stats.slowest = max(stats.slowest, elapsed)
+        self.entries.set(key, body, len(body))
+        return body
+
+    def stats(self):
+        return {
+            "cache": self.entries.stats(),
+            "fragments": {key: stats.as_dict() for key, stats in sorted(self.fragments.items())},
+        }
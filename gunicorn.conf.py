@@ -0,0 +1,60 @@
+"""Gunicorn settings, read automatically from the working directory
+
+GUNICORN_MODE picks how each worker serves requests:
+
+- gthread (default): GUNICORN_THREADS threads per worker. A slow client or
+  a blocking write only holds one thread, and idle keep-alive connections
+  none.
+- gevent: up to GUNICORN_CONNECTIONS greenlets per worker, for many slow or
+  idle connections. Needs `pip install gevent`, and gunicorn must start
+  with the standard library already patched (gunicorn imports threading and
+  ssl before reading this file, and the preloaded app creates its locks
+  before a worker could patch):
+
+      GUNICORN_MODE=gevent python -m gevent.monkey --module gunicorn wsgi:app
+
+  Limits in this mode: slow-request traces are off (the profiler's
+  watchdog can't see greenlet stacks), sampled and signed cProfile traces
+  also count whatever other greenlets ran meanwhile, and SQLite calls made
+  while handling a request (the change log, on a data reload) still block
+  the worker's other greenlets. The submission writer and delivery loop
+  hand their SQLite work to gevent's native thread pool.
+- sync: gunicorn's default, one request at a time per worker.
+
+Command line options (--workers, --threads, -k) still take precedence.
+"""
+import os
+import sys
+
+MODE = os.environ.get('GUNICORN_MODE', 'gthread')
+
+if MODE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+elif MODE == 'gevent':
+    from content import green_threads
+    if not green_threads():
+        sys.exit('GUNICORN_MODE=gevent: start gunicorn with the standard library patched: '
+                 'python -m gevent.monkey --module gunicorn wsgi:app (pip install gevent first)')
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS', '1000'))
+elif MODE != 'sync':
+    sys.exit(f"Unknown GUNICORN_MODE '{MODE}': use sync, gthread or gevent")
+
+# Import and warm the app once in the master (wsgi.py), then fork. Set
+# GUNICORN_PRELOAD=0 to have each worker boot itself instead, e.g. when
+# using --reload.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def on_starting(server):
+    # Counters from the previous run's workers would otherwise be summed in
+    import metrics
+    metrics.reset()
+
+
+def post_worker_init(worker):
+    # Submissions are mailed from the web dyno: a worker dyno has its own
+    # filesystem and would never see the database (see submissions.py)
+    from app import deliverer
+    deliverer.start()
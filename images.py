@@ -0,0 +1,300 @@
+"""Responsive images: resized, content-hashed variants and srcset markup.
+
+`python setup.py images` takes every image under static/images/ and every
+fetched image named by the templates and data files (such as
+'youtube/<video id>' for the thumbnail of a video), and writes each one at
+the WIDTHS up to its own width as AVIF (if this Pillow can encode it), WebP
+and JPEG (PNG for images with transparency) under static/dist/images/,
+named by a hash of their content, along with static/dist/images.json.
+Fetched originals are kept in var/images (IMAGE_CACHE_DIR), so a rebuild
+only downloads them again with --refetch. Pillow is needed for the build,
+not to serve the site.
+
+In templates, picture(name, alt, sizes) emits a <picture> with a srcset
+per format, and image_url(name, width) the URL of one variant (icons,
+og:image). The variants live under static/dist/ and get the same immutable
+cache headers as other fingerprinted assets. With no manifest, or for an
+image it doesn't list, both fall back to the original: the static file, or
+the fetcher's remote URL.
+
+A fetcher is anything with url(ident) and fetch(ident) -> bytes; add one
+to FETCHERS under the prefix its images are named with.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import urllib.request
+
+from flask import url_for
+from markupsafe import Markup, escape
+
+from assets import DIST, STATIC_DIR, TEMPLATE_DIR, AssetManifest, fingerprinted
+from content import BASE_DIR
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Only `python setup.py images` needs Pillow
+    Image = None
+
+SOURCE_DIR = 'images'
+MANIFEST = 'images.json'
+CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR') or os.path.join(BASE_DIR, 'var', 'images')
+
+# Widths written for every image, plus its own width if it's smaller than
+# MAX_WIDTH; images never get scaled up
+WIDTHS = (160, 320, 480, 640, 960, 1280)
+MAX_WIDTH = 1920
+# Extra widths for the images used as icons: favicon, apple-touch-icon
+ICONS = {'images/growbalbriggan-logo.png': (32, 180)}
+# Width of the variant in <img src>, for browsers without srcset
+DEFAULT_WIDTH = 480
+
+# Most compact first: browsers take the first <source> they support
+MODERN_FORMATS = ('avif', 'webp')
+EXTENSIONS = {"avif": '.avif', "webp": '.webp', "jpeg": '.jpg', "png": '.png'}
+MIMETYPES = {"avif": 'image/avif', "webp": 'image/webp', "jpeg": 'image/jpeg', "png": 'image/png'}
+SAVE_OPTIONS = {
+    "avif": {"quality": 55},
+    "webp": {"quality": 75, "method": 6},
+    "jpeg": {"quality": 80, "optimize": True, "progressive": True},
+    "png": {"optimize": True},
+}
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+_ident = re.compile(r'^[\w-]+$')
+_referenced = re.compile(r'''(?:picture|image_url)\(\s*['"]([^'"]+)['"]''')
+
+
+class URLFetcher:
+    """Originals downloaded from a URL pattern with an {ident} field"""
+
+    def __init__(self, pattern, timeout=10):
+        self.pattern = pattern
+        self.timeout = timeout
+
+    def url(self, ident):
+        return self.pattern.format(ident=ident)
+
+    def fetch(self, ident):
+        request = urllib.request.Request(self.url(ident), headers={'User-Agent': 'GrowBalbriggan image build'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+
+FETCHERS = {
+    'youtube': URLFetcher('https://img.youtube.com/vi/{ident}/hqdefault.jpg'),
+}
+
+
+def fetched(name):
+    """(fetcher, ident) for a fetched image's name, or None for a static one"""
+    prefix, _, ident = name.partition('/')
+    fetcher = FETCHERS.get(prefix)
+    if fetcher is None or not _ident.match(ident):
+        return None
+    return fetcher, ident
+
+
+# Finding the images to build
+
+def static_images(static_dir=STATIC_DIR):
+    """Names ('images/...') of the images under static/images/"""
+    names = []
+    for root, dirs, files in os.walk(os.path.join(static_dir, SOURCE_DIR)):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(SOURCE_EXTENSIONS):
+                path = os.path.relpath(os.path.join(root, filename), static_dir)
+                names.append(path.replace(os.sep, '/'))
+    return names
+
+
+def template_images(template_dir=TEMPLATE_DIR):
+    """Names given literally to picture() and image_url() in the templates"""
+    names = set()
+    for root, dirs, files in os.walk(template_dir):
+        for filename in files:
+            with open(os.path.join(root, filename), 'r', encoding='utf-8') as f:
+                names.update(_referenced.findall(f.read()))
+    return sorted(names)
+
+
+def video_images(videos):
+    """Thumbnail names of the records of a videos.json"""
+    return [f"youtube/{video['youtube_id']}" for video in videos if video.get('youtube_id')]
+
+
+# Building
+
+def original(name, static_dir=STATIC_DIR, cache_dir=CACHE_DIR, refetch=False):
+    """Bytes of an image's original, downloading fetched ones once"""
+    source = fetched(name)
+    if source is None:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            return f.read()
+    fetcher, ident = source
+    path = os.path.join(cache_dir, name)
+    if not refetch and os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    data = fetcher.fetch(ident)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+    return data
+
+
+def formats():
+    """Formats written for every image, most compact first (fallback added per image)"""
+    return [name for name in MODERN_FORMATS if features.check(name)]
+
+
+def encode(image, fmt):
+    out = io.BytesIO()
+    image.save(out, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+    return out.getvalue()
+
+
+def render(name, data, static_dir=STATIC_DIR):
+    """Write the variants of one image; returns its manifest entry"""
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    width, height = image.size
+    widths = {w for w in WIDTHS + ICONS.get(name, ()) if w < width}
+    widths.add(min(width, MAX_WIDTH))
+
+    fallback = 'png' if transparent else 'jpeg'
+    stem = os.path.splitext(name)[0] if fetched(name) is None else f'{SOURCE_DIR}/{name}'
+    variants = {}
+    for w in sorted(widths):
+        resized = image if w == width else image.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+        for fmt in formats() + [fallback]:
+            encoded = encode(resized, fmt)
+            target = fingerprinted(f'{stem}-{w}{EXTENSIONS[fmt]}', encoded)
+            full = os.path.join(static_dir, target)
+            if not os.path.exists(full):
+                os.makedirs(os.path.dirname(full), exist_ok=True)
+                with open(full, 'wb') as f:
+                    f.write(encoded)
+            variants.setdefault(fmt, []).append([w, target])
+    return {
+        "source": hashlib.sha256(data).hexdigest()[:12],
+        "width": width,
+        "height": height,
+        "fallback": fallback,
+        "variants": variants,
+    }
+
+
+def read_manifest(static_dir=STATIC_DIR):
+    try:
+        with open(os.path.join(static_dir, DIST, MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def current(entry, data, static_dir):
+    """Whether a manifest entry was built from these bytes and is all there"""
+    if entry is None or entry.get('source') != hashlib.sha256(data).hexdigest()[:12]:
+        return False
+    if set(entry['variants']) != set(formats() + [entry['fallback']]):
+        return False
+    return all(os.path.exists(os.path.join(static_dir, target))
+               for variants in entry['variants'].values() for _, target in variants)
+
+
+def build(names, static_dir=STATIC_DIR, cache_dir=CACHE_DIR, refetch=False):
+    """Write the variants of `names` and the manifest; returns (manifest, failed)
+
+    Images built before from the same original are kept as they are. An
+    image that can't be read or fetched is left out (and linked as before).
+    """
+    if Image is None:
+        raise RuntimeError('Pillow is not installed: pip install Pillow')
+    previous = read_manifest(static_dir).get('images', {})
+    images = {}
+    failed = {}
+    for name in sorted(set(names)):
+        try:
+            data = original(name, static_dir, cache_dir, refetch)
+            entry = previous.get(name)
+            images[name] = entry if current(entry, data, static_dir) else render(name, data, static_dir)
+        except (OSError, ValueError) as e:
+            failed[name] = str(e)
+
+    manifest = {"images": images}
+    path = os.path.join(static_dir, DIST, MANIFEST)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return manifest, failed
+
+
+# Serving
+
+def pick(variants, width):
+    """The smallest variant at least `width` wide, else the widest"""
+    for w, target in variants:
+        if w >= width:
+            return target
+    return variants[-1][1]
+
+
+def srcset(variants):
+    return ', '.join(f"{url_for('static', filename=target)} {w}w" for w, target in variants)
+
+
+def original_url(name, _external=False):
+    source = fetched(name)
+    if source is not None:
+        fetcher, ident = source
+        return fetcher.url(ident)
+    return url_for('static', filename=name, _external=_external)
+
+
+def init_app(app):
+    """Add picture(), image_url() and image_built() to the templates"""
+    manifest = AssetManifest(app.static_folder, filename=MANIFEST, section='images')
+    app.extensions['image_manifest'] = manifest
+
+    @app.template_global()
+    def image_built(name):
+        return manifest.resolve(name) is not None
+
+    @app.template_global()
+    def image_url(name, width=DEFAULT_WIDTH, fmt=None, _external=False):
+        """URL of the variant of an image closest to `width` (and `fmt` if it has one)"""
+        entry = manifest.resolve(name)
+        if entry is None:
+            return original_url(name, _external=_external)
+        variants = entry['variants'].get(fmt) or entry['variants'][entry['fallback']]
+        return url_for('static', filename=pick(variants, width), _external=_external)
+
+    @app.template_global()
+    def picture(name, alt='', sizes='100vw', lazy=True):
+        """<picture> with a srcset per format, or a plain <img> of the original"""
+        entry = manifest.resolve(name)
+        if entry is None:
+            return Markup(f'<img src="{escape(original_url(name))}" alt="{escape(alt)}">')
+        variants = entry['variants']
+        fallback = variants[entry['fallback']]
+        tags = ['<picture>']
+        for fmt in MODERN_FORMATS:
+            if fmt in variants:
+                tags.append(f'<source type="{MIMETYPES[fmt]}" srcset="{srcset(variants[fmt])}" sizes="{escape(sizes)}">')
+        loading = ' loading="lazy" decoding="async"' if lazy else ''
+        tags.append(
+            f'<img src="{url_for("static", filename=pick(fallback, DEFAULT_WIDTH))}" srcset="{srcset(fallback)}" '
+            f'sizes="{escape(sizes)}" width="{entry["width"]}" height="{entry["height"]}" alt="{escape(alt)}"{loading}>'
+        )
+        tags.append('</picture>')
+        return Markup(''.join(tags))
+
+    return manifest
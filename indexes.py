@@ -0,0 +1,250 @@
+"""Inverted indexes for filtering, sorting and paginating a dataset.
+
+An index is built once whenever its dataset (re)loads. Filters are answered
+from per-value posting sets and sorting from precomputed orderings, so a
+request never scans the record list.
+"""
+import base64
+import binascii
+import bisect
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+DIFFICULTY_ORDER = {
+    "beginner": 0, "easy": 0,
+    "intermediate": 1, "medium": 1,
+    "advanced": 2, "hard": 2,
+}
+
+
+class QueryError(ValueError):
+    """Raised for filter, sort or cursor parameters the index can't answer"""
+
+
+def normalize(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value).strip().lower()
+
+
+def difficulty_rank(value):
+    return DIFFICULTY_ORDER.get(normalize(value), len(DIFFICULTY_ORDER))
+
+
+def duration_seconds(value):
+    seconds = 0
+    for part in str(value).split(':'):
+        seconds = seconds * 60 + (int(part) if part.isdigit() else 0)
+    return seconds
+
+
+def number_key(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('inf')
+
+
+def text_key(value):
+    return normalize(value)
+
+
+EMPTY = frozenset()
+
+# Query-string names for list-valued fields: ?tag=a&tag=b
+PARAM_NAMES = {'tags': 'tag'}
+
+
+class Page:
+    def __init__(self, items, total, next_after):
+        self.items = items
+        self.total = total
+        self.next_after = next_after
+        self.next_cursor = None
+
+
+class DatasetIndex:
+    """Posting sets per (field, value) plus one ordering per sort key
+
+    `filters` names the fields that can be filtered on; list-valued fields
+    such as tags get one posting per element. `sorts` maps a sort key to a
+    function turning the field value into something comparable.
+    """
+
+    def __init__(self, records, filters=(), sorts=None):
+        self.records = records
+        self.size = len(records)
+        self.filters = tuple(filters)
+        # Compiled records (compiled.py) carry these as memory-mapped arrays
+        prebuilt = getattr(records, 'prebuilt_index', None)
+        prebuilt = prebuilt(self.filters, sorts) if prebuilt is not None else None
+        if prebuilt is not None:
+            self.postings, self.multi, self.orders, self.ranks = prebuilt
+            return
+        self.postings = {field: {} for field in self.filters}
+        self.multi = set()
+        for position, record in enumerate(records):
+            for field in self.filters:
+                values = record.get(field)
+                if values is None:
+                    continue
+                if isinstance(values, (list, tuple)):
+                    self.multi.add(field)
+                else:
+                    values = (values,)
+                postings = self.postings[field]
+                for value in values:
+                    postings.setdefault(normalize(value), set()).add(position)
+        for postings in self.postings.values():
+            for value, positions in postings.items():
+                postings[value] = frozenset(positions)
+
+        self.orders = {}
+        self.ranks = {}
+        for key, convert in (sorts or {}).items():
+            convert = convert or text_key
+            order = sorted(
+                range(self.size),
+                key=lambda position: (
+                    records[position].get(key) is None,
+                    convert(records[position].get(key, '')),
+                    position,
+                ),
+            )
+            ranks = [0] * self.size
+            for rank, position in enumerate(order):
+                ranks[position] = rank
+            self.orders[key] = order
+            self.ranks[key] = ranks
+
+    def values(self, field):
+        return sorted(self.postings.get(field, {}))
+
+    def match(self, criteria):
+        """Positions matching every field in `criteria`, or None for all
+
+        Values for the same field are OR-ed (`difficulty=easy&difficulty=medium`),
+        except for list-valued fields such as tags, where every value must match.
+        """
+        sets = []
+        for field, values in criteria.items():
+            postings = self.postings[field]
+            matches = [postings.get(normalize(value), EMPTY) for value in values]
+            if field in self.multi:
+                sets.extend(matches)
+            elif len(matches) == 1:
+                sets.append(matches[0])
+            else:
+                sets.append(EMPTY.union(*matches))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+
+    def query(self, criteria=None, sort=None, descending=False, after=-1, limit=DEFAULT_LIMIT):
+        """Return one Page; `after` is the sequence number of the last item seen"""
+        if sort is not None and sort not in self.orders:
+            raise QueryError(f"cannot sort by '{sort}'")
+        matched = self.match(criteria or {})
+        total = self.size if matched is None else len(matched)
+        size = self.size
+
+        if sort is None:
+            def position_at(sequence):
+                return size - 1 - sequence if descending else sequence
+        else:
+            order = self.orders[sort]
+
+            def position_at(sequence):
+                return order[size - 1 - sequence] if descending else order[sequence]
+
+        # Collect one extra item to know whether there is a next page
+        wanted = limit + 1
+        picked = []
+        if matched is None:
+            picked = list(range(after + 1, min(size, after + 1 + wanted)))
+        elif len(matched) ** 2 < wanted * size:
+            # Selective filter: sorting the matches is cheaper than walking
+            # the whole order looking for them
+            if sort is None:
+                keys = sorted(matched)
+            else:
+                keys = sorted(map(self.ranks[sort].__getitem__, matched))
+            if descending:
+                sequences = [size - 1 - key for key in reversed(keys)]
+            else:
+                sequences = keys
+            start = bisect.bisect_right(sequences, after)
+            picked = sequences[start:start + wanted]
+        else:
+            # Broad filter: walk the precomputed order and keep the matches
+            for sequence in range(after + 1, size):
+                if position_at(sequence) in matched:
+                    picked.append(sequence)
+                    if len(picked) == wanted:
+                        break
+
+        next_after = None
+        if len(picked) > limit:
+            picked = picked[:limit]
+            next_after = picked[-1]
+        items = [self.records[position_at(sequence)] for sequence in picked]
+        return Page(items, total, next_after)
+
+
+def encode_cursor(sort_spec, after):
+    token = f'{sort_spec}:{after}'.encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_spec, size):
+    """Sequence number in a cursor issued for `sort_spec` over `size` records"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        token = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        cursor_sort, after = token.rsplit(':', 1)
+        after = int(after)
+    except (ValueError, binascii.Error, UnicodeError):
+        raise QueryError('invalid cursor')
+    if cursor_sort != sort_spec:
+        raise QueryError('cursor was issued for a different sort order')
+    if not -1 <= after < size:
+        raise QueryError('invalid cursor')
+    return after
+
+
+def query_args(index, args, **fixed):
+    """Run the query described by request `args` (a MultiDict) against `index`
+
+    Keyword arguments pin filters regardless of the query string, e.g. the
+    season taken from the URL path.
+    """
+    criteria = {}
+    for field in index.filters:
+        if field in fixed:
+            criteria[field] = [fixed[field]]
+            continue
+        names = sorted({field, PARAM_NAMES.get(field, field)})
+        values = [value for name in names for value in args.getlist(name) if value]
+        if values:
+            criteria[field] = values
+
+    sort_spec = args.get('sort', '')
+    sort = sort_spec.lstrip('-') or None
+    descending = sort_spec.startswith('-')
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError('limit must be a number')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise QueryError(f'limit must be between 1 and {MAX_LIMIT}')
+
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor, sort_spec, index.size) if cursor else -1
+
+    page = index.query(criteria, sort=sort, descending=descending, after=after, limit=limit)
+    if page.next_after is not None:
+        page.next_cursor = encode_cursor(sort_spec, page.next_after)
+    return page
@@ -0,0 +1,280 @@
+"""Per-route latency metrics in Prometheus text format.
+
+Each request records its total time plus the time spent loading data
+(functions wrapped in `timed('data')`), rendering templates and
+serializing JSON, along with the response size and status class. Cache
+hit/miss counts of watched LRUCaches are copied in after every request.
+
+Every process writes into its own fixed-size memory-mapped array of
+float64 counters under METRICS_DIR; the slot layout is derived from the
+app's endpoints, so all workers share it and /metrics adds the files of
+every worker together. Recording a request only updates slots in that
+array.
+
+With METRICS_ENABLED=0 nothing is hooked in, `timed` returns the function
+unchanged and /metrics doesn't exist.
+"""
+import bisect
+import functools
+import glob
+import hashlib
+import mmap
+import os
+import threading
+import time
+from array import array
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from flask.signals import before_render_template, template_rendered
+
+from content import BASE_DIR
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(BASE_DIR, 'var', 'metrics')
+PREFIX = 'growbalbriggan'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+# Request phases; 'total' is wall time, the others the parts spent in them
+PHASES = ('total', 'data', 'render', 'json')
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+UNMATCHED = '<unmatched>'
+
+_DATA, _RENDER, _JSON = 1, 2, 3
+_state = threading.local()
+
+
+def _timings():
+    """This thread's [started, data, render, json] accumulator"""
+    try:
+        return _state.timings
+    except AttributeError:
+        _state.timings = [0.0, 0.0, 0.0, 0.0]
+        _state.render_started = 0.0
+        return _state.timings
+
+
+def timed(phase):
+    """Count the decorated function's run time towards a request phase"""
+    slot = PHASES.index(phase)
+
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _timings()[slot] += time.perf_counter() - started
+        return wrapper
+    return decorator
+
+
+def _render_started(sender, **extra):
+    _timings()
+    _state.render_started = time.perf_counter()
+
+
+def _render_finished(sender, **extra):
+    _timings()[_RENDER] += time.perf_counter() - _state.render_started
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            _timings()[_JSON] += time.perf_counter() - started
+
+
+class Layout:
+    """Where each histogram and counter lives in the per-process array
+
+    A histogram takes one slot per bucket, one for +Inf and one for the sum;
+    its count is the total of the bucket slots.
+    """
+
+    def __init__(self, endpoints, caches):
+        self.endpoints = sorted(endpoints) + [UNMATCHED]
+        self.caches = sorted(caches)
+        self.offsets = {}
+        position = 0
+        for endpoint in self.endpoints:
+            for phase in PHASES:
+                self.offsets[endpoint, phase] = position
+                position += len(LATENCY_BUCKETS) + 2
+            self.offsets[endpoint, 'size'] = position
+            position += len(SIZE_BUCKETS) + 2
+            self.offsets[endpoint, 'status'] = position
+            position += len(STATUS_CLASSES)
+        for cache in self.caches:
+            self.offsets['cache', cache] = position
+            position += 2
+        self.size = position
+        signature = repr((self.endpoints, self.caches, PHASES, LATENCY_BUCKETS, SIZE_BUCKETS))
+        self.digest = hashlib.blake2b(signature.encode('utf-8'), digest_size=6).hexdigest()
+
+
+def observe(values, offset, bounds, value):
+    values[offset + bisect.bisect_left(bounds, value)] += 1
+    values[offset + len(bounds) + 1] += value
+
+
+class Metrics:
+    def __init__(self, app, directory=METRICS_DIR):
+        self.app = app
+        self.directory = directory
+        self.caches = {}
+        self.layout = None
+        self._values = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if not ENABLED:
+            return
+        app.json = TimedJSONProvider(app)
+        before_render_template.connect(_render_started, app)
+        template_rendered.connect(_render_finished, app)
+        app.before_request(self.start)
+        app.after_request(self.record)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def watch(self, name, cache):
+        """Export an LRUCache's hit and miss counts"""
+        self.caches[name] = cache
+
+    def _open(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            layout = Layout({rule.endpoint for rule in self.app.url_map.iter_rules()}, self.caches)
+            os.makedirs(self.directory, exist_ok=True)
+            # Files left by an earlier deploy have another layout
+            for path in glob.glob(os.path.join(self.directory, '*.bin')):
+                if not os.path.basename(path).startswith(layout.digest + '.'):
+                    os.remove(path)
+            path = os.path.join(self.directory, f'{layout.digest}.{os.getpid()}.bin')
+            with open(path, 'wb') as f:
+                f.write(bytes(layout.size * 8))
+            with open(path, 'r+b') as f:
+                self._values = memoryview(mmap.mmap(f.fileno(), layout.size * 8)).cast('d')
+            self.layout = layout
+            self._pid = os.getpid()
+
+    def start(self):
+        timings = _timings()
+        timings[1] = timings[2] = timings[3] = 0.0
+        timings[0] = time.perf_counter()
+
+    def record(self, response):
+        timings = _timings()
+        if not timings[0]:
+            return response
+        elapsed = time.perf_counter() - timings[0]
+        timings[0] = 0.0
+        if self._pid != os.getpid():
+            self._open()
+        layout = self.layout
+        values = self._values
+        endpoint = request.endpoint
+        if (endpoint, 'total') not in layout.offsets:
+            endpoint = UNMATCHED
+
+        size = None
+        if not response.is_streamed:
+            size = response.calculate_content_length() or 0
+        status_class = min(max(response.status_code // 100, 1), 5) - 1
+
+        # `+=` on the shared counters isn't atomic across threads
+        with self._lock:
+            observe(values, layout.offsets[endpoint, 'total'], LATENCY_BUCKETS, elapsed)
+            for slot in (_DATA, _RENDER, _JSON):
+                if timings[slot]:
+                    observe(values, layout.offsets[endpoint, PHASES[slot]], LATENCY_BUCKETS, timings[slot])
+            if size is not None:
+                observe(values, layout.offsets[endpoint, 'size'], SIZE_BUCKETS, size)
+            values[layout.offsets[endpoint, 'status'] + status_class] += 1
+
+            for name, cache in self.caches.items():
+                offset = layout.offsets['cache', name]
+                values[offset] = cache.hits
+                values[offset + 1] = cache.misses
+        return response
+
+    def collect(self):
+        """Element-wise sum of every worker's counters"""
+        if self._pid != os.getpid():
+            self._open()
+        totals = array('d', bytes(self.layout.size * 8))
+        for path in glob.glob(os.path.join(self.directory, f'{self.layout.digest}.*.bin')):
+            values = array('d')
+            with open(path, 'rb') as f:
+                values.frombytes(f.read())
+            if len(values) == len(totals):
+                for i, value in enumerate(values):
+                    totals[i] += value
+        return totals
+
+    def export(self):
+        totals = self.collect()
+        layout = self.layout
+        lines = []
+
+        def histogram(name, help_text, key, bounds):
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} histogram')
+            for endpoint in layout.endpoints:
+                offset = layout.offsets[endpoint, key]
+                counts = totals[offset:offset + len(bounds) + 1]
+                count = sum(counts)
+                if not count:
+                    continue
+                cumulative = 0
+                for bound, value in zip(bounds + ('+Inf',), counts):
+                    cumulative += value
+                    lines.append(f'{PREFIX}_{name}_bucket{{route="{endpoint}",le="{bound}"}} {cumulative:g}')
+                lines.append(f'{PREFIX}_{name}_sum{{route="{endpoint}"}} {totals[offset + len(bounds) + 1]:.6f}')
+                lines.append(f'{PREFIX}_{name}_count{{route="{endpoint}"}} {count:g}')
+
+        histogram('request_duration_seconds', 'Time to produce a response', 'total', LATENCY_BUCKETS)
+        histogram('data_load_seconds', 'Time spent in load_* data functions per request', 'data', LATENCY_BUCKETS)
+        histogram('render_seconds', 'Jinja render time per request', 'render', LATENCY_BUCKETS)
+        histogram('json_seconds', 'JSON serialization time per request', 'json', LATENCY_BUCKETS)
+        histogram('response_size_bytes', 'Response body size as sent', 'size', SIZE_BUCKETS)
+
+        lines.append(f'# HELP {PREFIX}_responses_total Responses by status class')
+        lines.append(f'# TYPE {PREFIX}_responses_total counter')
+        for endpoint in layout.endpoints:
+            offset = layout.offsets[endpoint, 'status']
+            for index, status_class in enumerate(STATUS_CLASSES):
+                if totals[offset + index]:
+                    lines.append(f'{PREFIX}_responses_total{{route="{endpoint}",status="{status_class}"}} '
+                                 f'{totals[offset + index]:g}')
+
+        for kind, help_text in (('hits', 'Cache lookups answered from the cache'),
+                                ('misses', 'Cache lookups that had to compute the value')):
+            lines.append(f'# HELP {PREFIX}_cache_{kind}_total {help_text}')
+            lines.append(f'# TYPE {PREFIX}_cache_{kind}_total counter')
+            for cache in layout.caches:
+                offset = layout.offsets['cache', cache] + (kind == 'misses')
+                lines.append(f'{PREFIX}_cache_{kind}_total{{cache="{cache}"}} {totals[offset]:g}')
+        lines.append(f'# HELP {PREFIX}_cache_hit_ratio Share of cache lookups that hit')
+        lines.append(f'# TYPE {PREFIX}_cache_hit_ratio gauge')
+        for cache in layout.caches:
+            offset = layout.offsets['cache', cache]
+            lookups = totals[offset] + totals[offset + 1]
+            ratio = totals[offset] / lookups if lookups else 0.0
+            lines.append(f'{PREFIX}_cache_hit_ratio{{cache="{cache}"}} {ratio:.4f}')
+
+        return self.app.response_class('\n'.join(lines) + '\n',
+                                       content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def reset(directory=METRICS_DIR):
+    """Remove every worker's counters (gunicorn calls this when it starts)"""
+    for path in glob.glob(os.path.join(directory, '*.bin')):
+        os.remove(path)
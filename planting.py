@@ -0,0 +1,196 @@
+"""Planting calendar: free-text dates to month bitmasks, indexed by month.
+
+Values like "March-May", "Spring", "April-June", "St. Patrick's Day" or
+"All Year" are parsed once, when the dataset loads, into a 12-bit mask
+(bit 0 = January). Records are then bucketed per month, so asking what
+belongs to a month is a list lookup. Values that can't be parsed are
+logged at load time and listed in `MonthIndex.unparsed`.
+
+Buckets hold record positions; with compiled data files (compiled.py) the
+positions of each distinct value come from the file, so loading parses
+each value once and decodes no records.
+"""
+import json
+import logging
+import re
+from array import array
+
+logger = logging.getLogger(__name__)
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+ALL_YEAR = (1 << 12) - 1
+
+
+def _span(first, last):
+    """Mask for months first..last inclusive (1-based), wrapping past December"""
+    mask = 0
+    month = first
+    while True:
+        mask |= 1 << (month - 1)
+        if month == last:
+            return mask
+        month = month % 12 + 1
+
+
+# Irish meteorological seasons, as (first month, last month)
+SEASON_MONTHS = {
+    'Spring': (3, 5),
+    'Summer': (6, 8),
+    'Autumn': (9, 11),
+    'Winter': (12, 2),
+}
+SEASONS = {season: _span(*ends) for season, ends in SEASON_MONTHS.items()}
+
+_month_numbers = {}
+for _number, _name in enumerate(MONTHS, 1):
+    _month_numbers[_name.lower()] = _number
+    _month_numbers[_name[:3].lower()] = _number
+_month_numbers['sept'] = 9
+
+# Words (after normalizing) naming a month or season, as (first, last) months
+_terms = {name: (number, number) for name, number in _month_numbers.items()}
+_terms.update({season.lower(): ends for season, ends in SEASON_MONTHS.items()})
+_terms['fall'] = SEASON_MONTHS['Autumn']
+
+# Dates gardeners plant by
+_days = {
+    'st patricks day': 3,
+    'paddys day': 3,
+    'easter': 4,
+    'may day': 5,
+    'midsummer': 6,
+    'halloween': 10,
+    'christmas': 12,
+}
+_all_year = {'all year', 'all year round', 'year round', 'any time', 'anytime'}
+_qualifiers = re.compile(r'\b(early|mid|late|from|until|till|the|in)\b')
+_separators = re.compile(r'\s*(?:,|/|&|\band\b|\bor\b|;)\s*')
+_range = re.compile(r'\s*(?:-|–|—|\bto\b|\bthrough\b)\s*')
+
+
+def _normalize(text):
+    text = str(text).lower().replace('’', "'").replace("'", '').replace('.', ' ')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _term(text):
+    """(first, last) months for one month, season or planting day"""
+    if text in _days:
+        return _days[text], _days[text]
+    text = re.sub(r'\s+', ' ', _qualifiers.sub(' ', text)).strip()
+    return _terms.get(text)
+
+
+def parse(text):
+    """12-bit month mask for a planting time, or None if it isn't understood"""
+    if text is None:
+        return None
+    normalized = _normalize(text)
+    if not normalized:
+        return None
+    if normalized in _all_year:
+        return ALL_YEAR
+
+    mask = 0
+    for part in _separators.split(normalized):
+        if not part:
+            continue
+        ends = [_term(end) for end in _range.split(part)]
+        if len(ends) > 2 or None in ends:
+            return None
+        # "Spring-Summer" runs from the first month of one to the last of the other
+        mask |= _span(ends[0][0], ends[-1][1])
+    return mask or None
+
+
+def month_number(value):
+    """1-12 for a month name, abbreviation or number; None otherwise"""
+    value = str(value).strip().lower()
+    if value.isdigit():
+        number = int(value)
+        return number if 1 <= number <= 12 else None
+    return _month_numbers.get(value)
+
+
+def months(mask):
+    return [name for index, name in enumerate(MONTHS) if mask & (1 << index)]
+
+
+class Selection:
+    """Records of a dataset at the given positions, looked up on access"""
+
+    __slots__ = ('records', 'positions')
+
+    def __init__(self, records, positions):
+        self.records = records
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        for position in self.positions:
+            yield self.records[position]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.records[position] for position in self.positions[key]]
+        return self.records[self.positions[key]]
+
+
+def facet(records, field):
+    """[(value, positions)] for each distinct value of `field`"""
+    compiled = getattr(records, 'facet', None)
+    compiled = compiled(field) if compiled is not None else None
+    if compiled is not None:
+        return compiled
+    groups = {}
+    for position, record in enumerate(records):
+        value = record.get(field)
+        key = value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+        try:
+            groups[key][1].append(position)
+        except KeyError:
+            groups[key] = (value, [position])
+    return list(groups.values())
+
+
+class MonthIndex:
+    """Records bucketed by the months their `field` covers
+
+    `buckets[m]` holds the records for month m + 1 in file order, and
+    `seasons` the records whose value is exactly one season, each as a
+    Selection. Records with an unparseable value appear in no bucket.
+    """
+
+    def __init__(self, records, field, name=None):
+        self.field = field
+        buckets = [[] for _ in MONTHS]
+        seasons = {season: [] for season in SEASONS}
+        by_mask = {mask: season for season, mask in SEASONS.items()}
+        unparsed = []
+        for value, positions in facet(records, field):
+            mask = None if isinstance(value, (list, dict)) else parse(value)
+            if mask is None:
+                unparsed.extend(positions)
+                continue
+            for index in range(12):
+                if mask & (1 << index):
+                    buckets[index].extend(positions)
+            if mask in by_mask:
+                seasons[by_mask[mask]].extend(positions)
+        self.buckets = [Selection(records, array('I', sorted(bucket))) for bucket in buckets]
+        self.seasons = {season: Selection(records, array('I', sorted(bucket))) for season, bucket in seasons.items()}
+        self.unparsed = [
+            {"id": record.get('id'), "value": record.get(field)}
+            for record in Selection(records, sorted(unparsed))
+        ]
+        if self.unparsed:
+            examples = ', '.join(f"{entry['value']!r} (id {entry['id']})" for entry in self.unparsed[:5])
+            logger.warning("%s: can't parse %s of %d record(s): %s%s", name or 'records', field,
+                           len(self.unparsed), examples, ', ...' if len(self.unparsed) > 5 else '')
+
+    def month(self, number):
+        """Records for month `number` (1-12)"""
+        return self.buckets[number - 1]
@@ -0,0 +1,357 @@
+"""Request profiling on demand, and traces of slow requests.
+
+A request is profiled with cProfile (every Python call, including the
+compiled template's render functions and the load_* data calls) when:
+
+- it is picked by PROFILE_SAMPLE_RATE (a fraction, 0 by default), or
+- it carries an `X-Profile` header signed with PROFILE_SECRET; make one
+  with `python setup.py profile-token [minutes]`.
+
+Any other request still running after PROFILE_SLOW_MS gets its stack
+sampled by a watchdog thread (through sys._current_frames()) every
+PROFILE_SAMPLE_INTERVAL_MS until it finishes. The trace then covers the
+time after it turned slow, as collapsed stacks ("a;b;c count", the input
+of flamegraph tools).
+
+Traces go to var/profiles (PROFILE_DIR), one file plus a .json of the
+request details each. Only the newest PROFILE_KEEP of them, up to
+PROFILE_MAX_MB, are kept. With ADMIN_TOKEN set, /admin/profiles lists
+them and /admin/profiles/<name> downloads one (`?format=text` prints a
+cProfile trace sorted by cumulative time); both want an
+`Authorization: Bearer <ADMIN_TOKEN>` header.
+
+Requests that aren't traced only pay a random() call, a header lookup and
+a dict update. With none of the triggers configured no hook is installed.
+
+Under gevent (GUNICORN_MODE=gevent) requests run on greenlets, whose stacks
+sys._current_frames() doesn't show, so slow-request traces are switched
+off there; cProfile traces then include other greenlets' work too.
+"""
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+from flask import abort, request, send_file
+
+from content import BASE_DIR, green_threads
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(BASE_DIR, 'var', 'profiles')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+SECRET = os.environ.get('PROFILE_SECRET', '')
+SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '0'))
+SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+KEEP = int(os.environ.get('PROFILE_KEEP', '100'))
+MAX_BYTES = int(float(os.environ.get('PROFILE_MAX_MB', '64')) * 1024 * 1024)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+HEADER = 'X-Profile'
+# Deepest stack a sample keeps, counted from the innermost frame
+MAX_DEPTH = 128
+_name = re.compile(r'^[\w.-]+$')
+
+
+def sign(secret, expires):
+    return hmac.new(secret.encode('utf-8'), str(expires).encode('ascii'), hashlib.sha256).hexdigest()
+
+
+def token(secret=SECRET, minutes=10):
+    """Value for the X-Profile header, valid for `minutes`"""
+    expires = int(time.time()) + int(minutes * 60)
+    return f'{expires}.{sign(secret, expires)}'
+
+
+def valid_token(value, secret=SECRET):
+    if not secret or not value:
+        return False
+    expires, _, signature = value.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, sign(secret, expires))
+
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(BASE_DIR + os.sep):
+        filename = os.path.relpath(filename, BASE_DIR)
+    else:
+        # Library frames: keep the package path, drop site-packages/...
+        filename = filename.rsplit('site-packages' + os.sep, 1)[-1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """One stack, outermost frame first, joined with ';'"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Trace:
+    """A request being watched: its start, and its stack samples once slow"""
+
+    __slots__ = ('ident', 'started', 'samples')
+
+    def __init__(self, ident, started):
+        self.ident = ident
+        self.started = started
+        self.samples = None
+
+
+class ProfileStore:
+    """Bounded folder of traces, shared by the workers"""
+
+    def __init__(self, directory=PROFILE_DIR, keep=KEEP, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.keep = keep
+        self.max_bytes = max_bytes
+
+    def new_name(self, trigger, path, extension):
+        slug = re.sub(r'[^\w]+', '_', path).strip('_')[:60] or 'root'
+        return f'{time.time_ns() // 1000:016d}-{os.getpid()}-{trigger}-{slug}{extension}'
+
+    def save(self, name, write, details):
+        """Write a trace through `write(path)` and its details beside it"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        write(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with open(path + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(details, f)
+        os.replace(path + '.json.tmp', path + '.json')
+        self.prune()
+
+    def entries(self):
+        """(name, size) of the stored traces, newest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith(('.json', '.tmp')):
+                continue
+            try:
+                entries.append((name, os.path.getsize(os.path.join(self.directory, name))))
+            except FileNotFoundError:
+                continue
+        return sorted(entries, reverse=True)
+
+    def prune(self):
+        total = 0
+        for index, (name, size) in enumerate(self.entries()):
+            total += size
+            if index < self.keep and total <= self.max_bytes:
+                continue
+            for stale in (name, name + '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, stale))
+                except FileNotFoundError:
+                    pass
+
+    def details(self, name):
+        try:
+            with open(os.path.join(self.directory, name + '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def path(self, name):
+        path = os.path.join(self.directory, name)
+        if not _name.match(name) or name.endswith('.json') or not os.path.isfile(path):
+            return None
+        return path
+
+
+class Profiler:
+    """WSGI middleware deciding per request whether to trace it"""
+
+    def __init__(self, app, store=None, sample_rate=SAMPLE_RATE, secret=SECRET, slow_ms=SLOW_MS,
+                 admin_token=ADMIN_TOKEN):
+        self.app = app
+        self.store = store or ProfileStore()
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.slow = slow_ms / 1000
+        self.interval = SAMPLE_INTERVAL_MS / 1000
+        self.admin_token = admin_token
+        self.captured = {"sampled": 0, "signed": 0, "slow": 0}
+        self._inflight = {}
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        if self.slow > 0 and green_threads():
+            logger.warning('PROFILE_SLOW_MS is ignored under gevent: greenlet stacks cannot be sampled')
+            self.slow = 0
+        if sample_rate > 0 or secret or self.slow > 0:
+            self.wsgi_app = app.wsgi_app
+            app.wsgi_app = self
+        if admin_token:
+            app.add_url_rule('/admin/profiles', 'admin_profiles', self.list_profiles)
+            app.add_url_rule('/admin/profiles/<name>', 'admin_profile', self.download)
+
+    def __call__(self, environ, start_response):
+        trigger = None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            trigger = 'sampled'
+        elif self.secret and environ.get('HTTP_X_PROFILE') and valid_token(environ['HTTP_X_PROFILE'], self.secret):
+            trigger = 'signed'
+        if trigger is not None:
+            return self.profiled(trigger, environ, start_response)
+        if self.slow > 0:
+            return self.watched(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def details(self, environ, trigger, started, status):
+        elapsed = time.perf_counter() - started
+        query = environ.get('QUERY_STRING')
+        return {
+            "trigger": trigger,
+            "method": environ.get('REQUEST_METHOD'),
+            "url": environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '') + (f'?{query}' if query else ''),
+            "tenant": environ.get('growbalbriggan.tenant'),
+            "status": status,
+            "started": round(time.time() - elapsed, 3),
+            "duration_ms": round(elapsed * 1000, 3),
+            "pid": os.getpid(),
+        }
+
+    def run(self, environ, start_response, status, buffer=False):
+        def capture(line, headers, exc_info=None):
+            status.append(line)
+            return start_response(line, headers, exc_info)
+        iterable = self.wsgi_app(environ, capture)
+        if not buffer:
+            return iterable
+        # Read the body here so anything generated while iterating is traced too
+        try:
+            return [b''.join(iterable)]
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    def profiled(self, trigger, environ, start_response):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this process (Python 3.12+)
+            return self.wsgi_app(environ, start_response)
+        started = time.perf_counter()
+        status = []
+        try:
+            return self.run(environ, start_response, status, buffer=True)
+        finally:
+            profile.disable()
+            details = self.details(environ, trigger, started, status[0] if status else None)
+            name = self.store.new_name(trigger, environ.get('PATH_INFO', ''), '.prof')
+            self.store.save(name, profile.dump_stats, details)
+            with self._lock:
+                self.captured[trigger] += 1
+
+    def watched(self, environ, start_response):
+        if self._pid != os.getpid():
+            self._start_watchdog()
+        trace = Trace(threading.get_ident(), time.perf_counter())
+        self._inflight[trace.ident] = trace
+        self._wakeup.set()
+        status = []
+        try:
+            return self.run(environ, start_response, status)
+        finally:
+            del self._inflight[trace.ident]
+            if trace.samples:
+                details = self.details(environ, 'slow', trace.started, status[0] if status else None)
+                details["sample_interval_ms"] = self.interval * 1000
+                details["sampled_after_ms"] = self.slow * 1000
+                name = self.store.new_name('slow', environ.get('PATH_INFO', ''), '.txt')
+                lines = ''.join(f'{stack} {count}\n' for stack, count in sorted(trace.samples.items()))
+                self.store.save(name, lambda path: self._write_text(path, lines), details)
+                with self._lock:
+                    self.captured['slow'] += 1
+
+    @staticmethod
+    def _write_text(path, text):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _start_watchdog(self):
+        # Threads don't survive fork(), so each worker starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._inflight = {}
+            threading.Thread(target=self._watch, name='profile-watchdog', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _watch(self):
+        """Sleep until a request turns slow, then sample it until it's done"""
+        while True:
+            traces = list(self._inflight.values())
+            if not traces:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            now = time.perf_counter()
+            slow = [trace for trace in traces if now - trace.started >= self.slow]
+            if slow:
+                frames = sys._current_frames()
+                for trace in slow:
+                    frame = frames.get(trace.ident)
+                    if frame is None:
+                        continue
+                    if trace.samples is None:
+                        trace.samples = {}
+                    stack = collapse(frame)
+                    trace.samples[stack] = trace.samples.get(stack, 0) + 1
+                del frames
+                time.sleep(self.interval)
+            else:
+                # Until the oldest request would turn slow, or a new one starts
+                self._wakeup.clear()
+                self._wakeup.wait(self.slow - (now - min(trace.started for trace in traces)))
+
+    # Admin endpoints
+
+    def authorize(self):
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {self.admin_token}'.encode('utf-8')):
+            abort(401)
+
+    def list_profiles(self):
+        self.authorize()
+        profiles = [
+            {"name": name, "bytes": size, **self.store.details(name)}
+            for name, size in self.store.entries()
+        ]
+        response = self.app.json.response({"captured": self.captured, "profiles": profiles})
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    def download(self, name):
+        self.authorize()
+        path = self.store.path(name)
+        if path is None:
+            abort(404)
+        if name.endswith('.prof') and request.args.get('format') == 'text':
+            out = io.StringIO()
+            pstats.Stats(path, stream=out).strip_dirs().sort_stats('cumulative').print_stats(80)
+            response = self.app.response_class(out.getvalue(), mimetype='text/plain')
+        else:
+            response = send_file(path, as_attachment=True, download_name=name, max_age=0)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
@@ -0,0 +1,174 @@
+"""Token-bucket rate limiting shared by every worker on the host.
+
+Buckets live in a small memory-mapped file (var/ratelimit.bin by default),
+an open-addressed table of fixed-size slots, so gunicorn workers see each
+other's counts without an external service. Updates happen under an
+fcntl lock on the file plus a thread lock, which costs a couple of
+microseconds per check.
+
+    @app.route('/subscribe', methods=['POST'])
+    @limiter.limit(rate=1 / 60, burst=5, by_email=True)
+    def subscribe(): ...
+
+The IP check runs before the view touches request.form, so rejected
+requests are never parsed or rendered. `by_email` adds a second bucket per
+submitted address. app.config['RATE_LIMITS'] overrides the rate and burst
+per endpoint, e.g. {'subscribe': {'rate': 1, 'burst': 10}}.
+"""
+import fcntl
+import functools
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import request
+
+from content import BASE_DIR
+
+STATE_PATH = os.environ.get('RATELIMIT_FILE') or os.path.join(BASE_DIR, 'var', 'ratelimit.bin')
+SLOTS = 16384
+PROBES = 8
+# Proxy hops in front of the app whose X-Forwarded-For entries are trusted
+# (Heroku's router is one)
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', '1' if 'DYNO' in os.environ else '0'))
+
+# key hash, tokens left, last update (monotonic seconds)
+_slot = struct.Struct('<Qdd')
+
+
+def key_hash(*parts):
+    digest = hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=8).digest()
+    # 0 marks an empty slot
+    return int.from_bytes(digest, 'little') | 1
+
+
+class SharedBuckets:
+    """Fixed-size table of token buckets in a shared memory-mapped file
+
+    When every slot a key may probe is taken, the least recently updated
+    one is reused: an evicted client just starts again with a full bucket.
+    """
+
+    def __init__(self, path=STATE_PATH, slots=SLOTS):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _open(self):
+        # Opened per process: a descriptor inherited across fork would share
+        # its flock with the parent
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        size = self.slots * _slot.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size != size:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        self._file = fd
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    def take(self, key, rate, burst, now=None):
+        """Spend one token; returns 0 if allowed, else seconds until one is free"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+        now = time.monotonic() if now is None else now
+        buf = self._map
+        start = key % self.slots
+        with self._lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                target = None
+                oldest = None
+                for probe in range(PROBES):
+                    offset = ((start + probe) % self.slots) * _slot.size
+                    slot_key, tokens, updated = _slot.unpack_from(buf, offset)
+                    if slot_key == key:
+                        target = offset
+                        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+                        break
+                    if slot_key == 0:
+                        target = offset
+                        tokens = burst
+                        break
+                    if oldest is None or updated < oldest[1]:
+                        oldest = (offset, updated)
+                else:
+                    target = oldest[0]
+                    tokens = burst
+
+                if tokens >= 1:
+                    _slot.pack_into(buf, target, key, tokens - 1, now)
+                    return 0
+                _slot.pack_into(buf, target, key, tokens, now)
+                return (1 - tokens) / rate
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+def client_ip():
+    route = request.access_route if TRUSTED_PROXIES else []
+    if len(route) > TRUSTED_PROXIES:
+        return route[-TRUSTED_PROXIES]
+    return request.remote_addr or ''
+
+
+class RateLimiter:
+    """Per-route limits over one SharedBuckets table
+
+    Set RATE_LIMIT_ENABLED = False in the app config (or RATE_LIMIT_ENABLED=0
+    in the environment) to switch it off.
+    """
+
+    def __init__(self, app, buckets=None):
+        self.app = app
+        self.buckets = buckets or SharedBuckets()
+        app.config.setdefault('RATE_LIMIT_ENABLED', os.environ.get('RATE_LIMIT_ENABLED', '1') != '0')
+        app.config.setdefault('RATE_LIMITS', {})
+        self.rejected = 0
+
+    def too_many(self, retry_after):
+        # Threaded workers reject concurrently; `+=` alone could lose counts
+        with self.buckets._lock:
+            self.rejected += 1
+        response = self.app.response_class(
+            '🐌 Too many requests - please wait a moment and try again.\n',
+            status=429, mimetype='text/plain')
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def limit(self, rate, burst, by_email=False, methods=('POST',)):
+        """Allow `burst` requests at once, refilling at `rate` per second"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in methods or not self.app.config['RATE_LIMIT_ENABLED']:
+                    return view(*args, **kwargs)
+                endpoint = request.endpoint
+                limits = self.app.config['RATE_LIMITS'].get(endpoint, {})
+                route_rate = limits.get('rate', rate)
+                route_burst = limits.get('burst', burst)
+
+                wait = self.buckets.take(key_hash(endpoint, 'ip', client_ip()), route_rate, route_burst)
+                if not wait and by_email:
+                    email = (request.form.get('email') or '').strip().lower()
+                    if email:
+                        wait = self.buckets.take(key_hash(endpoint, 'email', email), route_rate, route_burst)
+                if wait:
+                    return self.too_many(wait)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
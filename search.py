@@ -0,0 +1,182 @@
+"""Full-text search over tips, plants and videos.
+
+Every dataset gets its own index segment, built by the content store when
+that file (re)loads, so editing videos.json never re-indexes the tips.
+Queries combine the segments with BM25 scoring; the last query word is
+treated as a prefix so the same endpoint can drive autocomplete.
+
+Postings are stored impact-ordered (best-scoring documents first), which
+lets a query stop after the top MAX_POSTINGS documents of each term and
+keeps lookups well under a millisecond on catalogues of tens of thousands
+of records.
+"""
+import bisect
+import heapq
+import math
+import re
+from operator import itemgetter
+
+from caching import LRUCache
+
+K1 = 1.2
+B = 0.75
+MAX_POSTINGS = 128
+MAX_EXPANSIONS = 8
+MAX_QUERY_TERMS = 8
+# Completions of prefixes up to this length are precomputed per segment
+SHORT_PREFIX = 3
+MAX_PREFIX_SCAN = 256
+
+_word = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    text = str(text).lower().replace("'", '').replace('’', '')
+    return _word.findall(text)
+
+
+class Segment:
+    """Inverted index for one dataset
+
+    `fields` maps a record field to its weight; list-valued fields such as
+    tags are indexed element by element.
+    """
+
+    def __init__(self, name, records, fields):
+        self.name = name
+        self.records = records
+        self.size = len(records)
+        self.fields = fields
+        # Compiled records (compiled.py) carry the postings as mapped arrays
+        prebuilt = getattr(records, 'prebuilt_segment', None)
+        prebuilt = prebuilt(fields) if prebuilt is not None else None
+        if prebuilt is not None:
+            self.postings, self.vocabulary, self.completions = prebuilt
+            return
+        frequencies = {}
+        lengths = []
+        for position, record in enumerate(records):
+            length = 0
+            for field, weight in fields.items():
+                value = record.get(field)
+                if value is None:
+                    continue
+                if isinstance(value, (list, tuple)):
+                    value = ' '.join(str(item) for item in value)
+                for token in tokenize(value):
+                    per_doc = frequencies.setdefault(token, {})
+                    per_doc[position] = per_doc.get(position, 0) + weight
+                    length += weight
+            lengths.append(length)
+
+        average = (sum(lengths) / len(lengths)) if lengths else 0.0
+        self.postings = {}
+        for term, per_doc in frequencies.items():
+            impacts = []
+            for position, tf in per_doc.items():
+                norm = 1 - B + B * (lengths[position] / average) if average else 1
+                impacts.append((tf * (K1 + 1) / (tf + K1 * norm), position))
+            impacts.sort(reverse=True)
+            self.postings[term] = impacts
+        self.vocabulary = sorted(self.postings)
+
+        # Short prefixes match too many words to scan, so keep their most
+        # common completions ready
+        completions = {}
+        for term, impacts in self.postings.items():
+            for length in range(1, min(SHORT_PREFIX, len(term)) + 1):
+                completions.setdefault(term[:length], []).append((len(impacts), term))
+        self.completions = {
+            prefix: [term for _, term in heapq.nlargest(MAX_EXPANSIONS, candidates)]
+            for prefix, candidates in completions.items()
+        }
+
+    def df(self, term):
+        postings = self.postings.get(term)
+        return len(postings) if postings else 0
+
+    def expand(self, prefix):
+        """Indexed terms starting with `prefix`"""
+        if len(prefix) <= SHORT_PREFIX:
+            terms = list(self.completions.get(prefix, ()))
+            if prefix in self.postings and prefix not in terms:
+                terms.append(prefix)
+            return terms
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_SCAN]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+
+class SearchIndex:
+    """Queries the per-dataset segments of a ContentStore"""
+
+    def __init__(self, store, fields, results_cache_size=1024, scope=None):
+        self.store = store
+        self.fields = fields
+        self.results = LRUCache(max_entries=results_cache_size, max_bytes=8 * 1024 * 1024, scope=scope)
+        for name, weights in fields.items():
+            store.derive(name, 'search', lambda records, name=name, weights=weights: Segment(name, records, weights))
+
+    def segments(self, names=None):
+        return [self.store.derived(name, 'search') for name in (names or self.fields)]
+
+    def search(self, query, names=None, limit=10, prefix=True):
+        """Best (score, dataset, record) matches for `query`"""
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        segments = self.segments(names)
+        key = (tuple(terms), prefix, limit,
+               tuple((segment.name, self.store.datasets[segment.name].version) for segment in segments))
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+
+        total = sum(segment.size for segment in segments)
+        groups = []
+        for index, term in enumerate(terms):
+            if prefix and index == len(terms) - 1:
+                candidates = {}
+                for segment in segments:
+                    for expanded in segment.expand(term):
+                        candidates[expanded] = candidates.get(expanded, 0) + segment.df(expanded)
+                # Keep the exact word plus the most common completions
+                expansions = heapq.nlargest(MAX_EXPANSIONS, candidates, key=lambda t: (t == term, candidates[t]))
+                groups.append(expansions)
+            else:
+                groups.append([term])
+
+        scores = {}
+        matched = {}
+        for group_index, group in enumerate(groups):
+            bit = 1 << group_index
+            # Prefix completions share one posting budget between them
+            depth = max(16, MAX_POSTINGS // len(group)) if group else 0
+            for term in group:
+                df = sum(segment.df(term) for segment in segments)
+                if not df:
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                for segment in segments:
+                    postings = segment.postings.get(term)
+                    if not postings:
+                        continue
+                    name = segment.name
+                    for impact, position in postings[:depth]:
+                        doc = (name, position)
+                        scores[doc] = scores.get(doc, 0.0) + idf * impact
+                        matched[doc] = matched.get(doc, 0) | bit
+
+        # Documents matching more of the query words rank first
+        coverage = len(groups)
+        for doc, score in scores.items():
+            scores[doc] = score * (bin(matched[doc]).count('1') / coverage) ** 2
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        by_name = {segment.name: segment for segment in segments}
+        results = [(round(score, 4), doc[0], by_name[doc[0]].records[doc[1]]) for doc, score in best]
+        self.results.set(key, results, 64 * len(results) + 64)
+        return results
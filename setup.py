@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import json
 
 def setup_project():
@@ -28,8 +29,6 @@ def setup_project():
         'community-bg.jpg',
         'balbriggan-map.svg',
         'growbalbriggan-logo.png',
-        'apple-touch-icon.png',
-        'favicon.ico'
     ]
     
     for image in placeholder_images:
@@ -46,11 +45,6 @@ def setup_project():
                     <text x="200" y="180" text-anchor="middle" fill="white" font-family="Arial" font-size="14">
                     (Placeholder Image)</text>
                     </svg>''')
-            elif image.endswith('.ico'):
-                # Create minimal ICO file (would be replaced with actual icon)
-                with open(path, 'wb') as f:
-                    # Minimal ICO header
-                    f.write(b'\x00\x00\x01\x00\x01\x00\x10\x10\x00\x00\x01\x00\x08\x00(\x01\x00\x00')
             else:
                 # Create text file explaining it's a placeholder
                 with open(path + '.txt', 'w') as f:
@@ -381,5 +375,126 @@ document.addEventListener('DOMContentLoaded', function() {
     print("5. Add your actual data to data/ files")
     print("\n🌱 Happy gardening from Balbriggan!")
 
+def build_assets():
+    """Minify, bundle and fingerprint everything under static/"""
+    import assets
+
+    print("🎨 Building static assets...\n")
+    if '--extract' in sys.argv:
+        for path in assets.extract_inline_assets():
+            print(f"✅ Extracted inline block to static/{path}")
+    manifest = assets.build()
+    for source, target in sorted(manifest['assets'].items()):
+        print(f"✅ {source} -> static/{target}")
+    print(f"\n📦 Wrote static/{assets.DIST}/{assets.MANIFEST} ({len(manifest['assets'])} assets)")
+
+def build_images():
+    """Resize every image and video thumbnail into fingerprinted WebP/AVIF/JPEG variants"""
+    import images
+    from app import tenants
+
+    print("🖼️  Building responsive images...\n")
+    names = images.static_images() + images.template_images()
+    for tenant in tenants.all():
+        path = os.path.join(tenant.data_dir, 'videos.json')
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                names += images.video_images(json.load(f))
+    try:
+        manifest, failed = images.build(names, refetch='--refetch' in sys.argv)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    for name, entry in sorted(manifest['images'].items()):
+        counts = ', '.join(f"{len(variants)} {fmt}" for fmt, variants in sorted(entry['variants'].items()))
+        print(f"✅ {name} ({entry['width']}x{entry['height']}): {counts}")
+    for name, error in sorted(failed.items()):
+        print(f"⚠️  Skipped {name}: {error}")
+    print(f"\n📦 Wrote static/{images.DIST}/{images.MANIFEST} ({len(manifest['images'])} images)")
+
+def compile_templates():
+    """Precompile every template into the Jinja bytecode cache"""
+    import warmup
+    from app import app
+
+    print("🧩 Compiling templates...\n")
+    warmup.use_bytecode_cache(app)
+    count = warmup.compile_templates(app)
+    print(f"✅ Compiled {count} templates into {os.path.relpath(warmup.BYTECODE_DIR)}")
+
+def compile_data():
+    """Compile the indexed data files of every town into memory-mapped .gbc files"""
+    import compiled
+    from app import API_DATASETS, CALENDAR_FIELDS, INDEX_SPECS, search_index, tenants
+    from changes import change_columns
+    from indexes import DatasetIndex
+    from search import Segment
+
+    print("🗜️  Compiling data files...\n")
+    for tenant in tenants.all():
+        store = tenants.store(tenant)
+        for name, spec in INDEX_SPECS.items():
+            source = store.path(name)
+            if not os.path.exists(source):
+                print(f"⚠️  Skipped {tenant.slug} {name}: {os.path.relpath(source)} not found")
+                continue
+            with open(source, 'r', encoding='utf-8') as f:
+                raw = f.read()
+            records = json.loads(raw)
+            data = compiled.build(
+                records, compiled.source_signature(source, raw),
+                index=DatasetIndex(records, **spec),
+                facets=[CALENDAR_FIELDS[name]] if name in CALENDAR_FIELDS else [],
+                segment=Segment(name, records, search_index.fields[name]) if name in search_index.fields else None,
+                changes=change_columns(records) if name in API_DATASETS else None,
+            )
+            target = store.compiled_path(name)
+            compiled.write(target, data)
+            print(f"✅ {os.path.relpath(source)} -> {os.path.relpath(target)} "
+                  f"({len(records)} records, {len(data) // 1024} KB)")
+
+def export_site():
+    """Render the site into static files, re-rendering only what changed"""
+    import export
+    from app import app, content
+
+    def option(name, default):
+        if name in sys.argv[:-1]:
+            return sys.argv[sys.argv.index(name) + 1]
+        return default
+
+    output_dir = option('--output', export.OUTPUT_DIR)
+    base_url = option('--base-url', export.BASE_URL)
+    print(f"📤 Exporting {base_url} to {os.path.relpath(output_dir)}...\n")
+    summary = export.export(app, content, output_dir, base_url, force='--force' in sys.argv)
+    for url in summary['rendered']:
+        print(f"✅ Rendered {url}")
+    for url in summary['removed']:
+        print(f"🗑️  Removed {url}")
+    print(f"\n📦 {len(summary['rendered'])} rendered, {summary['unchanged']} unchanged, "
+          f"{summary['static']} static files copied")
+
+def profile_token():
+    """Print an X-Profile header value that gets one request profiled"""
+    import profiling
+
+    if not profiling.SECRET:
+        sys.exit("Set PROFILE_SECRET (the same value the app runs with) first")
+    minutes = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"{profiling.HEADER}: {profiling.token(minutes=minutes)}")
+    print(f"\n⏱️  Valid for {minutes:g} minutes. Fetch the traces from /admin/profiles")
+
+COMMANDS = {
+    'setup': setup_project,
+    'assets': build_assets,
+    'images': build_images,
+    'templates': compile_templates,
+    'compile': compile_data,
+    'export': export_site,
+    'profile-token': profile_token,
+}
+
 if __name__ == '__main__':
-    setup_project()
+    command = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith('-') else 'setup'
+    if command not in COMMANDS:
+        sys.exit(f"Unknown command '{command}'. Available: {', '.join(COMMANDS)}")
+    COMMANDS[command]()
@@ -0,0 +1,30 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const menuToggle = document.getElementById('menuToggle');
+    const mobileMenu = document.getElementById('mobileMenu');
+    const menuBackdrop = document.getElementById('menuBackdrop');
+    const body = document.body;
+
+    function toggleMenu() {
+        mobileMenu.classList.toggle('active');
+        menuBackdrop.classList.toggle('active');
+        menuToggle.classList.toggle('active');
+        body.classList.toggle('menu-open');
+
+        menuToggle.innerHTML = mobileMenu.classList.contains('active') 
+            ? '<span class="menu-icon">✕</span>' 
+            : '<span class="menu-icon">☰</span>';
+    }
+
+    menuToggle.addEventListener('click', toggleMenu);
+    menuBackdrop.addEventListener('click', toggleMenu);
+
+    document.querySelectorAll('.mobile-menu a').forEach(link => {
+        link.addEventListener('click', toggleMenu);
+    });
+
+    window.addEventListener('resize', function() {
+        if (window.innerWidth > 992 && mobileMenu.classList.contains('active')) {
+            toggleMenu();
+        }
+    });
+});
@@ -0,0 +1,74 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // RSVP Form Submission
+    const rsvpForm = document.querySelector('.rsvp-form');
+    if (rsvpForm) {
+        rsvpForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+
+            // Simple validation
+            const name = document.getElementById('name').value.trim();
+            const email = document.getElementById('email').value.trim();
+            const event = document.getElementById('event').value;
+
+            if (!name || !email || !event) {
+                alert('Please fill in all required fields! 🌱');
+                return;
+            }
+
+            // Show success message
+            alert(`🎉 Amazing ${name}! You're registered for ${event}. We'll email details to ${email} within 24 hours!`);
+
+            // Reset form
+            rsvpForm.reset();
+
+            // Scroll to top
+            window.scrollTo({
+                top: 0,
+                behavior: 'smooth'
+            });
+        });
+    }
+
+    // Map spot interactions
+    const mapSpots = document.querySelectorAll('.map-spot');
+    mapSpots.forEach(spot => {
+        spot.addEventListener('click', function() {
+            const location = this.querySelector('.map-label').textContent;
+            alert(`📍 ${location} is waiting for you! Check our events calendar for upcoming activities here.`);
+        });
+    });
+
+    // Animate stats on scroll
+    const observerOptions = {
+        threshold: 0.5
+    };
+
+    const observer = new IntersectionObserver((entries) => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                entry.target.classList.add('animated');
+            }
+        });
+    }, observerOptions);
+
+    document.querySelectorAll('.stat-card, .team-member, .story-card').forEach(el => {
+        observer.observe(el);
+    });
+
+    // WhatsApp group link
+    const whatsappBtn = document.querySelector('a[href="#whatsapp"]');
+    if (whatsappBtn) {
+        whatsappBtn.addEventListener('click', function(e) {
+            e.preventDefault();
+            const message = "🌱 Welcome to GrowBalbriggan's WhatsApp group! \n\nJoin here: https://chat.whatsapp.com/example \n\nRules: Be kind, share photos, ask questions!";
+            if (navigator.share) {
+                navigator.share({
+                    title: 'Join GrowBalbriggan',
+                    text: message
+                });
+            } else {
+                prompt("Copy this link to join our WhatsApp group:", "https://chat.whatsapp.com/example");
+            }
+        });
+    }
+});
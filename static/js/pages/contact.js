@@ -0,0 +1,155 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // WhatsApp Join Functionality
+    const whatsappLinks = document.querySelectorAll('#whatsapp-join, #join-whatsapp-btn');
+    whatsappLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            e.preventDefault();
+
+            // WhatsApp group link (replace with actual link)
+            const whatsappLink = "https://chat.whatsapp.com/your-actual-group-link";
+            const message = "🌱 Welcome to GrowBalbriggan's WhatsApp community!\n\nJoin here: " + whatsappLink + "\n\nRules: Be kind, share photos, ask questions!";
+
+            if (navigator.share) {
+                navigator.share({
+                    title: 'Join GrowBalbriggan WhatsApp',
+                    text: message
+                });
+            } else {
+                // Copy to clipboard
+                navigator.clipboard.writeText(whatsappLink).then(() => {
+                    alert('📱 WhatsApp link copied! Paste it in your browser to join our community of 300+ Balbriggan gardeners!');
+                });
+            }
+        });
+    });
+
+    // Contact Form Submission
+    const contactForm = document.getElementById('garden-contact-form');
+    if (contactForm) {
+        contactForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+
+            // Get form values
+            const name = document.getElementById('name').value.trim();
+            const email = document.getElementById('email').value.trim();
+            const subject = document.getElementById('subject').value;
+            const message = document.getElementById('message').value.trim();
+
+            // Simple validation
+            if (!name || !email || !subject || !message) {
+                showNotification('Please fill in all required fields! 🌱', 'error');
+                return;
+            }
+
+            // In a real app, you would send this to your backend
+            // For now, simulate success
+            showNotification(`🎉 Thanks ${name}! We'll get back to you within 24 hours! Check your email at ${email}`, 'success');
+
+            // Reset form
+            contactForm.reset();
+
+            // Scroll to top
+            window.scrollTo({
+                top: 0,
+                behavior: 'smooth'
+            });
+        });
+    }
+
+    // Notification function
+    function showNotification(message, type) {
+        const notification = document.createElement('div');
+        notification.style.cssText = `
+            position: fixed;
+            top: 20px;
+            right: 20px;
+            padding: 1rem 2rem;
+            border-radius: var(--border-radius);
+            color: white;
+            font-weight: 600;
+            z-index: 10000;
+            animation: slideIn 0.3s ease, fadeOut 0.3s ease 4.7s forwards;
+            box-shadow: var(--shadow-heavy);
+        `;
+
+        if (type === 'success') {
+            notification.style.background = 'var(--primary-green)';
+        } else {
+            notification.style.background = 'var(--sunny-yellow)';
+            notification.style.color = 'var(--text-dark)';
+        }
+
+        notification.textContent = message;
+        document.body.appendChild(notification);
+
+        setTimeout(() => {
+            if (notification.parentNode) {
+                notification.parentNode.removeChild(notification);
+            }
+        }, 5000);
+    }
+
+    // Back to Top functionality
+    const backToTopBtn = document.getElementById("back-to-top");
+    if (backToTopBtn) {
+        backToTopBtn.addEventListener("click", () => {
+            window.scrollTo({ top: 0, behavior: "smooth" });
+        });
+
+        window.addEventListener("scroll", () => {
+            backToTopBtn.style.display = window.scrollY > 300 ? "block" : "none";
+        });
+
+        backToTopBtn.style.display = window.scrollY > 300 ? "block" : "none";
+    }
+
+    // FAQ smooth opening
+    const faqItems = document.querySelectorAll('.faq-item');
+    faqItems.forEach(item => {
+        const summary = item.querySelector('summary');
+        summary.addEventListener('click', function() {
+            const isOpening = !item.open;
+            if (isOpening) {
+                item.style.maxHeight = item.scrollHeight + 'px';
+            }
+        });
+    });
+
+    // Add animation styles
+    const style = document.createElement('style');
+    style.textContent = `
+        @keyframes slideIn {
+            from {
+                transform: translateX(100%);
+                opacity: 0;
+            }
+            to {
+                transform: translateX(0);
+                opacity: 1;
+            }
+        }
+
+        @keyframes fadeOut {
+            to {
+                opacity: 0;
+                transform: translateX(100%);
+            }
+        }
+
+        .faq-item {
+            transition: max-height 0.3s ease;
+            max-height: 1000px;
+        }
+    `;
+    document.head.appendChild(style);
+
+    // Email copy functionality
+    const emailLinks = document.querySelectorAll('a[href^="mailto:"]');
+    emailLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            // Allow default mailto behavior
+            // Optional: Add analytics tracking
+            console.log('Email link clicked:', this.href);
+        });
+    });
+});
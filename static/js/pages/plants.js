@@ -0,0 +1,42 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Filtering happens on the server: the filter buttons are plain links
+    const plantCards = document.querySelectorAll('.plant-card');
+
+    // Plant card animations
+    const observer = new IntersectionObserver((entries) => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                entry.target.style.animation = 'fadeIn 0.5s ease forwards';
+            }
+        });
+    }, { threshold: 0.1 });
+
+    plantCards.forEach(card => {
+        observer.observe(card);
+    });
+
+    // Add CSS for animations
+    const style = document.createElement('style');
+    style.textContent = `
+        @keyframes fadeIn {
+            from {
+                opacity: 0;
+                transform: translateY(20px);
+            }
+            to {
+                opacity: 1;
+                transform: translateY(0);
+            }
+        }
+
+        @keyframes float {
+            0%, 100% { transform: translateY(0); }
+            50% { transform: translateY(-10px); }
+        }
+
+        .plant-card {
+            opacity: 0;
+        }
+    `;
+    document.head.appendChild(style);
+});
@@ -0,0 +1,61 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Rules agreement button
+    const agreeBtn = document.getElementById('agree-btn');
+    if (agreeBtn) {
+        agreeBtn.addEventListener('click', function() {
+            // Store agreement in localStorage
+            localStorage.setItem('growbalbriggan_rules_agreed', 'true');
+
+            // Show confirmation
+            alert('✅ Thank you for agreeing to our community rules!\n\nYou\'re now ready to fully participate in our gardening community.');
+
+            // Redirect to community page
+            window.location.href = (document.body.dataset.root || '') + '/community';
+        });
+    }
+
+    // Check if user has already agreed
+    if (localStorage.getItem('growbalbriggan_rules_agreed')) {
+        const pledgeActions = document.querySelector('.pledge-actions');
+        if (pledgeActions) {
+            const checkmark = document.createElement('div');
+            checkmark.innerHTML = '<div class="agreed-check">✅ You\'ve already agreed to these rules!</div>';
+            checkmark.style.cssText = `
+                margin-top: 1rem;
+                padding: 1rem;
+                background: rgba(255, 255, 255, 0.2);
+                border-radius: var(--border-radius);
+                font-weight: 600;
+            `;
+            pledgeActions.parentNode.insertBefore(checkmark, pledgeActions.nextSibling);
+        }
+    }
+
+    // Add animations
+    const style = document.createElement('style');
+    style.textContent = `
+        @keyframes float {
+            0%, 100% { transform: translateY(0); }
+            50% { transform: translateY(-10px); }
+        }
+
+        .golden-card, .rules-category, .enforcement-step {
+            animation: fadeIn 0.5s ease;
+        }
+
+        @keyframes fadeIn {
+            from { opacity: 0; transform: translateY(20px); }
+            to { opacity: 1; transform: translateY(0); }
+        }
+
+        .agreed-check {
+            animation: pulse 2s infinite;
+        }
+
+        @keyframes pulse {
+            0%, 100% { opacity: 1; }
+            50% { opacity: 0.7; }
+        }
+    `;
+    document.head.appendChild(style);
+});
@@ -0,0 +1,103 @@
+// Seasonal tab functionality
+document.addEventListener('DOMContentLoaded', function() {
+    const seasonTabs = document.querySelectorAll('.season-tab');
+    const seasonContents = document.querySelectorAll('.season-content');
+
+    seasonTabs.forEach(tab => {
+        tab.addEventListener('click', function() {
+            const season = this.dataset.season;
+
+            // Update active tab
+            seasonTabs.forEach(t => t.classList.remove('active'));
+            this.classList.add('active');
+
+            // Show corresponding content
+            seasonContents.forEach(content => {
+                content.classList.remove('active');
+                if (content.id === `${season}-content`) {
+                    content.classList.add('active');
+                }
+            });
+        });
+    });
+
+    // Set current season based on month
+    function setCurrentSeason() {
+        const month = new Date().getMonth();
+        let season, description;
+
+        if (month >= 2 && month <= 4) { // Mar-May
+            season = 'Spring';
+            description = 'Time for planting and preparing beds';
+        } else if (month >= 5 && month <= 7) { // Jun-Aug
+            season = 'Summer';
+            description = 'Harvest and maintenance season';
+        } else if (month >= 8 && month <= 10) { // Sep-Nov
+            season = 'Autumn';
+            description = 'Harvest and prepare for winter';
+        } else { // Dec-Feb
+            season = 'Winter';
+            description = 'Planning and protecting plants';
+        }
+
+        document.getElementById('current-season').textContent = season;
+        document.getElementById('season-description').textContent = description;
+
+        // Activate corresponding tab
+        seasonTabs.forEach(tab => {
+            tab.classList.remove('active');
+            if (tab.dataset.season === season.toLowerCase()) {
+                tab.classList.add('active');
+            }
+        });
+
+        seasonContents.forEach(content => {
+            content.classList.remove('active');
+            if (content.id === `${season.toLowerCase()}-content`) {
+                content.classList.add('active');
+            }
+        });
+    }
+
+    setCurrentSeason();
+
+    // Add more seasonal data
+    const seasonalData = {
+        spring: {
+            festivals: ["Balbriggan Food Festival", "May Day Plant Swap"],
+            specialNotes: "Watch for late frosts in April"
+        },
+        summer: {
+            festivals: ["Balbriggan Agricultural Show", "Garden Open Days"],
+            specialNotes: "Water in early morning to prevent mildew"
+        },
+        autumn: {
+            festivals: ["Pumpkin Festival", "Harvest Festival"],
+            specialNotes: "Excellent time for planting trees and shrubs"
+        },
+        winter: {
+            festivals: ["Christmas Market", "Seed Swap Sunday"],
+            specialNotes: "Protect plants from Atlantic storms"
+        }
+    };
+
+    // Add festival highlights to each season
+    Object.keys(seasonalData).forEach(season => {
+        const content = document.getElementById(`${season}-content`);
+        if (content) {
+            const festivals = seasonalData[season].festivals;
+            const festivalHtml = `
+                <div class="festival-highlight">
+                    <i class="fas fa-calendar-star"></i>
+                    <strong>Local Events:</strong> ${festivals.join(", ")}
+                </div>
+            `;
+
+            // Insert after seasonal-calendar if it exists
+            const calendar = content.querySelector('.seasonal-calendar');
+            if (calendar) {
+                calendar.insertAdjacentHTML('afterend', festivalHtml);
+            }
+        }
+    });
+});
@@ -0,0 +1,116 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Video filtering
+    const filterBtns = document.querySelectorAll('.filter-btn');
+    const videoCards = document.querySelectorAll('.video-card');
+
+    filterBtns.forEach(btn => {
+        btn.addEventListener('click', function() {
+            const filter = this.dataset.filter;
+
+            // Update active button
+            filterBtns.forEach(b => b.classList.remove('active'));
+            this.classList.add('active');
+
+            // Filter videos
+            videoCards.forEach(card => {
+                if (filter === 'all' || card.dataset.difficulty === filter || 
+                    (filter === 'seeding' && card.dataset.tags.includes('seeding')) ||
+                    (filter === 'repotting' && card.dataset.tags.includes('repotting')) ||
+                    (filter === 'cutting' && card.dataset.tags.includes('cutting'))) {
+                    card.style.display = 'flex';
+                } else {
+                    card.style.display = 'none';
+                }
+            });
+
+            // Show message if no videos
+            const visibleVideos = document.querySelectorAll('.video-card[style="display: flex;"]');
+            const noResults = document.querySelector('.no-results-message');
+
+            if (visibleVideos.length === 0) {
+                if (!noResults) {
+                    const message = document.createElement('div');
+                    message.className = 'no-results-message';
+                    message.innerHTML = '🌱 No videos found for this filter. Check back soon!';
+                    document.querySelector('.videos-grid').after(message);
+                }
+            } else if (noResults) {
+                noResults.remove();
+            }
+        });
+    });
+
+    // Reminder buttons
+    const reminderBtns = document.querySelectorAll('#reminder-btn, .reminder-btn');
+    reminderBtns.forEach(btn => {
+        btn.addEventListener('click', function(e) {
+            e.preventDefault();
+            const date = this.dataset.date || 'weekly';
+
+            if (navigator.share) {
+                // Use Web Share API if available
+                navigator.share({
+                    title: 'GrowBalbriggan Class Reminder',
+                    text: `Reminder for ${date} gardening class!`,
+                    url: window.location.href
+                }).catch(() => {
+                    alert(`✅ Reminder set for ${date} gardening class!\n\nWe'll remind you before the class starts.`);
+                });
+            } else {
+                // Fallback to prompt
+                alert(`✅ Reminder set for ${date} gardening class!\n\nWe'll remind you before the class starts.`);
+            }
+        });
+    });
+
+    // YouTube subscribe tracking
+    const ytButtons = document.querySelectorAll('a[href*="youtube.com"]');
+    ytButtons.forEach(btn => {
+        btn.addEventListener('click', function(e) {
+            console.log('YouTube link clicked:', this.href);
+            // Add analytics tracking here
+        });
+    });
+
+    // Smooth scroll for video cards
+    videoCards.forEach(card => {
+        card.addEventListener('click', function(e) {
+            if (!e.target.closest('a') && !e.target.closest('button')) {
+                const ytLink = this.querySelector('a[href*="youtube.com"]');
+                if (ytLink) {
+                    ytLink.click();
+                }
+            }
+        });
+    });
+
+    // Watch Here button scroll
+    const watchHereBtn = document.querySelector('.watch-here-btn');
+    if (watchHereBtn) {
+        watchHereBtn.addEventListener('click', function(e) {
+            e.preventDefault();
+            const videoPlayer = document.querySelector('.video-player');
+            if (videoPlayer) {
+                videoPlayer.scrollIntoView({ 
+                    behavior: 'smooth',
+                    block: 'center'
+                });
+
+                // Highlight the video
+                videoPlayer.style.boxShadow = '0 0 0 3px var(--primary-green)';
+                setTimeout(() => {
+                    videoPlayer.style.boxShadow = '';
+                }, 2000);
+            }
+        });
+    }
+
+    // Set active filter based on URL hash
+    if (window.location.hash) {
+        const hash = window.location.hash.substring(1);
+        const filterBtn = document.querySelector(`.filter-btn[data-filter="${hash}"]`);
+        if (filterBtn) {
+            filterBtn.click();
+        }
+    }
+});
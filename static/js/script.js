@@ -155,25 +155,145 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
-// API Functions
-async function fetchGardeningTips() {
+// Path prefix of the town being browsed ('' on the main site); see base.html.
+// (var, not const: some pages load this file twice.)
+var SITE_ROOT = document.body.dataset.root || '';
+
+// Local copy of the API datasets, kept current with /api/changes
+var CONTENT_STORE_KEY = 'growbalbriggan-content' + SITE_ROOT;
+var contentSync = null;
+
+function emptyContent() {
+    return { log: null, version: 0, datasets: {} };
+}
+
+function loadLocalContent() {
     try {
-        const response = await fetch('/api/tips');
-        const tips = await response.json();
-        return tips;
+        return JSON.parse(localStorage.getItem(CONTENT_STORE_KEY)) || emptyContent();
     } catch (error) {
-        console.error('Error fetching tips:', error);
-        return [];
+        return emptyContent();
     }
 }
 
+// Fetch what changed since the last sync (once per page load) and apply it
+function syncContent() {
+    if (!contentSync) {
+        contentSync = (async () => {
+            let local = loadLocalContent();
+            try {
+                const params = new URLSearchParams({ since: local.version });
+                if (local.log) params.set('log', local.log);
+                const response = await fetch(`${SITE_ROOT}/api/changes?${params}`);
+                if (!response.ok) return local;
+                const delta = await response.json();
+                if (delta.reset) local = emptyContent();
+                Object.entries(delta.changes).forEach(([name, change]) => {
+                    const records = local.datasets[name] || {};
+                    change.added.concat(change.updated).forEach(record => {
+                        records[record.id] = record;
+                    });
+                    change.deleted.forEach(id => {
+                        delete records[id];
+                    });
+                    local.datasets[name] = records;
+                });
+                local.log = delta.log;
+                local.version = delta.version;
+                try {
+                    localStorage.setItem(CONTENT_STORE_KEY, JSON.stringify(local));
+                } catch (error) {
+                    // Storage full or disabled: the copy lasts for this page only
+                }
+            } catch (error) {
+                // Offline: carry on with the local copy
+            }
+            return local;
+        })();
+    }
+    return contentSync;
+}
+
+// API Functions
+async function fetchGardeningTips() {
+    const local = await syncContent();
+    return Object.values(local.datasets.tips || {});
+}
+
 async function fetchSeasonalTips(season) {
+    const tips = await fetchGardeningTips();
+    return tips.filter(tip => (tip.season || '').toLowerCase() === season.toLowerCase());
+}
+
+// Offline support: the service worker caches the site shell and pages
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', function() {
+        navigator.serviceWorker.register(`${SITE_ROOT}/sw.js`).catch(error => {
+            console.error('Service worker registration failed:', error);
+        });
+    });
+}
+
+// Search-as-you-type for the navigation search box
+document.addEventListener('DOMContentLoaded', function() {
+    const searchForm = document.querySelector('.nav-search');
+    if (!searchForm) return;
+    
+    const input = searchForm.querySelector('input[name="q"]');
+    const suggestions = searchForm.querySelector('.search-suggestions');
+    let timer = null;
+    let lastQuery = '';
+    
+    function hideSuggestions() {
+        suggestions.hidden = true;
+        suggestions.innerHTML = '';
+    }
+    
+    function showSuggestions(results) {
+        suggestions.innerHTML = '';
+        results.forEach(result => {
+            const link = document.createElement('a');
+            link.href = result.url;
+            if (result.type === 'videos') link.target = '_blank';
+            const emoji = document.createElement('span');
+            emoji.textContent = result.emoji || (result.type === 'videos' ? '🎥' : '🌱');
+            const title = document.createElement('span');
+            title.textContent = result.title;
+            link.append(emoji, title);
+            suggestions.appendChild(link);
+        });
+        suggestions.hidden = results.length === 0;
+    }
+    
+    input.addEventListener('input', function() {
+        const query = this.value.trim();
+        clearTimeout(timer);
+        if (query.length < 2) {
+            hideSuggestions();
+            return;
+        }
+        timer = setTimeout(async () => {
+            lastQuery = query;
+            const results = await searchContent(query, 6);
+            if (query === lastQuery) showSuggestions(results);
+        }, 120);
+    });
+    
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') hideSuggestions();
+    });
+    
+    document.addEventListener('click', function(e) {
+        if (!searchForm.contains(e.target)) hideSuggestions();
+    });
+});
+
+async function searchContent(query, limit = 10) {
     try {
-        const response = await fetch(`/api/tips/${season}`);
-        const tips = await response.json();
-        return tips;
+        const response = await fetch(`${SITE_ROOT}/api/search?q=${encodeURIComponent(query)}&limit=${limit}`);
+        const data = await response.json();
+        return data.results || [];
     } catch (error) {
-        console.error('Error fetching seasonal tips:', error);
+        console.error('Error searching:', error);
         return [];
     }
 }
@@ -0,0 +1,379 @@
+"""Durable store for contact messages and newsletter sign-ups.
+
+Request handlers only put the submission on an in-process queue; a
+background thread writes whatever has queued up in one transaction to an
+append-only SQLite table. The database runs in WAL mode with
+synchronous=NORMAL, so commits don't fsync each time; a WAL checkpoint
+every SYNC_INTERVAL seconds does that instead.
+
+A Deliverer thread in the web process itself (started by gunicorn's
+post_worker_init hook) reads undelivered submissions, hands them to a
+mailer and records the outcome in the deliveries table, retrying failures
+with backoff and sending at most one mail per dedup key (one welcome per
+subscriber). It has to run beside the web workers: on Heroku every dyno
+has its own filesystem, so a separate worker dyno would never see this
+database. Each gunicorn worker starts one, and an flock on
+<database>.lock lets only one deliver at a time; if that worker dies,
+another takes over within POLL_INTERVAL. `python worker.py` runs the same
+loop by hand, e.g. with the development server.
+
+Under gevent both threads are greenlets, so their SQLite calls go through
+offload() to gevent's pool of native threads instead of blocking the worker.
+"""
+import atexit
+import fcntl
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from content import BASE_DIR, green_threads
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('SUBMISSIONS_DB') or os.path.join(BASE_DIR, 'var', 'submissions.db')
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+# Seconds between WAL checkpoints (the periodic fsync)
+SYNC_INTERVAL = float(os.environ.get('SUBMISSIONS_SYNC_INTERVAL', '1'))
+
+MAX_ATTEMPTS = 5
+# Seconds between delivery passes when nothing is due, and between tries
+# to become the delivering process
+POLL_INTERVAL = 2
+# Upper bound, in seconds, of the pause after a failed pass (doubled each time)
+MAX_BACKOFF = 60
+RETRY_BASE = 30  # seconds; doubled after each failed attempt
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT,
+    message TEXT,
+    dedup_key TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    submission_id INTEGER PRIMARY KEY REFERENCES submissions (id),
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_retry ON deliveries (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS submissions_dedup ON submissions (dedup_key);
+'''
+
+
+def connect(path=DB_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(SCHEMA)
+    return db
+
+
+def offload(function, *args):
+    """Call `function` on a native thread under gevent, so its blocking I/O
+    doesn't hold up every other greenlet; a plain call otherwise"""
+    if green_threads():
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args)
+    return function(*args)
+
+
+def dedup_key(kind, email, message=None):
+    """Subscribers get one welcome mail; contacts one reply per distinct message"""
+    email = email.strip().lower()
+    if kind == 'contact':
+        digest = hashlib.blake2b((message or '').strip().encode('utf-8'), digest_size=8).hexdigest()
+        return f'contact:{email}:{digest}'
+    return f'{kind}:{email}'
+
+
+def insert(db, rows):
+    with db:
+        db.execute('BEGIN')
+        db.executemany(
+            'INSERT INTO submissions (kind, email, name, message, dedup_key, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+
+class SubmissionQueue:
+    """In-process queue plus the background thread that persists it
+
+    The thread is started on first use in each process, so a queue created
+    before gunicorn forks works in every worker.
+    """
+
+    def __init__(self, path=DB_PATH, batch_size=BATCH_SIZE, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stats = {}
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(QUEUE_SIZE)
+            self._stats = {
+                "enqueued": 0,
+                "written": 0,
+                "batches": 0,
+                "overflow": 0,
+                "last_batch_size": 0,
+                "last_flush_ms": 0.0,
+                "max_flush_ms": 0.0,
+                "total_flush_ms": 0.0,
+                "errors": 0,
+            }
+            self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def enqueue(self, kind, email, name=None, message=None):
+        """Queue a submission for writing; returns immediately"""
+        if self._pid != os.getpid():
+            self._start()
+        row = (kind, email.strip(), name, message, dedup_key(kind, email, message), time.time())
+        with self._lock:
+            self._stats['enqueued'] += 1
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Better a slow request than a lost submission
+            with self._lock:
+                self._stats['overflow'] += 1
+            db = offload(connect, self.path)
+            try:
+                offload(insert, db, [row])
+            finally:
+                db.close()
+
+    def _run(self):
+        db = offload(connect, self.path)
+        synced_at = time.monotonic()
+        batch = []
+        stop = False
+        while not stop:
+            # Rows from a failed flush stay at the front of the next batch
+            if not batch:
+                try:
+                    batch.append(self._queue.get(timeout=self.sync_interval))
+                except queue.Empty:
+                    pass
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:  # close() sentinel
+                stop = True
+                batch = [row for row in batch if row is not None]
+            if batch and self._flush(db, batch):
+                batch = []
+            elif batch and not stop:
+                time.sleep(self.sync_interval)
+            if stop or time.monotonic() - synced_at >= self.sync_interval:
+                offload(db.execute, 'PRAGMA wal_checkpoint(PASSIVE)')
+                synced_at = time.monotonic()
+        db.close()
+
+    def _flush(self, db, batch):
+        started = time.perf_counter()
+        try:
+            offload(insert, db, batch)
+        except sqlite3.Error:
+            self._stats['errors'] += 1
+            return False
+        elapsed = (time.perf_counter() - started) * 1000
+        stats = self._stats
+        stats['written'] += len(batch)
+        stats['batches'] += 1
+        stats['last_batch_size'] = len(batch)
+        stats['last_flush_ms'] = round(elapsed, 3)
+        stats['max_flush_ms'] = round(max(stats['max_flush_ms'], elapsed), 3)
+        stats['total_flush_ms'] += elapsed
+        return True
+
+    def close(self, timeout=5):
+        """Write out whatever is still queued and stop the writer thread"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        if self._pid != os.getpid():
+            return {"depth": 0, "running": False}
+        stats = dict(self._stats)
+        total = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total / stats['batches'], 3) if stats['batches'] else 0.0
+        stats['depth'] = self._queue.qsize()
+        stats['running'] = self._thread.is_alive()
+        return stats
+
+
+class LogMailer:
+    """Outbound mail stand-in: prints what would be sent"""
+
+    def send(self, submission):
+        if submission['kind'] == 'subscribe':
+            subject = 'Welcome to GrowBalbriggan!'
+        else:
+            subject = f"Thanks for getting in touch, {submission['name'] or 'gardener'}"
+        print(f"📧 To: {submission['email']} | {subject}", flush=True)
+
+
+def pending(db, limit=100, now=None):
+    """Submissions due a delivery attempt, oldest first"""
+    now = time.time() if now is None else now
+    db.row_factory = sqlite3.Row
+    return db.execute(
+        'SELECT s.*, COALESCE(d.attempts, 0) AS attempts FROM submissions s '
+        'LEFT JOIN deliveries d ON d.submission_id = s.id '
+        "WHERE d.submission_id IS NULL OR (d.status = 'retry' AND d.next_attempt_at <= ?) "
+        'ORDER BY s.id LIMIT ?', (now, limit)).fetchall()
+
+
+def already_sent(db, key):
+    return db.execute(
+        'SELECT 1 FROM submissions s JOIN deliveries d ON d.submission_id = s.id '
+        "WHERE s.dedup_key = ? AND d.status = 'sent' LIMIT 1", (key,)).fetchone() is not None
+
+
+def record(db, submission_id, status, attempts, next_attempt_at=0, error=None):
+    db.execute(
+        'INSERT OR REPLACE INTO deliveries (submission_id, status, attempts, next_attempt_at, last_error, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)', (submission_id, status, attempts, next_attempt_at, error, time.time()))
+
+
+def deliver(db, mailer, limit=100):
+    """One pass over due submissions; returns {status: count}"""
+    outcome = {}
+    for submission in pending(db, limit):
+        attempts = submission['attempts']
+        if already_sent(db, submission['dedup_key']):
+            status = 'duplicate'
+            record(db, submission['id'], status, attempts)
+        else:
+            try:
+                mailer.send(submission)
+            except Exception as e:
+                attempts += 1
+                status = 'retry' if attempts < MAX_ATTEMPTS else 'failed'
+                retry_at = time.time() + RETRY_BASE * 2 ** (attempts - 1)
+                record(db, submission['id'], status, attempts, retry_at, str(e))
+            else:
+                status = 'sent'
+                record(db, submission['id'], status, attempts + 1)
+        outcome[status] = outcome.get(status, 0) + 1
+    return outcome
+
+
+def backlog(db):
+    """Counts of submissions by delivery status ('pending' = never attempted)"""
+    rows = db.execute(
+        "SELECT COALESCE(d.status, 'pending'), COUNT(*) FROM submissions s "
+        'LEFT JOIN deliveries d ON d.submission_id = s.id GROUP BY 1').fetchall()
+    return dict(rows)
+
+
+class Deliverer:
+    """Delivery loop for one process at a time, on a background thread"""
+
+    def __init__(self, path=DB_PATH, mailer=None, poll_interval=POLL_INTERVAL):
+        self.path = path
+        self.mailer = mailer or LogMailer()
+        self.poll_interval = poll_interval
+        self.delivering = False
+        self.outcome = {}
+        self.errors = 0
+        self._pid = None
+        self._thread = None
+
+    def start(self):
+        """Start the thread in this process, unless it's already running"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.delivering = False
+        self._thread = threading.Thread(target=self.run, name='submission-delivery', daemon=True)
+        self._thread.start()
+
+    def acquire(self):
+        """The open, locked lock file, or None if another process holds it"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def run(self, once=False, report=None):
+        """Deliver until the process exits; with once=True, one pass (False if locked out)
+
+        The lock is held, by keeping its descriptor open, until the loop
+        ends. A failed pass (the database locked for too long, say) is logged
+        and retried after a pause that doubles up to MAX_BACKOFF; with
+        once=True the error is raised instead.
+        """
+        fd = self.acquire()
+        while fd is None:
+            if once:
+                return False
+            time.sleep(self.poll_interval)
+            fd = self.acquire()
+        self.delivering = True
+        db = None
+        failures = 0
+        try:
+            while True:
+                try:
+                    if db is None:
+                        db = offload(connect, self.path)
+                    outcome = offload(deliver, db, self.mailer)
+                except Exception:
+                    if once:
+                        raise
+                    self.errors += 1
+                    failures += 1
+                    pause = min(self.poll_interval * 2 ** failures, MAX_BACKOFF)
+                    logger.exception('submission delivery failed, retrying in %gs', pause)
+                    time.sleep(pause)
+                    continue
+                failures = 0
+                for status, count in outcome.items():
+                    self.outcome[status] = self.outcome.get(status, 0) + count
+                if outcome and report is not None:
+                    report(outcome)
+                if once:
+                    return True
+                # Keep draining without pausing while there is a backlog
+                if sum(outcome.values()) == 0:
+                    time.sleep(self.poll_interval)
+        finally:
+            self.delivering = False
+            if db is not None:
+                db.close()
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def stats(self):
+        running = self._pid == os.getpid() and self._thread.is_alive()
+        return {"running": running, "delivering": self.delivering, "errors": self.errors, **self.outcome}
@@ -0,0 +1,126 @@
+// GrowBalbriggan service worker, generated by the app (see /sw.js in app.py)
+const VERSION = {{ version|tojson }};
+// Path prefix of the town this worker serves ('' on the main site); towns
+// on one origin share its cache storage, so their cache names carry it too
+const ROOT = {{ root|tojson }};
+const CACHE_PREFIX = ROOT ? `${ROOT.slice(1)}/` : '';
+const SHELL_CACHE = `${CACHE_PREFIX}shell-${VERSION}`;
+// Pages link the shell by fingerprint, so both are replaced together
+const PAGE_CACHE = `${CACHE_PREFIX}pages-${VERSION}`;
+// Fingerprinted CSS/JS and images, fetched on install
+const PRECACHE = {{ precache|tojson }};
+const PAGES = {{ pages|tojson }};
+// /api/changes is the delta feed; script.js keeps its own copy of the data
+const NETWORK_ONLY = [`${ROOT}/api/changes`];
+
+const OFFLINE_PAGE = `<!DOCTYPE html><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Offline - GrowBalbriggan</title>
+<body style="font-family: sans-serif; text-align: center; padding: 3rem 1rem; color: #1b5e20">
+<h1>🌱 You're offline</h1><p>This page hasn't been saved for offline use yet. Try again when you have signal.</p>
+<p><a href="${ROOT}/">Back to the home page</a></p></body>`;
+
+// Set after a form post, so the page it redirects to (with its flashed
+// message) comes from the network rather than the cache
+let postedAt = 0;
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const shell = await caches.open(SHELL_CACHE);
+        await shell.addAll(PRECACHE);
+        const pages = await caches.open(PAGE_CACHE);
+        await Promise.all(PAGES.map(async url => {
+            try {
+                const response = await fetch(url);
+                if (cacheable(response)) await pages.put(url, response);
+            } catch (error) {
+                // Pages are cached again as they are visited
+            }
+        }));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => ownCache(name) && name !== SHELL_CACHE && name !== PAGE_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+function ownCache(name) {
+    return CACHE_PREFIX ? name.startsWith(CACHE_PREFIX) : !name.includes('/');
+}
+
+// Pages rendered with a flashed message carry no ETag; never keep those
+function cacheable(response) {
+    return response.ok && response.type === 'basic' && response.headers.has('ETag');
+}
+
+async function fromShell(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const shell = await caches.open(SHELL_CACHE);
+        shell.put(request, response.clone());
+    }
+    return response;
+}
+
+// Answer from the cache straight away and refresh it in the background
+async function staleWhileRevalidate(event) {
+    const pages = await caches.open(PAGE_CACHE);
+    const cached = await caches.match(event.request, { ignoreVary: true });
+    const network = fetch(event.request).then(response => {
+        if (cacheable(response)) pages.put(event.request, response.clone());
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(network.catch(() => null));
+        return cached;
+    }
+    try {
+        return await network;
+    } catch (error) {
+        if (event.request.mode === 'navigate') {
+            return new Response(OFFLINE_PAGE, { headers: { 'Content-Type': 'text/html; charset=utf-8' } });
+        }
+        throw error;
+    }
+}
+
+async function networkFirst(request) {
+    const pages = await caches.open(PAGE_CACHE);
+    try {
+        const response = await fetch(request);
+        if (cacheable(response)) pages.put(request, response.clone());
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request, { ignoreVary: true });
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+    if (request.method !== 'GET') {
+        postedAt = Date.now();
+        return;
+    }
+    if (NETWORK_ONLY.includes(url.pathname)) return;
+
+    // Fingerprinted files never change under the same name
+    if (url.pathname.startsWith(`${ROOT}/static/dist/`)) {
+        event.respondWith(fromShell(request));
+    } else if (Date.now() - postedAt < 10000 || url.pathname.startsWith(`${ROOT}/api/`) || url.search) {
+        event.respondWith(networkFirst(request));
+    } else {
+        event.respondWith(staleWhileRevalidate(event));
+    }
+});
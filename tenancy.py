@@ -0,0 +1,317 @@
+"""Several towns served from one deployment.
+
+Balbriggan is the default tenant, served from data/ with BALBRIGGAN_INFO.
+Every other town has a folder under towns/ (TOWNS_DIR):
+
+    towns/skerries/town.json     town info, plus "hosts" it is served on
+    towns/skerries/data/*.json   its data files (compiled/ beside them)
+
+A request belongs to the town listing its Host header, or, for URLs under
+/<slug>/, to that town: TenantMiddleware moves the prefix into SCRIPT_NAME,
+so routes match as usual and url_for() links stay inside the town (a slug
+that is also the first segment of a route only works by host). Anything
+else is the default tenant. Towns are read once, at startup.
+
+Each tenant gets its own ContentStore, so its indexes, search segments and
+calendars are built from its own files. `TenantContent` stands in for the
+store everywhere (HTTPCache, RenderCache, SearchIndex, ...) and forwards to
+the current tenant's. Shared LRUCaches created with `scope=current_slug`
+keep each tenant's entries apart and count them per tenant.
+
+Loaded tenants are kept in LRU order. When the estimated memory of all of
+them (content plus cache entries) exceeds TENANT_MEMORY_BUDGET_MB, the
+least recently used tenants without a request in flight are unloaded until
+it fits; they load again on their next request.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, request
+
+from content import BASE_DIR, COMPILED_DIR, DATA_DIR, ContentStore
+from metrics import LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+TOWNS_DIR = os.environ.get('TOWNS_DIR') or os.path.join(BASE_DIR, 'towns')
+TOWN_FILE = 'town.json'
+MEMORY_BUDGET = int(float(os.environ.get('TENANT_MEMORY_BUDGET_MB', '512')) * 1024 * 1024)
+# Seconds between budget checks; loading a tenant always triggers one
+ENFORCE_INTERVAL = 1.0
+
+DEFAULT = 'balbriggan'
+ENVIRON_KEY = 'growbalbriggan.tenant'
+
+
+def current_slug():
+    """Slug of the tenant the current request belongs to"""
+    if has_request_context():
+        return request.environ.get(ENVIRON_KEY, DEFAULT)
+    return DEFAULT
+
+
+class Tenant:
+    """One town: where its data lives, its info and its request stats"""
+
+    def __init__(self, slug, info, data_dir, compiled_dir, hosts=()):
+        self.slug = slug
+        self.info = info
+        self.data_dir = data_dir
+        self.compiled_dir = compiled_dir
+        self.hosts = tuple(hosts)
+        self.store = None
+        # Requests in flight; a tenant is only unloaded when idle
+        self.active = 0
+        self.loads = 0
+        self.evictions = 0
+        self.requests = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, elapsed):
+        self.requests += 1
+        self.seconds += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        self.latency[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def percentile(self, fraction):
+        """Upper bucket bound holding the given share of requests, in ms
+
+        Capped at the slowest request seen, which a bucket bound can exceed.
+        """
+        wanted = self.requests * fraction
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency):
+            seen += count
+            if seen >= wanted:
+                return round(min(bound, self.slowest) * 1000, 3)
+        return round(self.slowest * 1000, 3)
+
+
+def read_towns(directory, default_info):
+    """Tenants for the towns/<slug>/town.json files under `directory`"""
+    try:
+        slugs = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    towns = []
+    for slug in slugs:
+        path = os.path.join(directory, slug, TOWN_FILE)
+        if slug == DEFAULT or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("skipping town %s: can't read %s: %s", slug, path, e)
+            continue
+        hosts = [host.split(':')[0].lower() for host in settings.pop('hosts', [])]
+        # Templates read the same keys for every town
+        info = {**dict.fromkeys(default_info, ''), "name": slug.replace('-', ' ').title(), **settings}
+        data_dir = os.path.join(directory, slug, 'data')
+        towns.append(Tenant(slug, info, data_dir, os.path.join(data_dir, 'compiled'), hosts))
+    return towns
+
+
+class TenantContent:
+    """A ContentStore look-alike that forwards to the current tenant's store
+
+    Datasets registered and derivations declared here apply to every
+    tenant's store, including the ones loaded later.
+    """
+
+    def __init__(self, registry):
+        self._registry = registry
+
+    def register(self, *args, **kwargs):
+        self._registry.declare('register', args, kwargs)
+
+    def derive(self, *args, **kwargs):
+        self._registry.declare('derive', args, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._registry.store(), name)
+
+
+class TenantRegistry:
+    def __init__(self, default_info, towns_dir=TOWNS_DIR, budget=MEMORY_BUDGET):
+        self.towns_dir = towns_dir
+        self.budget = budget
+        self.default = Tenant(DEFAULT, default_info, DATA_DIR, COMPILED_DIR)
+        self.tenants = {DEFAULT: self.default}
+        self.hosts = {}
+        for tenant in read_towns(towns_dir, default_info):
+            self.tenants[tenant.slug] = tenant
+            for host in tenant.hosts:
+                self.hosts[host] = tenant.slug
+        self.app = None
+        # First path segments of the app's routes, which can't be towns
+        self._reserved = None
+        self.declarations = []
+        self.caches = {}
+        self.loaded = OrderedDict()
+        self.evictions = 0
+        self.enforced_at = 0.0
+        self.content = TenantContent(self)
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.app = app
+        app.wsgi_app = TenantMiddleware(app.wsgi_app, self)
+        app.before_request(self.start)
+        app.teardown_request(self.finish)
+
+    def watch(self, name, cache):
+        """Count a scoped LRUCache's entries towards each tenant's memory"""
+        self.caches[name] = cache
+
+    def resolve(self, host, path):
+        """(slug, path prefix) for a request"""
+        slug = self.hosts.get(host.split(':')[0].lower())
+        if slug is not None:
+            return slug, ''
+        first = path.split('/')[1] if path.startswith('/') else ''
+        if first in self.tenants and first != DEFAULT and first not in self.reserved():
+            return first, '/' + first
+        return DEFAULT, ''
+
+    def reserved(self):
+        if self._reserved is None:
+            rules = self.app.url_map.iter_rules() if self.app is not None else ()
+            self._reserved = {rule.rule.split('/')[1] for rule in rules}
+        return self._reserved
+
+    def current(self):
+        return self.tenants[current_slug()]
+
+    def all(self):
+        return list(self.tenants.values())
+
+    def qualified(self, name):
+        """Dataset name unique across tenants, e.g. for the change log"""
+        slug = current_slug()
+        return name if slug == DEFAULT else f'{slug}/{name}'
+
+    # Content stores
+
+    def declare(self, method, args, kwargs):
+        with self._lock:
+            self.declarations.append((method, args, kwargs))
+            for slug in self.loaded:
+                getattr(self.tenants[slug].store, method)(*args, **kwargs)
+
+    def store(self, tenant=None):
+        """The ContentStore of `tenant` (the current one if None), loaded on demand"""
+        tenant = tenant or self.current()
+        store = tenant.store
+        if store is not None:
+            return store
+        with self._lock:
+            if tenant.store is None:
+                store = ContentStore(tenant.data_dir, compiled_dir=tenant.compiled_dir)
+                for method, args, kwargs in self.declarations:
+                    getattr(store, method)(*args, **kwargs)
+                tenant.store = store
+                tenant.loads += 1
+                self.loaded[tenant.slug] = True
+                # Check the budget once this request is done
+                self.enforced_at = 0.0
+            return tenant.store
+
+    def footprint(self, tenant):
+        """Rough bytes held for a tenant: its datasets and its cache entries"""
+        size = tenant.store.footprint() if tenant.store is not None else 0
+        return size + sum(cache.scope_bytes(tenant.slug) for cache in self.caches.values())
+
+    def enforce(self):
+        """Unload the least recently used idle tenants until all fit the budget"""
+        with self._lock:
+            self.enforced_at = time.monotonic()
+            sizes = {slug: self.footprint(self.tenants[slug]) for slug in self.loaded}
+            total = sum(sizes.values())
+            for slug in list(self.loaded):
+                if total <= self.budget:
+                    break
+                tenant = self.tenants[slug]
+                if tenant.active:
+                    continue
+                self.unload(tenant)
+                total -= sizes[slug]
+            return total
+
+    def unload(self, tenant):
+        with self._lock:
+            # Requests still holding the store finish with it; then it's freed
+            tenant.store = None
+            self.loaded.pop(tenant.slug, None)
+            for cache in self.caches.values():
+                cache.discard(tenant.slug)
+            tenant.evictions += 1
+            self.evictions += 1
+
+    # Request hooks
+
+    def start(self):
+        tenant = self.current()
+        request.environ['growbalbriggan.tenant_started'] = time.perf_counter()
+        with self._lock:
+            tenant.active += 1
+            if tenant.slug in self.loaded:
+                self.loaded.move_to_end(tenant.slug)
+
+    def finish(self, exc=None):
+        started = request.environ.pop('growbalbriggan.tenant_started', None)
+        if started is None:
+            return
+        tenant = self.current()
+        with self._lock:
+            tenant.active -= 1
+            tenant.observe(time.perf_counter() - started)
+        if time.monotonic() - self.enforced_at >= ENFORCE_INTERVAL:
+            self.enforce()
+
+    def stats(self):
+        tenants = {}
+        for slug, tenant in sorted(self.tenants.items()):
+            tenants[slug] = {
+                "hosts": list(tenant.hosts),
+                "loaded": tenant.store is not None,
+                "memory_bytes": self.footprint(tenant),
+                "loads": tenant.loads,
+                "evictions": tenant.evictions,
+                "requests": tenant.requests,
+                "latency_ms_avg": round(tenant.seconds * 1000 / tenant.requests, 3) if tenant.requests else 0.0,
+                "latency_ms_p95": tenant.percentile(0.95) if tenant.requests else 0.0,
+                "latency_ms_max": round(tenant.slowest * 1000, 3),
+                "caches": {name: cache.stats(slug) for name, cache in sorted(self.caches.items())},
+            }
+        return {
+            "budget_bytes": self.budget,
+            "used_bytes": sum(self.footprint(self.tenants[slug]) for slug in list(self.loaded)),
+            "loaded": len(self.loaded),
+            "evictions": self.evictions,
+            "tenants": tenants,
+        }
+
+
+class TenantMiddleware:
+    """WSGI middleware tagging each request with its tenant's slug"""
+
+    def __init__(self, wsgi_app, registry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        slug, prefix = self.registry.resolve(environ.get('HTTP_HOST', ''), path)
+        environ[ENVIRON_KEY] = slug
+        if prefix:
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+            environ['PATH_INFO'] = path[len(prefix):] or '/'
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,66 @@
+from flask import Flask, request
+
+from caching import RenderCache
+
+
+class Store:
+    def digest(self, *datasets):
+        return 'data'
+
+
+class Templates:
+    def current(self):
+        return 'templates'
+
+
+def make_app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    render_cache = RenderCache(app, Store(), Templates())
+    renders = []
+
+    @app.route('/search')
+    @render_cache.cached(query_args=('q',))
+    def search():
+        renders.append(request.full_path)
+        return f"results for {request.args.get('q', '')}"
+
+    @app.errorhandler(404)
+    @render_cache.cached(per_path=False)
+    def not_found(e):
+        renders.append(request.full_path)
+        return 'not found', 404
+
+    return app, render_cache, renders
+
+
+def test_declared_query_args_get_their_own_entries():
+    app, render_cache, renders = make_app()
+    client = app.test_client()
+
+    assert client.get('/search?q=tomato').data == b'results for tomato'
+    assert client.get('/search?q=potato').data == b'results for potato'
+    assert client.get('/search?q=tomato').data == b'results for tomato'
+    assert renders == ['/search?q=tomato', '/search?q=potato']
+
+
+def test_undeclared_query_args_share_an_entry():
+    app, render_cache, renders = make_app()
+    client = app.test_client()
+
+    for query in ('q=tomato', 'q=tomato&utm_source=mail', 'utm_source=mail&q=tomato'):
+        assert client.get(f'/search?{query}').data == b'results for tomato'
+    assert len(renders) == 1
+    assert render_cache.pages.stats()['entries'] == 1
+
+
+def test_not_found_page_is_cached_once():
+    app, render_cache, renders = make_app()
+    client = app.test_client()
+
+    for path in ('/nope', '/missing?page=2', '/nope/again'):
+        response = client.get(path)
+        assert response.status_code == 404
+        assert response.data == b'not found'
+    assert len(renders) == 1
+    assert render_cache.pages.stats()['entries'] == 1
@@ -0,0 +1,31 @@
+import html
+import re
+
+from app import app
+
+MORE = re.compile(r'<a class="filter-btn" href="([^"]+)">More plants')
+NAME = re.compile(r'<h3>([^<]+)</h3>')
+
+
+def names_and_next(client, url):
+    # The seasonal guide below the list has headings of its own
+    page = client.get(url).get_data(as_text=True).split('class="seasonal-guide"')[0]
+    more = MORE.search(page)
+    return NAME.findall(page), html.unescape(more.group(1)) if more else None
+
+
+def test_more_plants_keeps_every_value_of_a_repeated_filter():
+    client = app.test_client()
+    query = 'difficulty=easy&difficulty=medium'
+    expected, _ = names_and_next(client, f'/plants?{query}&limit=100')
+
+    seen = []
+    url = f'/plants?{query}&limit=2'
+    while url is not None:
+        names, url = names_and_next(client, url)
+        if url is not None:
+            assert 'difficulty=easy&difficulty=medium' in url
+        seen += names
+
+    assert len(expected) > 2
+    assert seen == expected
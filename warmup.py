@@ -0,0 +1,124 @@
+"""Boot-time template compilation and cache warming.
+
+`python setup.py templates` compiles every template into a Jinja bytecode
+cache at build time, so loading them at runtime skips parsing. wsgi.py then
+loads the templates, reads the data files and renders every parameterless
+GET route once before serving. Under gunicorn with preload_app that happens
+in the master, and the workers fork with all of it already in memory.
+
+Each step is timed; the durations are printed at boot and shown on /health.
+"""
+import gc
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from jinja2 import FileSystemBytecodeCache
+
+from compression import available_encodings
+from content import BASE_DIR
+
+BYTECODE_DIR = os.environ.get('JINJA_BYTECODE_DIR') or os.path.join(BASE_DIR, '.cache', 'jinja')
+# Pages embed absolute URLs (og:url), so cached renders are per host: warm
+# the one the site is actually served on
+BASE_URL = os.environ.get('WARMUP_BASE_URL', 'http://localhost')
+
+
+class BootReport:
+    """Named phase durations, in milliseconds"""
+
+    def __init__(self):
+        self.phases = {}
+        self.counts = {}
+
+    def record(self, name, seconds, count=None):
+        self.phases[name] = round(seconds * 1000, 1)
+        if count is not None:
+            self.counts[name] = count
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def as_dict(self):
+        return {
+            "phases_ms": dict(self.phases),
+            "counts": dict(self.counts),
+            "total_ms": round(sum(self.phases.values()), 1),
+        }
+
+    def summary(self):
+        parts = []
+        for name, ms in self.phases.items():
+            count = self.counts.get(name)
+            parts.append(f'{name} {ms:.1f}ms' + (f' ({count})' if count is not None else ''))
+        return f"boot: {', '.join(parts)}; total {sum(self.phases.values()):.1f}ms"
+
+
+def use_bytecode_cache(app, directory=BYTECODE_DIR):
+    """Point the app's Jinja environment at the on-disk bytecode cache"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return False
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    return True
+
+
+def compile_templates(app):
+    """Load every template, filling the bytecode cache; returns the count"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_routes(app, base_url=BASE_URL):
+    """Request each parameterless GET route once per offered encoding
+
+    That loads the data files and builds their indexes, and fills the render
+    and compression caches. Returns the number of URLs fetched.
+    """
+    urls = sorted(
+        rule.rule for rule in app.url_map.iter_rules()
+        if 'GET' in rule.methods and not rule.arguments and rule.endpoint != 'static'
+    )
+    client = app.test_client()
+    for url in urls:
+        for encoding in available_encodings():
+            client.get(url, base_url=base_url, headers={'Accept-Encoding': encoding})
+    return len(urls)
+
+
+def boot(app, import_seconds=None, warm=None):
+    """Compile, warm and freeze the app; returns the BootReport"""
+    if warm is None:
+        warm = os.environ.get('WARMUP', '1') != '0'
+    report = BootReport()
+    if import_seconds is not None:
+        report.record('import', import_seconds)
+
+    started = time.perf_counter()
+    use_bytecode_cache(app)
+    compiled = compile_templates(app)
+    report.record('templates', time.perf_counter() - started, compiled)
+
+    if warm:
+        started = time.perf_counter()
+        fetched = warm_routes(app)
+        report.record('warmup', time.perf_counter() - started, fetched)
+
+    # Everything loaded so far lives as long as the process. Moving it out of
+    # the collector's reach stops gc passes in forked workers from touching
+    # (and so un-sharing) those pages.
+    gc.collect()
+    gc.freeze()
+
+    app.extensions['boot_report'] = report
+    print(report.summary(), file=sys.stderr, flush=True)
+    return report
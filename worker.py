@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Deliver queued contact messages and newsletter sign-ups by hand
+
+    python worker.py          # poll forever, e.g. beside `python app.py`
+    python worker.py --once   # one pass, then print the backlog and exit
+
+Under gunicorn the web workers deliver by themselves (see Deliverer in
+submissions.py); this runs the same loop, and waits its turn while a web
+worker on the same machine holds the delivery lock.
+"""
+import sys
+
+import submissions
+
+
+def report(outcome):
+    print(f"📬 {', '.join(f'{status}: {count}' for status, count in sorted(outcome.items()))}", flush=True)
+
+
+def main(argv):
+    deliverer = submissions.Deliverer()
+    if '--once' in argv:
+        if not deliverer.run(once=True, report=report):
+            print("⏳ Another process is delivering; skipped this pass")
+        print(f"📊 Backlog: {submissions.backlog(submissions.connect())}")
+        return
+    deliverer.run(report=report)
+
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except KeyboardInterrupt:
+        pass
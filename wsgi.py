@@ -0,0 +1,14 @@
+"""Gunicorn entry point: `gunicorn wsgi:app`
+
+Imports the app, then compiles templates and warms the caches before the
+first request (see warmup.py). With preload_app in gunicorn.conf.py this
+runs once in the master and the workers share the result copy-on-write.
+"""
+import time
+
+_started = time.perf_counter()
+
+from app import app  # noqa: E402
+import warmup  # noqa: E402
+
+warmup.boot(app, import_seconds=time.perf_counter() - _started)